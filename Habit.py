@@ -1,39 +1,71 @@
-from datetime import timedelta, date, datetime
+import sqlite3
+from datetime import date
 from db import (
+    DatabaseRuns,
     add_habit,
     add_completed_task,
     delete_habit,
-    get_creation_time,
+    get_habit_state,
     get_latest_date,
-    get_streak_count,
-    get_longest_streak,
-    get_periodicity,
-    update_streak_count,
-    update_longest_streak,
-    reset_streak_count,
+    delete_completed_task,
     delete_completed_tasks,
+    add_completed_tasks,
+    get_bucket_completions,
+    rebuild_streak_runs,
+    set_streaks,
+    set_streaks_from_runs,
+    transaction,
 )
-from constants import Periodicity
+from constants import DEFAULT_USER
+from periods import get_period
+from pool import pooled
+from results import CompletionResult, emit
+from runs import add_bucket, merge_bucket, remove_bucket
+
+
+@pooled("write")
+def bulk_complete(db, completions, user_id=DEFAULT_USER):
+    """
+    Add many completed tasks in a single transaction. The streak runs of the habits are rebuilt once at the end
+    instead of being updated for every task, the result is the same as calling `complete_task` for every
+    completion. Tasks that were already completed on the same day and tasks of habits that do not exist are skipped
+    :param db: a database connection or a ConnectionPool
+    :param completions: pairs of a habit's title and a date of the completed task
+    :param user_id: the user of the habits
+    :return: the number of added completed tasks
+    """
+    tasks = [(custom_date, title) for title, custom_date in completions]
+    titles = {title for _, title in tasks}
+    with transaction(db):
+        added = add_completed_tasks(db, tasks, skip_duplicates=True, user_id=user_id)
+        rebuild_streak_runs(db, user_id, titles)
+        set_streaks_from_runs(db, user_id, titles)
+    return added
 
 
 class Habit:
+    __slots__ = ("title", "description", "periodicity", "creation_time", "user_id")
+
     def __init__(
         self,
         title: str,
         description: str = "",
-        periodicity: Periodicity = "daily",
-        creation_time: date = date.today(),
+        periodicity: str = "daily",
+        creation_time: date = None,
+        user_id: int = DEFAULT_USER,
     ):
         """Habit class, to create a habit
         :param title: a habit's title
         :param description: a habit's description
         :param periodicity: how often the habit should be performed
-        :param creation_time: a date of habit's creation
+        :param creation_time: a date of habit's creation, today if it is not given
+        :param user_id: the user of the habit
         """
         self.title = title
         self.description = description
         self.periodicity = periodicity
-        self.creation_time = creation_time
+        self.creation_time = date.today() if creation_time is None else creation_time
+        self.user_id = user_id
 
     def __str__(self):
         """
@@ -47,63 +79,165 @@ class Habit:
 
 
 class DatabaseHabit(Habit):
-    def store(self, db):
+    __slots__ = ("streak_count", "longest_streak", "latest_date")
+
+    def hydrate(self, state):
         """
-        Dispatch habit's data to add the habit to the database
-        :param db: a database connection
+        Copy the habit's data from a HabitState that was read from the database
+        :param state: a HabitState, see `get_habit_state`, LookupError is raised if it is None
         :return: None
         """
-        add_habit(
-            db, self.title, self.description, self.periodicity, self.creation_time
+        if state is None:
+            raise LookupError(f"The habit with the title `{self.title}` does not exist.")
+        self.title = state.title
+        self.description = state.description
+        self.periodicity = state.periodicity
+        self.creation_time = state.creation_time
+        self.streak_count = state.streak_count
+        self.longest_streak = state.longest_streak
+        self.latest_date = (
+            None if state.latest_day is None else date.fromordinal(state.latest_day)
         )
 
-    def complete_task(self, db, custom_date):
+    @pooled("write", method=True)
+    def store(self, db, sink=None):
         """
-        Add a completed task to the database, update the streak count and the longest streak, inform the user about
-         progress
-        :param db: a database connection
-        :param custom_date: a date that was defined by user
-        :return: None
+        Dispatch habit's data to add the habit to the database
+        :param db: a database connection or a ConnectionPool
+        :param sink: a callable that receives the result or None
+        :return: HabitChange
         """
-        streak_count = get_streak_count(db, self.title)[0]
-        longest_streak = get_longest_streak(db, self.title)[0]
-        periodicity = get_periodicity(db, self.title)[0]
-        creation_time_string = get_creation_time(db, self.title)[0]
-        periodicity_days = 1 if periodicity == "daily" else 7
-        latest_date_string = get_latest_date(db, self.title)[0]
-
-        if latest_date_string is None:
-            latest_date_string = creation_time_string
-        else:
-            if latest_date_string == custom_date.strftime("%Y-%m-%d"):
-                print("You have already completed this task on this day.")
-                return
+        return add_habit(
+            db,
+            self.title,
+            self.description,
+            self.periodicity,
+            self.creation_time,
+            sink=sink,
+            user_id=self.user_id,
+        )
 
-        latest_date = datetime.strptime(latest_date_string, "%Y-%m-%d").date()
+    @pooled("write", method=True)
+    def complete_task(self, db, custom_date, sink=None):
+        """
+        Add a completed task to the database, update the streak count and the longest streak in one transaction.
+        LookupError is raised if the habit does not exist
+        :param db: a database connection or a ConnectionPool
+        :param custom_date: a date that was defined by user
+        :param sink: a callable that receives the result or None
+        :return: CompletionResult
+        """
+        try:
+            with transaction(db):
+                state = get_habit_state(db, self.title, self.user_id)
+                self.hydrate(state)
+                longest_streak = self.longest_streak
+                period = get_period(self.periodicity)
+                bucket = period.bucket(custom_date.toordinal())
+                add_completed_task(db, self.title, custom_date, self.user_id)
 
-        if custom_date - timedelta(days=periodicity_days) <= latest_date:
-            update_streak_count(db, self.title, streak_count)
-            print(f"The successful streak count was updated.")
-            if streak_count + 1 > longest_streak:
-                update_longest_streak(db, self.title, longest_streak)
-                print(
-                    f"You have a new record! Your longest streak for the habit `{self.title}` is {streak_count + 1}."
+                runs = DatabaseRuns(db, self.title, self.user_id)
+                if period.quota == 1 and (
+                    state.latest_day is None or bucket > period.bucket(state.latest_day)
+                ):
+                    # a task after the latest period can only extend the last run or start a new one
+                    run = merge_bucket(runs, bucket, period.gap, state.last_run, None)
+                    self.streak_count = run.length
+                    self.longest_streak = max(longest_streak, run.length)
+                elif get_bucket_completions(db, self.title, bucket, self.user_id) == period.quota:
+                    # the task completed its period
+                    run = add_bucket(runs, bucket, period.gap)
+                    self.streak_count, self.longest_streak = runs.streaks()
+                else:
+                    # the period was already completed or still needs more tasks
+                    run = None
+                # a task within the gap after the habit's creation does not break a streak either
+                continued = (
+                    run is None
+                    or run.length > 1
+                    or bucket - period.bucket(self.creation_time.toordinal()) <= period.gap
+                )
+                self.latest_date = max(self.latest_date or self.creation_time, custom_date)
+                set_streaks(
+                    db, [(self.streak_count, self.longest_streak, self.title)], self.user_id
                 )
-        else:
-            print(
-                f"You broke your habit! You skipped more than {timedelta(days=periodicity_days).days} day(s)"
+        except sqlite3.IntegrityError:
+            return emit(
+                sink,
+                CompletionResult(
+                    self.title,
+                    custom_date,
+                    self.streak_count,
+                    self.longest_streak,
+                    False,
+                    False,
+                    True,
+                    self.periodicity,
+                ),
             )
-            reset_streak_count(db, self.title)
-            print(f"The successful streak count was updated.")
+        return emit(
+            sink,
+            CompletionResult(
+                self.title,
+                custom_date,
+                self.streak_count,
+                self.longest_streak,
+                not continued,
+                continued and self.longest_streak > longest_streak,
+                False,
+                self.periodicity,
+            ),
+        )
 
-        add_completed_task(db, self.title, custom_date)
-        db.commit()
+    @pooled("write", method=True)
+    def delete_task(self, db, custom_date, sink=None):
+        """
+        Delete the completed task of one day, update the streak count and the longest streak in one transaction.
+        LookupError is raised if the habit does not exist
+        :param db: a database connection or a ConnectionPool
+        :param custom_date: a date of the completed task
+        :param sink: a callable that receives the result or None
+        :return: HabitChange with the number of deleted tasks, 0 if the task was not completed on this day
+        """
+        with transaction(db):
+            state = get_habit_state(db, self.title, self.user_id)
+            self.hydrate(state)
+            change = delete_completed_task(db, self.title, custom_date, user_id=self.user_id)
+            if change.count:
+                period = get_period(self.periodicity)
+                bucket = period.bucket(custom_date.toordinal())
+                if get_bucket_completions(db, self.title, bucket, self.user_id) == period.quota - 1:
+                    # the task was needed to complete its period
+                    runs = DatabaseRuns(db, self.title, self.user_id)
+                    remove_bucket(runs, bucket, period.gap)
+                    self.streak_count, self.longest_streak = runs.streaks()
+                if custom_date == self.latest_date:
+                    self.latest_date = get_latest_date(db, self.title, self.user_id)[0]
+                set_streaks(
+                    db, [(self.streak_count, self.longest_streak, self.title)], self.user_id
+                )
+        return emit(sink, change)
 
-    def delete(self, db):
+    @pooled("write", method=True)
+    def complete_tasks(self, db, dates):
+        """
+        Add many completed tasks of the habit at once, see `bulk_complete`
+        :param db: a database connection or a ConnectionPool
+        :param dates: dates of the completed tasks
+        :return: the number of added completed tasks
+        """
+        return bulk_complete(
+            db, [(self.title, custom_date) for custom_date in dates], self.user_id
+        )
+
+    @pooled("write", method=True)
+    def delete(self, db, sink=None):
         """
         Dispatch the habit's data to delete the habit in the database
-        :param db: a database connection
-        :return: None
+        :param db: a database connection or a ConnectionPool
+        :param sink: a callable that receives the results or None
+        :return: HabitChange of the deleted habit
         """
-        delete_completed_tasks(db, self.title)
-        delete_habit(db, self.title)
+        with transaction(db):
+            delete_completed_tasks(db, self.title, sink=sink, user_id=self.user_id)
+            return delete_habit(db, self.title, sink=sink, user_id=self.user_id)
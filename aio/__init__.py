@@ -0,0 +1,2 @@
+from aio.connection import AsyncHabitDB
+from aio import analytics, habits
@@ -0,0 +1,113 @@
+import analytics
+from constants import DEFAULT_USER
+
+
+async def get_habits(adb, user_id=DEFAULT_USER):
+    """
+    Return the titles and descriptions of all habits, see `analytics.get_habits`
+    :param adb: an AsyncHabitDB
+    :param user_id: the user of the habits
+    :return: a list of titles and descriptions
+    """
+    return await adb.read(lambda db: list(analytics.get_habits(db, user_id)))
+
+
+async def get_habits_page(
+    adb, after_title=None, page_size=analytics.PAGE_SIZE, user_id=DEFAULT_USER
+):
+    """
+    Return one page of habits ordered by title, see `analytics.get_habits_page`
+    :param adb: an AsyncHabitDB
+    :param after_title: the last title of the previous page or None for the first page
+    :param page_size: the number of habits on a page
+    :param user_id: the user of the habits
+    :return: the habits on the page and the last title of the page if there is a next page, otherwise None
+    """
+    return await adb.read(analytics.get_habits_page, after_title, page_size, user_id)
+
+
+async def get_period_habits(adb, period, user_id=DEFAULT_USER):
+    """
+    Return the titles of the habits of a periodicity, see `analytics.get_period_habits`
+    :param adb: an AsyncHabitDB
+    :param period: periodicity of habits
+    :param user_id: the user of the habits
+    :return: a list of titles
+    """
+    return await adb.read(
+        lambda db: list(analytics.get_period_habits(db, period, user_id))
+    )
+
+
+async def get_streak_for_habit(adb, title, user_id=DEFAULT_USER):
+    """
+    Return the longest streak of a habit, see `analytics.get_streak_for_habit`
+    :param adb: an AsyncHabitDB
+    :param title: a habit's title
+    :param user_id: the user of the habit
+    :return: the longest streak or None if such a habit does not exist
+    """
+    return await adb.read(analytics.get_streak_for_habit, title, user_id)
+
+
+async def get_streaks_for_habits(adb, limit=None, user_id=DEFAULT_USER):
+    """
+    Return the longest streaks of all habits, see `analytics.get_streaks_for_habits`
+    :param adb: an AsyncHabitDB
+    :param limit: the number of habits per periodicity or None for all of them
+    :param user_id: the user of the habits
+    :return: a dictionary of every periodicity and the titles and longest streaks of its habits
+    """
+    return await adb.read(analytics.get_streaks_for_habits, limit, user_id)
+
+
+async def get_completion_rates(adb, start, end, user_id=DEFAULT_USER):
+    """
+    Return the completion statistics of all habits within a date range, see `analytics.get_completion_rates`
+    :param adb: an AsyncHabitDB
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habits
+    :return: a dictionary of every periodicity and the CompletionStats of its habits
+    """
+    return await adb.read(analytics.get_completion_rates, start, end, user_id)
+
+
+async def get_weakest_habits(adb, start=None, end=None, user_id=DEFAULT_USER):
+    """
+    Return the weakest habit of every periodicity, see `analytics.get_weakest_habits`
+    :param adb: an AsyncHabitDB
+    :param start: the first date of the range or None
+    :param end: the last date of the range or None
+    :param user_id: the user of the habits
+    :return: a dictionary of every periodicity and its weakest habit or None
+    """
+    return await adb.read(analytics.get_weakest_habits, start, end, user_id)
+
+
+async def get_completions_per_period(adb, period, start, end, user_id=DEFAULT_USER):
+    """
+    Return how many habits were completed in every period, see `analytics.get_completions_per_period`
+    :param adb: an AsyncHabitDB
+    :param period: periodicity of habits
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habits
+    :return: a dictionary of the first date of every period and the number of completed habits
+    """
+    return await adb.read(
+        analytics.get_completions_per_period, period, start, end, user_id
+    )
+
+
+async def get_missed_periods(adb, title, start, end, user_id=DEFAULT_USER):
+    """
+    Return the periods in which a habit was not completed, see `analytics.get_missed_periods`
+    :param adb: an AsyncHabitDB
+    :param title: a habit's title
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habit
+    :return: the first dates of the missed periods or None if such a habit does not exist
+    """
+    return await adb.read(analytics.get_missed_periods, title, start, end, user_id)
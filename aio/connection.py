@@ -0,0 +1,129 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_db
+from pool import run_group
+
+
+class AsyncHabitDB:
+    def __init__(self, name="main.db", profile="fast"):
+        """
+        An asyncio front end of a database. All SQLite work runs on one dedicated executor thread, and the writes
+        that are requested within the same event loop iteration are committed together in one transaction
+        :param name: name of the database
+        :param profile: the connection profile, see `db.PROFILES`
+        """
+        self.name = name
+        self.profile = profile
+        self._db = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="habit-db"
+        )
+        self._pending = []
+
+    def _connection(self):
+        """
+        Return the connection of the executor thread, opening it on first use
+        :return: a database connection
+        """
+        if self._db is None:
+            self._db = get_db(self.name, self.profile)
+        return self._db
+
+    async def read(self, function, *args, **kwargs):
+        """
+        Call a function with the database connection as its first argument on the executor thread
+        :param function: a function that receives a database connection
+        :return: the function's result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: function(self._connection(), *args, **kwargs)
+        )
+
+    async def write(self, function, *args, **kwargs):
+        """
+        Queue a function that receives the database connection as its first argument and wait until the
+        transaction that runs it is committed
+        :param function: a function that receives a database connection
+        :return: the function's result
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((function, args, kwargs, future))
+        if len(self._pending) == 1:
+            loop.call_soon(self._flush, loop)
+        return await future
+
+    def _flush(self, loop):
+        """
+        Send the writes of the current event loop iteration to the executor thread as one group
+        :param loop: the running event loop
+        :return: None
+        """
+        jobs, self._pending = self._pending, []
+        loop.run_in_executor(self._executor, self._run_jobs, loop, jobs)
+
+    def _run_jobs(self, loop, jobs):
+        """
+        Run a group of writes on the executor thread and resolve their futures on the event loop
+        :param loop: the event loop of the futures
+        :param jobs: quadruples of a function, its arguments, its keyword arguments and a future
+        :return: None
+        """
+        try:
+            results = run_group(self._connection(), [job[:3] for job in jobs])
+        except Exception as error:
+            results = [(None, error) for _ in jobs]
+        futures = [job[3] for job in jobs]
+        loop.call_soon_threadsafe(resolve, futures, results)
+
+    async def close(self):
+        """
+        Wait for the queued writes and close the connection
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        if self._pending:
+            self._flush(loop)
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+
+    def _close(self):
+        """
+        Close the connection on the executor thread
+        :return: None
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def __aenter__(self):
+        """
+        Use the database as an async context manager that closes it at the end
+        :return: the database
+        """
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """
+        Close the database
+        :return: None
+        """
+        await self.close()
+
+
+def resolve(futures, results):
+    """
+    Set the results or the exceptions of futures unless they were cancelled
+    :param futures: asyncio futures
+    :param results: pairs of a result and an exception or None
+    :return: None
+    """
+    for future, (result, error) in zip(futures, results):
+        if future.done():
+            continue
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
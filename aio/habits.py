@@ -0,0 +1,51 @@
+async def store(adb, habit):
+    """
+    Add a habit to the database, see `DatabaseHabit.store`
+    :param adb: an AsyncHabitDB
+    :param habit: a DatabaseHabit
+    :return: HabitChange
+    """
+    return await adb.write(habit.store)
+
+
+async def complete_task(adb, habit, custom_date):
+    """
+    Check off a habit's task, see `DatabaseHabit.complete_task`
+    :param adb: an AsyncHabitDB
+    :param habit: a DatabaseHabit
+    :param custom_date: a date of the completed task
+    :return: CompletionResult
+    """
+    return await adb.write(habit.complete_task, custom_date)
+
+
+async def complete_tasks(adb, habit, dates):
+    """
+    Check off many tasks of a habit, see `DatabaseHabit.complete_tasks`
+    :param adb: an AsyncHabitDB
+    :param habit: a DatabaseHabit
+    :param dates: dates of the completed tasks
+    :return: the number of added completed tasks
+    """
+    return await adb.write(habit.complete_tasks, dates)
+
+
+async def delete_task(adb, habit, custom_date):
+    """
+    Delete a habit's completed task of one day, see `DatabaseHabit.delete_task`
+    :param adb: an AsyncHabitDB
+    :param habit: a DatabaseHabit
+    :param custom_date: a date of the completed task
+    :return: HabitChange
+    """
+    return await adb.write(habit.delete_task, custom_date)
+
+
+async def delete(adb, habit):
+    """
+    Delete a habit and its completed tasks, see `DatabaseHabit.delete`
+    :param adb: an AsyncHabitDB
+    :param habit: a DatabaseHabit
+    :return: HabitChange of the deleted habit
+    """
+    return await adb.write(habit.delete)
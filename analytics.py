@@ -1,79 +1,206 @@
 from db import (
-    get_habits_titles_and_descriptions,
-    get_habits_period,
-    get_longest_streaks,
+    iter_habits,
+    iter_habits_period,
+    get_habits_after,
     get_longest_streak,
-    get_all_streak_counts,
+    get_ranked_habits,
+    get_completion_stats,
+    get_habit,
+    get_completed_buckets,
+    get_bucket_counts,
 )
-from Habit import Periodicity
+from datetime import date
+from constants import DEFAULT_USER, PAGE_SIZE
+from periods import get_period
+from pool import pooled
 
+# The periodicities that the groups always list, the others are listed when a habit uses them
+LISTED = ("daily", "weekly")
 
-def get_habits(db):
+
+@pooled("read")
+def get_habits(db, user_id=DEFAULT_USER):
+    """
+    Return the titles and descriptions of all current habits
+    :param db: a database connection or a ConnectionPool
+    :param user_id: the user of the habits
+    :return: a generator of titles and descriptions, a list for a ConnectionPool
+    """
+    return iter_habits(db, user_id=user_id)
+
+
+@pooled("read")
+def get_habits_page(db, after_title=None, page_size=PAGE_SIZE, user_id=DEFAULT_USER):
     """
-    Print the titles and descriptions of all current habits
-    :param db: a database connection
-    :return: None
+    Return one page of habits ordered by title
+    :param db: a database connection or a ConnectionPool
+    :param after_title: the last title of the previous page or None for the first page
+    :param page_size: the number of habits on a page
+    :param user_id: the user of the habits
+    :return: titles and descriptions of the habits on the page and the last title of the page if there is a next
+     page, otherwise None
     """
-    habits = get_habits_titles_and_descriptions(db)
-    print("Your current habits are: ")
-    for idx, x in enumerate(habits):
-        print(f"{idx + 1}. {x[0]}: {x[1]}", end=" \n")
+    habits = get_habits_after(db, after_title, page_size + 1, user_id)
+    next_title = habits[page_size - 1][0] if len(habits) > page_size else None
+    return habits[:page_size], next_title
 
 
-def get_period_habits(db, period):
+@pooled("read")
+def get_period_habits(db, period, user_id=DEFAULT_USER):
     """
-    Print all habits' titles, sorted by periodicity
-    :param db: a database connection
+    Return all habits' titles of a periodicity
+    :param db: a database connection or a ConnectionPool
     :param period: periodicity of habits
-    :return: None
+    :param user_id: the user of the habits
+    :return: a generator of titles, a list for a ConnectionPool
     """
-    habits_period = get_habits_period(db, period)
-    print(f"The habits of the period `{period}` are: ")
-    if len(habits_period) < 1:
-        print("None")
-    else:
-        for idx, x in enumerate(habits_period):
-            print(f"{idx + 1}. {x[0]}", end=" \n")
+    return (x[0] for x in iter_habits_period(db, period, user_id=user_id))
 
 
-def get_streak_for_habit(db, title):
+@pooled("read")
+def get_streak_for_habit(db, title, user_id=DEFAULT_USER):
     """
-    Print the longest run streak for each habit
-    :param db: a database connection
+    Return the longest run streak of a habit
+    :param db: a database connection or a ConnectionPool
     :param title: a habit's title
-    :return: None
+    :param user_id: the user of the habit
+    :return: the longest streak or None if such a habit does not exist
+    """
+    streak = get_longest_streak(db, title, user_id)
+    return None if streak is None else streak[0]
+
+
+def group_by_period(ranked_habits):
+    """
+    Group the rows of `get_ranked_habits` by periodicity, daily and weekly are always listed
+    :param ranked_habits: periodicity, title and the streak of habits
+    :return: a dictionary of every periodicity and the titles and streaks of its habits
+    """
+    groups = {period: [] for period in LISTED}
+    for period, title, streak in ranked_habits:
+        groups.setdefault(period, []).append((title, streak))
+    return groups
+
+
+@pooled("read")
+def get_streaks_for_habits(db, limit=None, user_id=DEFAULT_USER):
+    """
+    Return the longest run streaks of all habits, sorted by periodicity
+    :param db: a database connection or a ConnectionPool
+    :param limit: the number of habits per periodicity or None for all of them
+    :param user_id: the user of the habits
+    :return: a dictionary of every periodicity and the titles and longest streaks of its habits
     """
-    streak = get_longest_streak(db, title)
-    print(f"Your longest streak of the habit `{title}` is: {streak[0]}")
+    return group_by_period(
+        get_ranked_habits(db, "longest_streak", limit, user_id=user_id)
+    )
 
 
-def get_streaks_for_habits(db):
+def group_stats_by_period(stats):
     """
-    Print the longest run streaks of all habits, sorted by periodicity
-    :param db: a database connection
-    :return: None
+    Group the rows of `get_completion_stats` by periodicity, daily and weekly are always listed
+    :param stats: CompletionStats of habits
+    :return: a dictionary of every periodicity and the CompletionStats of its habits
     """
-    print("The longest streaks of all habits are: ")
-    for period in Periodicity:
-        streaks = get_longest_streaks(db, period)
-        sorted_streaks = sorted(streaks, key=lambda feature: feature[1], reverse=True)
-        print(period)
-        for idx, x in enumerate(sorted_streaks):
-            print(f"{idx + 1}. {x[0]} - {x[1]}", end=" \n")
+    groups = {period: [] for period in LISTED}
+    for habit_stats in stats:
+        groups.setdefault(habit_stats.periodicity, []).append(habit_stats)
+    return groups
 
 
-def get_weakest_habits(db):
+@pooled("read")
+def get_completion_rates(db, start, end, user_id=DEFAULT_USER):
     """
-    Print the habits with the lowest current streak count from each periodicity
-    :param db: a database connection
-    :return: None
+    Return the completion rate, the missed periods and the longest gap of all habits within a date range
+    :param db: a database connection or a ConnectionPool
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habits
+    :return: a dictionary of every periodicity and the CompletionStats of its habits
+    """
+    return group_stats_by_period(get_completion_stats(db, start, end, user_id))
+
+
+@pooled("read")
+def get_weakest_habits(db, start=None, end=None, user_id=DEFAULT_USER):
+    """
+    Return the habit with the lowest current streak count from each periodicity, or the habit with the lowest
+    completion rate within a date range if it is given
+    :param db: a database connection or a ConnectionPool
+    :param start: the first date of the range or None
+    :param end: the last date of the range or None
+    :param user_id: the user of the habits
+    :return: a dictionary of every periodicity and the title and streak count or the CompletionStats of its
+     weakest habit, None for a periodicity without habits
+    """
+    if start is not None:
+        groups = get_completion_rates(db, start, end, user_id)
+    else:
+        groups = group_by_period(
+            get_ranked_habits(db, "streak_count", 1, False, user_id)
+        )
+    return {period: habits[0] if habits else None for period, habits in groups.items()}
+
+
+@pooled("read")
+def get_completions_per_period(db, period, start, end, user_id=DEFAULT_USER):
+    """
+    Return how many habits of a periodicity were completed in every period within a date range, read from the
+    rollup table. The periods of a weekly habit are calendar weeks, see `periods.Period.window`
+    :param db: a database connection or a ConnectionPool
+    :param period: periodicity of habits
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habits
+    :return: a dictionary of the first date of every period and the number of completed habits
+    """
+    periods = get_period(period)
+    windows = periods.window()
+    first_window = windows.bucket(start.toordinal())
+    last_window = windows.bucket(end.toordinal())
+    counts = dict(
+        get_bucket_counts(
+            db,
+            period,
+            first_window * periods.gap,
+            (last_window + 1) * periods.gap - 1,
+            user_id,
+        )
+    )
+    return {
+        date.fromordinal(windows.first_day(window)): counts.get(window, 0)
+        for window in range(first_window, last_window + 1)
+    }
+
+
+@pooled("read")
+def get_missed_periods(db, title, start, end, user_id=DEFAULT_USER):
+    """
+    Return the periods within a date range in which a habit was not completed, read from the rollup table. The
+    range starts at the habit's creation time if it was created after `start`, the periods of a weekly habit are
+    calendar weeks, see `periods.Period.window`
+    :param db: a database connection or a ConnectionPool
+    :param title: a habit's title
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habit
+    :return: the first dates of the missed periods or None if such a habit does not exist
     """
-    print("Lately you struggled the most with these habits: ")
-    for period in Periodicity:
-        streaks = get_all_streak_counts(db, period)
-        sorted_streaks = sorted(streaks, key=lambda x: x[1])
-        print(period)
-        print(
-            f"{sorted_streaks[0][0]}: the current streak count is {sorted_streaks[0][1]}",
-            end=" \n",
+    habit = get_habit(db, title, user_id)
+    if habit is None:
+        return None
+    period = get_period(habit[2])
+    windows = period.window()
+    first_window = windows.bucket(max(habit[5], start).toordinal())
+    last_window = windows.bucket(end.toordinal())
+    completed = {
+        bucket // period.gap
+        for bucket in get_completed_buckets(
+            db, title, first_window * period.gap, (last_window + 1) * period.gap - 1, user_id
         )
+    }
+    return [
+        date.fromordinal(windows.first_day(window))
+        for window in range(first_window, last_window + 1)
+        if window not in completed
+    ]
@@ -0,0 +1,111 @@
+"""
+Compare the check-off throughput of the asyncio API, which commits concurrent requests together, with the
+synchronous path, which commits every check-off on its own.
+
+Run it from the repository root with
+
+    python -m benchmarks.aio_throughput [--check-offs 2000] [--concurrency 100]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import aio
+from Habit import DatabaseHabit
+from db import get_db, PROFILES
+
+START = date(2020, 1, 1)
+
+
+def sync_throughput(name, check_offs, habits, profile):
+    """
+    Check off tasks one after another on a single connection
+    :param name: name of the database
+    :param check_offs: the number of check-offs
+    :param habits: the number of habits that the check-offs are spread over
+    :param profile: the connection profile
+    :return: check-offs per second
+    """
+    db = get_db(name, profile)
+    started = time.perf_counter()
+    for i in range(check_offs):
+        DatabaseHabit(f"habit {i % habits}").complete_task(
+            db, START + timedelta(days=i // habits + 1)
+        )
+    elapsed = time.perf_counter() - started
+    db.close()
+    return check_offs / elapsed
+
+
+async def async_throughput(name, check_offs, habits, concurrency, profile):
+    """
+    Check off tasks from `concurrency` concurrent coroutines
+    :param name: name of the database
+    :param check_offs: the number of check-offs
+    :param habits: the number of habits that the check-offs are spread over
+    :param concurrency: the number of concurrent coroutines
+    :param profile: the connection profile
+    :return: check-offs per second
+    """
+    async with aio.AsyncHabitDB(name, profile) as adb:
+
+        async def worker(offset):
+            for i in range(offset, check_offs, concurrency):
+                habit = DatabaseHabit(f"habit {i % habits}")
+                await aio.habits.complete_task(
+                    adb, habit, START + timedelta(days=i // habits + 1)
+                )
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+        return check_offs / (time.perf_counter() - started)
+
+
+def create(name, habits, profile):
+    """
+    Create a database with daily habits
+    :param name: name of the database
+    :param habits: the number of habits
+    :param profile: the connection profile
+    :return: None
+    """
+    db = get_db(name, profile)
+    for i in range(habits):
+        DatabaseHabit(f"habit {i}", "", "daily", START).store(db)
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--check-offs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--habits", type=int, default=100)
+    parser.add_argument("--profile", choices=PROFILES, default="durable")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sync_name = os.path.join(directory, "sync.db")
+        async_name = os.path.join(directory, "async.db")
+        create(sync_name, args.habits, args.profile)
+        create(async_name, args.habits, args.profile)
+        sync_rate = sync_throughput(
+            sync_name, args.check_offs, args.habits, args.profile
+        )
+        async_rate = asyncio.run(
+            async_throughput(
+                async_name,
+                args.check_offs,
+                args.habits,
+                args.concurrency,
+                args.profile,
+            )
+        )
+    print(f"sync:  {sync_rate:>10.0f} check-offs/s")
+    print(f"async: {async_rate:>10.0f} check-offs/s")
+
+
+if __name__ == "__main__":
+    main()
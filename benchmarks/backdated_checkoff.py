@@ -0,0 +1,86 @@
+"""
+Measure the latency of backdated check-offs and undos while the history of a habit grows.
+
+Run it from the repository root with
+
+    python -m benchmarks.backdated_checkoff [--history 1000 10000 100000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from db import add_completed_tasks, get_db, rebuild_streak_runs, set_streaks_from_runs
+from Habit import DatabaseHabit
+
+START = date(1700, 1, 1)
+
+# The number of timed check-offs and undos at every size
+SAMPLES = 200
+
+
+def fill(db, title, completions):
+    """
+    Add a daily habit whose completed tasks skip every third day, so that its history consists of many short runs
+    :param db: a database connection
+    :param title: the habit's title
+    :param completions: the number of completed tasks
+    :return: None
+    """
+    DatabaseHabit(title, "", "daily", START).store(db)
+    add_completed_tasks(
+        db,
+        (
+            (START + timedelta(days=day), title)
+            for day in range(completions * 3 // 2)
+            if day % 3
+        ),
+    )
+    rebuild_streak_runs(db, titles=[title])
+    set_streaks_from_runs(db, titles=[title])
+
+
+def measure(db, title, completions):
+    """
+    Check off skipped days spread over the habit's history, which merges two runs each, and undo them again, which
+    splits the runs
+    :param db: a database connection
+    :param title: the habit's title
+    :param completions: the number of completed tasks
+    :return: the mean latencies of a check-off and of an undo in microseconds
+    """
+    habit = DatabaseHabit(title)
+    step = max(1, completions // 2 // SAMPLES)
+    days = [START + timedelta(days=3 * i * step) for i in range(SAMPLES)]
+    started = time.perf_counter()
+    for day in days:
+        habit.complete_task(db, day)
+    checked_off = time.perf_counter()
+    for day in days:
+        habit.delete_task(db, day)
+    finished = time.perf_counter()
+    return (
+        (checked_off - started) / SAMPLES * 1e6,
+        (finished - checked_off) / SAMPLES * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--history", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = get_db(os.path.join(directory, "backdated.db"), "fast")
+        print(f"{'completed tasks':>16} {'check-off µs':>13} {'undo µs':>9}")
+        for completions in sorted(args.history):
+            title = f"habit_{completions}"
+            fill(db, title, completions)
+            check_off, undo = measure(db, title, completions)
+            print(f"{completions:>16} {check_off:>13.1f} {undo:>9.1f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
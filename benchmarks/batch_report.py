@@ -0,0 +1,65 @@
+"""
+Measure how the batch report scales with the number of worker processes.
+
+Run it from the repository root with
+
+    python -m benchmarks.batch_report [--files 200] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.datasets import generate
+from db import get_db
+from report import iter_reports
+
+
+def create_files(directory, files, habits, completions):
+    """
+    Create database files with a generated dataset each
+    :param directory: the directory of the files
+    :param files: the number of files
+    :param habits: the number of habits of every file
+    :param completions: the number of completed tasks of every file
+    :return: the paths of the files
+    """
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"user_{i:05d}.db")
+        db = get_db(path, "bulk-load")
+        generate(db, habits, completions, seed=i)
+        db.close()
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--habits", type=int, default=50)
+    parser.add_argument("--completions", type=int, default=5000)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1})
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = create_files(directory, args.files, args.habits, args.completions)
+        print(f"{os.cpu_count()} CPUs, {args.files} database files")
+        print(f"{'workers':>8} {'seconds':>8} {'files/s':>8} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            started = time.perf_counter()
+            for _ in iter_reports(paths, workers):
+                pass
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            print(
+                f"{workers:>8} {elapsed:>8.2f} {args.files / elapsed:>8.1f} "
+                f"{baseline / elapsed:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure the check-off latency while the completed task table grows.
+
+Run it from the repository root with
+
+    python -m benchmarks.checkoff_scaling [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from Habit import DatabaseHabit
+from db import get_db
+
+COMPLETIONS_PER_HABIT = 1000
+CHECK_OFFS = 200
+START = date(2000, 1, 1)
+
+
+def fill(db, rows, start_habit):
+    """
+    Add habits with `COMPLETIONS_PER_HABIT` completed tasks each until the table holds `rows` completed tasks
+    :param db: a database connection
+    :param rows: the target count of completed tasks
+    :param start_habit: the index of the first habit to add
+    :return: the index of the next habit to add
+    """
+    habit = start_habit
+    while habit * COMPLETIONS_PER_HABIT < rows:
+        title = f"habit_{habit}"
+        db.execute(
+            """INSERT INTO habit (title, description, periodicity, streak_count, longest_streak, creation_time)
+            VALUES (?, '', 'daily', 0, 0, ?)""",
+            (title, START),
+        )
+        db.executemany(
+            "INSERT INTO completed_task (date, habit_title) VALUES (?, ?)",
+            (
+                (START + timedelta(days=day), title)
+                for day in range(COMPLETIONS_PER_HABIT)
+            ),
+        )
+        habit += 1
+    db.commit()
+    return habit
+
+
+def measure(db, size):
+    """
+    Check off a new habit `CHECK_OFFS` times and return the mean latency in milliseconds
+    :param db: a database connection
+    :param size: the current count of completed tasks, used for the habit's title
+    :return: the mean latency of a check-off
+    """
+    habit = DatabaseHabit(f"probe_{size}", "", "daily", START)
+    habit.store(db)
+    started = time.perf_counter()
+    for day in range(1, CHECK_OFFS + 1):
+        habit.complete_task(db, START + timedelta(days=day))
+    elapsed = time.perf_counter() - started
+    return elapsed / CHECK_OFFS * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 3_000_000]
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = get_db(os.path.join(directory, "bench.db"))
+        next_habit = 0
+        print(f"{'completed tasks':>16} {'check-off ms':>13}")
+        for size in sorted(args.sizes):
+            next_habit = fill(db, size, next_habit)
+            print(f"{size:>16} {measure(db, size):>13.3f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
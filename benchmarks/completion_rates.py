@@ -0,0 +1,92 @@
+"""
+Measure the latency of the completion rates while the number of habits of one user grows.
+
+Run it from the repository root with
+
+    python -m benchmarks.completion_rates [--habits 100 300 1000] [--completions 20] [--max-growth 3]
+
+The completion rates are a single aggregate query over all habits of a user, so their time per habit must stay about
+the same when the number of habits grows. The exit status is 1 if the time per habit of the largest size is more than
+`--max-growth` times the time per habit of the smallest size, which catches a query plan that probes every habit's
+rows once per habit.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.datasets import title
+from db import add_completed_tasks, add_habits, bulk_completed_tasks, get_completion_stats, get_db
+
+START = date(2020, 1, 1)
+
+# The periodicities of the habits, every one of them is used by the same number of habits
+PERIODICITIES = ["daily", "weekly", "monthly", "weekdays", "every 3 days", "2 times per week"]
+
+# The number of timed queries at every size
+SAMPLES = 5
+
+
+def fill(db, habits, completions):
+    """
+    Add habits with every periodicity and `completions` completed tasks each, every second day
+    :param db: a database connection
+    :param habits: the number of habits
+    :param completions: the number of completed tasks of every habit
+    :return: None
+    """
+    with bulk_completed_tasks(db):
+        add_habits(
+            db,
+            (
+                (title(i), "", PERIODICITIES[i % len(PERIODICITIES)], START)
+                for i in range(habits)
+            ),
+        )
+        add_completed_tasks(
+            db,
+            (
+                (START + timedelta(days=2 * day), title(i))
+                for i in range(habits)
+                for day in range(completions)
+            ),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--completions", type=int, default=20)
+    parser.add_argument("--max-growth", type=float, default=3)
+    args = parser.parse_args()
+
+    end = START + timedelta(days=2 * args.completions)
+    per_habit = {}
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'habits':>8} {'completion rates ms':>20} {'µs per habit':>13}")
+        for habits in sorted(args.habits):
+            db = get_db(os.path.join(directory, f"rates_{habits}.db"), "fast")
+            fill(db, habits, args.completions)
+            times = []
+            for _ in range(SAMPLES):
+                started = time.perf_counter()
+                get_completion_stats(db, START, end)
+                times.append(time.perf_counter() - started)
+            db.close()
+            elapsed = statistics.median(times)
+            per_habit[habits] = elapsed / habits
+            print(f"{habits:>8} {elapsed * 1000:>20.1f} {per_habit[habits] * 1e6:>13.1f}")
+
+    smallest, largest = min(per_habit), max(per_habit)
+    growth = per_habit[largest] / per_habit[smallest]
+    if growth > args.max_growth:
+        print(f"The time per habit grew {growth:.1f} times from {smallest} to {largest} habits")
+        sys.exit(1)
+    print(f"The time per habit grew {growth:.1f} times, within {args.max_growth:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Load test the daemon: concurrent clients send check-offs and analytics queries, the p50 and p99 latencies of every
+operation are reported and compared with starting `habits.py done` for every check-off.
+
+Run it from the repository root with
+
+    python -m benchmarks.daemon_latency [--clients 8] [--requests 500] [--habits 1000]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.datasets import generate, title
+from client import HabitClient
+from db import get_db
+
+# Later than the completed tasks of the generated datasets
+START = date(2024, 1, 1)
+
+# The operations that every client sends in turn, mostly check-offs and a whole-database report now and then
+OPERATIONS = ["complete_task", "get_streak_for_habit"] * 4 + ["stats"]
+
+
+def start_daemon(address, database):
+    """
+    Start a daemon process and wait until it accepts connections
+    :param address: the socket path of the daemon
+    :param database: name of the database
+    :return: the daemon process
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "daemon", "--address", address, "--database", database],
+        cwd=root,
+    )
+    for _ in range(200):
+        try:
+            HabitClient(address).close()
+            return process
+        except Exception:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("The daemon did not start")
+
+
+def run_client(address, index, clients, requests, habits, latencies):
+    """
+    Send requests one after another and record their latencies
+    :param address: the socket path of the daemon
+    :param index: the index of the client
+    :param clients: the number of clients
+    :param requests: the number of requests of the client
+    :param habits: the number of habits
+    :param latencies: a dictionary of every operation and a list of latencies in seconds, it is filled
+    :return: None
+    """
+    with HabitClient(address) as client:
+        for i in range(requests):
+            op = OPERATIONS[i % len(OPERATIONS)]
+            n = i * clients + index
+            params = {"title": title(n % habits)}
+            if op == "complete_task":
+                params["custom_date"] = START + timedelta(days=n // habits)
+            elif op == "stats":
+                params = {}
+            started = time.perf_counter()
+            client.request(op, **params)
+            latencies[op].append(time.perf_counter() - started)
+
+
+def percentiles(latencies):
+    """
+    Return the median and the 99th percentile of latencies
+    :param latencies: a list of seconds
+    :return: the p50 and the p99 in milliseconds
+    """
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49] * 1000, quantiles[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=100_000)
+    parser.add_argument("--processes", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "daemon.db")
+        address = os.path.join(directory, "daemon.sock")
+        db = get_db(database, "bulk-load")
+        generate(db, args.habits, args.completions)
+        db.close()
+
+        daemon = start_daemon(address, database)
+        try:
+            latencies = {op: [] for op in OPERATIONS}
+            threads = [
+                threading.Thread(
+                    target=run_client,
+                    args=(address, i, args.clients, args.requests, args.habits, latencies),
+                )
+                for i in range(args.clients)
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+        # the same check-off in a new process every time, like a shell script or cron job without the daemon
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "habits.py")
+        env = dict(os.environ)
+        env.pop("HABITS_DAEMON", None)
+        latencies["habits.py done"] = []
+        for i in range(args.processes):
+            day = START + timedelta(days=100 + i)
+            started_process = time.perf_counter()
+            subprocess.run(
+                [sys.executable, script, "--database", database, "done", title(0), "--date", str(day)],
+                env=env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            latencies["habits.py done"].append(time.perf_counter() - started_process)
+
+    total = args.clients * args.requests
+    print(f"{total} requests of {args.clients} clients in {elapsed:.2f} s, {total / elapsed:.0f} requests/s")
+    print(f"{'operation':>22}  {'count':>6}  {'p50 ms':>7}  {'p99 ms':>7}")
+    for op, values in latencies.items():
+        p50, p99 = percentiles(values)
+        print(f"{op:>22}  {len(values):>6}  {p50:>7.2f}  {p99:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
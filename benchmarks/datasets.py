@@ -0,0 +1,57 @@
+"""
+Synthetic habit datasets for the benchmarks.
+"""
+import random
+from datetime import date, timedelta
+
+from streaks import recompute_streaks
+
+START = date(2020, 1, 1)
+
+# The number of completed tasks of every habit that has completed tasks
+COMPLETIONS_PER_HABIT = 100
+
+
+def generate(db, habits, completions, seed=0):
+    """
+    Fill an empty database with `habits` habits and `completions` completed tasks. The completed tasks belong to
+    the first habits, `COMPLETIONS_PER_HABIT` each, and skip a day now and then so that streaks break
+    :param db: a database connection
+    :param habits: the number of habits
+    :param completions: the number of completed tasks
+    :param seed: the seed of the random generator
+    :return: None
+    """
+    generator = random.Random(seed)
+    db.executemany(
+        """INSERT INTO habit (title, description, periodicity, streak_count, longest_streak, creation_time)
+        VALUES (?, ?, ?, 0, 0, ?)""",
+        (
+            (title(i), f"description {i}", "daily" if i % 2 else "weekly", START)
+            for i in range(habits)
+        ),
+    )
+
+    def completed_tasks():
+        for i in range(min(habits, -(-completions // COMPLETIONS_PER_HABIT))):
+            day = START
+            step = timedelta(days=1 if i % 2 else 7)
+            remaining = completions - i * COMPLETIONS_PER_HABIT
+            for _ in range(min(COMPLETIONS_PER_HABIT, remaining)):
+                day += step * (1 if generator.random() < 0.9 else 2)
+                yield day, title(i)
+
+    db.executemany(
+        "INSERT INTO completed_task (date, habit_title) VALUES (?, ?)", completed_tasks()
+    )
+    db.commit()
+    recompute_streaks(db)
+
+
+def title(i):
+    """
+    Return the title of the i-th generated habit
+    :param i: the index of the habit
+    :return: a title
+    """
+    return f"habit {i:07d}"
@@ -0,0 +1,96 @@
+"""
+Measure the latency of reading the state of a habit for a check-off, in one query and in one query per column.
+
+Run it from the repository root with
+
+    python -m benchmarks.habit_state [--habits 1000] [--completions 100000] [--fetches 1000]
+
+The state of a habit is read without the cache of habit rows, so that every fetch queries the database. The
+check-offs check off a new habit on consecutive days and are timed with the cache, like in the application.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from Habit import DatabaseHabit
+from benchmarks.datasets import START, generate, title
+from db import (
+    get_creation_time,
+    get_db,
+    get_habit_state,
+    get_latest_date,
+    get_longest_streak,
+    get_periodicity,
+    get_streak_count,
+    set_habit_cache,
+)
+
+
+def per_column(db, habit_title):
+    """
+    Read the state of a habit with one query per column
+    :param db: a database connection
+    :param habit_title: the title of the habit
+    :return: the streak count, the longest streak, the periodicity, the creation time and the latest date
+    """
+    return (
+        get_streak_count(db, habit_title),
+        get_longest_streak(db, habit_title),
+        get_periodicity(db, habit_title),
+        get_creation_time(db, habit_title),
+        get_latest_date(db, habit_title),
+    )
+
+
+def measure(db, fetch, habit_title, fetches):
+    """
+    Read the state of a habit `fetches` times
+    :param db: a database connection
+    :param fetch: a function that reads the state of a habit
+    :param habit_title: the title of the habit
+    :param fetches: the number of reads
+    :return: the number of statements of one read and the mean latency of a read in microseconds
+    """
+    statements = []
+    db.set_trace_callback(statements.append)
+    fetch(db, habit_title)
+    db.set_trace_callback(None)
+    started = time.perf_counter()
+    for _ in range(fetches):
+        fetch(db, habit_title)
+    elapsed = time.perf_counter() - started
+    return len(statements), elapsed / fetches * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=100_000)
+    parser.add_argument("--fetches", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = get_db(os.path.join(directory, "state.db"))
+        generate(db, args.habits, args.completions)
+
+        print(f"{'read':>12} {'statements':>11} {'µs per call':>12}")
+        cache = set_habit_cache(None)
+        for name, fetch in (("per column", per_column), ("habit state", get_habit_state)):
+            statements, latency = measure(db, fetch, title(0), args.fetches)
+            print(f"{name:>12} {statements:>11} {latency:>12.1f}")
+        set_habit_cache(cache)
+
+        habit = DatabaseHabit("probe", "", "daily", START)
+        habit.store(db)
+        started = time.perf_counter()
+        for day in range(args.fetches):
+            habit.complete_task(db, START + timedelta(days=day))
+        elapsed = time.perf_counter() - started
+        print(f"{'check-off':>12} {'':>11} {elapsed / args.fetches * 1e6:>12.1f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
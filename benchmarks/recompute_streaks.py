@@ -0,0 +1,78 @@
+"""
+Measure the recalculation of the streaks of all habits from their completed tasks.
+
+Run it from the repository root with
+
+    python -m benchmarks.recompute_streaks [--habits 100000] [--completions 1000]
+
+Every habit has `--completions` completed tasks on consecutive days with a skipped day now and then, half of the
+habits are daily and half weekly. The loading of the completed periods, the array operations and the whole
+`recompute_streaks`, which also stores the streaks and rebuilds the streak runs, are timed separately.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.datasets import title
+from db import add_completed_tasks, add_habits, get_db
+from streaks import compute_streaks, load_completions, recompute_streaks
+
+START = date(2000, 1, 1)
+
+# A day is skipped after every `RUN_DAYS` completed tasks, which breaks the daily streaks
+RUN_DAYS = 50
+
+# The number of habits whose completed tasks are added in one transaction
+CHUNK_HABITS = 1000
+
+
+def fill(db, habits, completions):
+    """
+    Add daily and weekly habits with `completions` completed tasks each. The completed tasks are added in chunks
+    with the triggers of the rollup table, a single rebuild of the rollup table would sort all completed tasks in
+    memory
+    :param db: a database connection
+    :param habits: the number of habits
+    :param completions: the number of completed tasks of every habit
+    :return: None
+    """
+    days = [START + timedelta(days=day + day // RUN_DAYS) for day in range(completions)]
+    add_habits(db, ((title(i), "", "daily" if i % 2 else "weekly", START) for i in range(habits)))
+    for first in range(0, habits, CHUNK_HABITS):
+        add_completed_tasks(
+            db,
+            ((day, title(i)) for i in range(first, min(first + CHUNK_HABITS, habits)) for day in days),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--completions", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = get_db(os.path.join(directory, "streaks.db"), "bulk-load")
+        started = time.perf_counter()
+        fill(db, args.habits, args.completions)
+        print(f"{'fill':>10} {time.perf_counter() - started:>8.1f} s")
+
+        started = time.perf_counter()
+        titles, gaps, habit_index, buckets = load_completions(db)
+        print(f"{'load':>10} {time.perf_counter() - started:>8.1f} s")
+
+        started = time.perf_counter()
+        compute_streaks(habit_index, buckets, gaps)
+        print(f"{'compute':>10} {time.perf_counter() - started:>8.1f} s")
+        del titles, gaps, habit_index, buckets
+
+        started = time.perf_counter()
+        recompute_streaks(db)
+        print(f"{'recompute':>10} {time.perf_counter() - started:>8.1f} s")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Time the habit operations, the analytics and the connection start on synthetic datasets and write the results
+as JSON so that releases can be compared.
+
+Run it from the repository root with
+
+    python -m benchmarks.run [--sizes 1000 100000 1000000] [--storage memory disk] [--profile durable]
+        [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import analytics
+from Habit import DatabaseHabit
+from benchmarks.datasets import generate, title, START
+from db import get_db, PROFILES
+
+SIZES = [1_000, 100_000, 1_000_000]
+STORAGES = ["memory", "disk"]
+
+
+def measure(operation, repeat):
+    """
+    Call an operation `repeat` times and return the durations in milliseconds
+    :param operation: a function that receives the number of the call
+    :param repeat: the number of calls
+    :return: a list of durations
+    """
+    durations = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        operation(i)
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+def summarize(storage, size, name, durations):
+    """
+    Describe the durations of an operation
+    :param storage: `memory` or `disk`
+    :param size: the number of habits and completed tasks of the dataset
+    :param name: the name of the operation
+    :param durations: durations in milliseconds
+    :return: a dictionary for the JSON report
+    """
+    return {
+        "storage": storage,
+        "size": size,
+        "operation": name,
+        "repeat": len(durations),
+        "mean_ms": statistics.fmean(durations),
+        "median_ms": statistics.median(durations),
+        "min_ms": min(durations),
+        "max_ms": max(durations),
+    }
+
+
+def scenarios(db, size, name, profile):
+    """
+    Return the operations to time on a database with a generated dataset
+    :param db: a database connection
+    :param size: the number of habits and completed tasks of the dataset
+    :param name: the name of the database, to reconnect for the cold start
+    :param profile: the connection profile
+    :return: pairs of an operation's name and a pair of the operation and its repeat count
+    """
+    end = START + timedelta(days=365)
+    probe = DatabaseHabit(title(0))
+    check_off_start = START + timedelta(days=10_000)
+    repeat = 20 if size >= 1_000_000 else 100
+
+    def cold_start(_):
+        get_db(name, profile).close()
+
+    def store(i):
+        DatabaseHabit(f"stored {i}", "", "daily", START).store(db)
+
+    def delete(i):
+        DatabaseHabit(f"stored {i}").delete(db)
+
+    return [
+        ("get_db", (cold_start, repeat)),
+        ("store", (store, repeat)),
+        (
+            "complete_task",
+            (lambda i: probe.complete_task(db, check_off_start + timedelta(days=i)), repeat),
+        ),
+        ("delete", (delete, repeat)),
+        ("analytics.get_habits", (lambda _: list(analytics.get_habits(db)), 3)),
+        ("analytics.get_habits_page", (lambda _: analytics.get_habits_page(db), repeat)),
+        ("analytics.get_period_habits", (lambda _: list(analytics.get_period_habits(db, "daily")), 3)),
+        (
+            "analytics.get_streak_for_habit",
+            (lambda _: analytics.get_streak_for_habit(db, title(0)), repeat),
+        ),
+        ("analytics.get_streaks_for_habits", (lambda _: analytics.get_streaks_for_habits(db), 3)),
+        ("analytics.get_weakest_habits", (lambda _: analytics.get_weakest_habits(db), 3)),
+        (
+            "analytics.get_weakest_habits(range)",
+            (lambda _: analytics.get_weakest_habits(db, START, end), 3),
+        ),
+        (
+            "analytics.get_completion_rates",
+            (lambda _: analytics.get_completion_rates(db, START, end), 3),
+        ),
+    ]
+
+
+def run(storage, size, directory, profile):
+    """
+    Generate a dataset and time all operations on it
+    :param storage: `memory` or `disk`
+    :param size: the number of habits and completed tasks of the dataset
+    :param directory: a directory for on-disk databases
+    :param profile: the connection profile
+    :return: a list of result dictionaries
+    """
+    name = ":memory:" if storage == "memory" else os.path.join(directory, f"{size}.db")
+    db = get_db(name, profile)
+    generate(db, size, size)
+
+    results = []
+    for operation_name, (operation, repeat) in scenarios(db, size, name, profile):
+        durations = measure(operation, repeat)
+        results.append(summarize(storage, size, operation_name, durations))
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--storage", nargs="+", choices=STORAGES, default=STORAGES)
+    parser.add_argument("--profile", choices=PROFILES, default="durable")
+    parser.add_argument("--output", help="a JSON file for the results, stdout by default")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for storage in args.storage:
+            for size in args.sizes:
+                results.extend(run(storage, size, directory, args.profile))
+                print(f"finished {storage} {size}", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "profile": args.profile,
+        "results": results,
+    }
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
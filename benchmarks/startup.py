@@ -0,0 +1,112 @@
+"""
+Measure the startup time of the scriptable command line interface and check it against a budget.
+
+Run it from the repository root with
+
+    python -m benchmarks.startup [--budget-ms 50] [--runs 21]
+
+Every command runs in a new interpreter with the bytecode cache enabled, like an installed application. The budget of
+50 ms to the first query applies to the time that the application adds before it: the median wall time of
+`habits.py list`, which makes a single query, minus the median wall time of an interpreter that runs nothing. How fast
+the machine starts Python itself is not part of the budget. The exit status is 1 if the budget is exceeded, and
+`test_portfolio.py` checks the same budget.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import generate, title
+from db import get_db
+
+HABITS = 100
+COMPLETIONS = 10_000
+
+# The milliseconds that the application may add to the start of the interpreter before its first query
+BUDGET_MS = 50
+
+COMMANDS = [
+    ("list", ["list"]),
+    ("stats", ["--json", "stats"]),
+    ("done", ["done", title(1), "--date", "2020-01-01"]),
+]
+
+
+def time_command(args, env, runs):
+    """
+    Run a command repeatedly and return its median wall time
+    :param args: the command line arguments
+    :param env: the environment of the process
+    :param runs: the number of runs
+    :return: the median of the elapsed seconds
+    """
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(args, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def measure(runs, labels=None):
+    """
+    Time the commands and an interpreter that runs nothing on a generated database
+    :param runs: the number of runs of every command
+    :param labels: the labels of the timed commands of COMMANDS, all of them by default
+    :return: the median seconds of the interpreter and a dictionary of the median seconds of every command
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "habits.py")
+
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.join(directory, "startup.db")
+        db = get_db(name, "bulk-load")
+        generate(db, HABITS, COMPLETIONS)
+        db.close()
+
+        command = [sys.executable, script, "--database", name]
+        # the first run writes the bytecode cache
+        subprocess.run(command + ["list"], env=env, check=True, stdout=subprocess.DEVNULL)
+        interpreter = time_command([sys.executable, "-c", "pass"], env, runs)
+        medians = {
+            label: time_command(command + arguments, env, runs)
+            for label, arguments in COMMANDS
+            if labels is None or label in labels
+        }
+    return interpreter, medians
+
+
+def first_query_ms(interpreter, medians):
+    """
+    Return the time that the application adds before its first query
+    :param interpreter: the median seconds of an interpreter that runs nothing
+    :param medians: the median seconds of the commands, with the `list` command
+    :return: milliseconds
+    """
+    return (medians["list"] - interpreter) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=21)
+    args = parser.parse_args()
+
+    interpreter, medians = measure(args.runs)
+    print(f"{'interpreter':>12}  {interpreter * 1000:>6.1f} ms")
+    for label, median in medians.items():
+        print(f"{label:>12}  {median * 1000:>6.1f} ms")
+
+    first_query = first_query_ms(interpreter, medians)
+    if first_query > args.budget_ms:
+        print(f"The startup budget of {args.budget_ms:.0f} ms was exceeded: {first_query:.1f} ms")
+        sys.exit(1)
+    print(f"The startup takes {first_query:.1f} ms, within the budget of {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
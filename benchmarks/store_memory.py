@@ -0,0 +1,71 @@
+"""
+Compare the memory of the whole dataset in a HabitStore with the habit rows and completed task rows of the database.
+
+Run it from the repository root with
+
+    python -m benchmarks.store_memory [--habits 10000] [--completions 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.datasets import generate
+from constants import DEFAULT_USER
+from db import get_db, get_completed_tasks, iter_habits_period
+from store import HabitStore
+
+
+def measure(load):
+    """
+    Load a dataset and return the allocated memory and the loading time
+    :param load: a callable that returns the dataset
+    :return: the dataset, the allocated bytes and the elapsed seconds
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    dataset = load()
+    elapsed = time.perf_counter() - started
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return dataset, allocated, elapsed
+
+
+def load_rows(db):
+    """
+    Load the habit rows and the completed task rows of every habit as they are returned by the database
+    :param db: a database connection
+    :return: a dictionary of habit rows and their completed task rows
+    """
+    rows = {}
+    for periodicity in ("daily", "weekly"):
+        for row in iter_habits_period(db, periodicity):
+            habit = db.execute(
+                "SELECT * FROM habit WHERE user_id=? AND title=?", (DEFAULT_USER, row[0])
+            ).fetchone()
+            rows[row[0]] = (habit, get_completed_tasks(db, row[0]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=10_000)
+    parser.add_argument("--completions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    db = get_db(":memory:", "bulk-load")
+    generate(db, args.habits, args.completions)
+
+    rows, rows_bytes, rows_time = measure(lambda: load_rows(db))
+    store, store_bytes, store_time = measure(lambda: HabitStore.load(db))
+    print(f"{'':>6}  {'MiB':>8}  {'bytes/habit':>11}  {'load s':>7}")
+    for name, allocated, elapsed in [
+        ("rows", rows_bytes, rows_time),
+        ("store", store_bytes, store_time),
+    ]:
+        print(
+            f"{name:>6}  {allocated / 2**20:>8.1f}  {allocated / args.habits:>11.0f}  {elapsed:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
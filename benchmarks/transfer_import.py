@@ -0,0 +1,74 @@
+"""
+Measure the throughput of importing habits and completed tasks from files into an empty database.
+
+Run it from the repository root with
+
+    python -m benchmarks.transfer_import [--habits 1000] [--completions 1000] [--formats jsonl csv]
+
+The files hold `--habits` daily habits with `--completions` completed tasks each. The throughput is the number of
+imported rows of both files per second of `transfer.import_directory`, which includes the checks, the rollup table
+and the recalculation of the streaks.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import transfer
+from benchmarks.datasets import title
+from db import get_db
+
+START = date(2000, 1, 1)
+
+
+def write_files(directory, file_format, habits, completions):
+    """
+    Write the files of an import
+    :param directory: the path of the directory
+    :param file_format: `jsonl`, `csv` or `parquet`
+    :param habits: the number of habits
+    :param completions: the number of completed tasks of every habit
+    :return: None
+    """
+    os.makedirs(directory)
+    habits_path, completions_path = transfer.paths(directory, file_format)
+    transfer.write_rows(
+        habits_path,
+        file_format,
+        transfer.HABIT_COLUMNS,
+        ((title(i), "", "daily", str(START)) for i in range(habits)),
+    )
+    days = [str(START + timedelta(days=day)) for day in range(completions)]
+    transfer.write_rows(
+        completions_path,
+        file_format,
+        transfer.COMPLETED_TASK_COLUMNS,
+        ((title(i), day) for i in range(habits) for day in days),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=1000)
+    parser.add_argument("--formats", nargs="+", default=["jsonl", "csv"], choices=transfer.FORMATS)
+    args = parser.parse_args()
+
+    rows = args.habits * (args.completions + 1)
+    today = START + timedelta(days=args.completions)
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'format':>8} {'rows':>10} {'seconds':>8} {'rows/s':>10}")
+        for file_format in args.formats:
+            files = os.path.join(directory, file_format)
+            write_files(files, file_format, args.habits, args.completions)
+            db = get_db(os.path.join(directory, f"{file_format}.db"), "bulk-load")
+            started = time.perf_counter()
+            transfer.import_directory(db, files, file_format, today)
+            elapsed = time.perf_counter() - started
+            db.close()
+            print(f"{file_format:>8} {rows:>10} {elapsed:>8.1f} {rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
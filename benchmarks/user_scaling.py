@@ -0,0 +1,130 @@
+"""
+Measure the per-user check-off and analytics latency while the number of users in one database grows.
+
+Run it from the repository root with
+
+    python -m benchmarks.user_scaling [--users 1 10 100 1000] [--habits 10] [--completions 100]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+import analytics
+from benchmarks.datasets import title
+from db import (
+    add_completed_tasks,
+    add_habits,
+    bulk_completed_tasks,
+    get_db,
+    rebuild_streak_runs,
+    set_habit_cache,
+    set_streaks_from_runs,
+)
+from Habit import DatabaseHabit
+
+START = date(2020, 1, 1)
+
+# The number of users whose operations are timed at every size
+SAMPLES = 200
+
+
+def fill(db, first_user, last_user, habits, completions):
+    """
+    Add users with `habits` daily habits each and `completions` consecutive completed tasks per habit
+    :param db: a database connection
+    :param first_user: the first user to add
+    :param last_user: the user after the last user to add
+    :param habits: the number of habits of every user
+    :param completions: the number of completed tasks of every habit
+    :return: None
+    """
+    with bulk_completed_tasks(db):
+        for user_id in range(first_user, last_user):
+            add_habits(
+                db, ((title(i), "", "daily", START) for i in range(habits)), user_id
+            )
+            add_completed_tasks(
+                db,
+                (
+                    (START + timedelta(days=day), title(i))
+                    for i in range(habits)
+                    for day in range(1, completions + 1)
+                ),
+                user_id=user_id,
+            )
+            rebuild_streak_runs(db, user_id)
+            set_streaks_from_runs(db, user_id)
+
+
+def measure(db, users, habits, completions, size):
+    """
+    Time the operations of randomly chosen users
+    :param db: a database connection
+    :param users: the number of users in the database
+    :param habits: the number of habits of every user
+    :param completions: the number of completed tasks of every habit
+    :param size: an index of the measurement, so that every check-off is a new day
+    :return: a dictionary of every operation and its median latency in microseconds
+    """
+    generator = random.Random(size)
+    end = START + timedelta(days=completions)
+    start = end - timedelta(days=27)
+    operations = {
+        "check-off": lambda user_id, habit: DatabaseHabit(
+            habit, user_id=user_id
+        ).complete_task(db, end + timedelta(days=size + 1)),
+        "streak": lambda user_id, habit: analytics.get_streak_for_habit(db, habit, user_id),
+        "completion rates": lambda user_id, habit: analytics.get_completion_rates(
+            db, start, end, user_id
+        ),
+        "completions per period": lambda user_id, habit: analytics.get_completions_per_period(
+            db, "daily", start, end, user_id
+        ),
+    }
+    latencies = {name: [] for name in operations}
+    # the samples are distinct users, so that a check-off never repeats a day
+    for user_id in generator.sample(range(users), min(SAMPLES, users)):
+        habit = title(generator.randrange(habits))
+        for name, operation in operations.items():
+            started = time.perf_counter()
+            operation(user_id, habit)
+            latencies[name].append(time.perf_counter() - started)
+    return {name: statistics.median(values) * 1e6 for name, values in latencies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--habits", type=int, default=10)
+    parser.add_argument("--completions", type=int, default=100)
+    args = parser.parse_args()
+
+    # the streak is read through the habit cache otherwise, every operation should reach the database
+    set_habit_cache(None)
+    with tempfile.TemporaryDirectory() as directory:
+        db = get_db(os.path.join(directory, "users.db"), "fast")
+        users = 0
+        header = None
+        for size, target in enumerate(sorted(args.users)):
+            fill(db, users, target, args.habits, args.completions)
+            users = target
+            medians = measure(db, users, args.habits, args.completions, size)
+            if header is None:
+                header = f"{'users':>7} {'completed tasks':>16}" + "".join(
+                    f" {name + ' µs':>26}" for name in medians
+                )
+                print(header)
+            rows = users * args.habits * args.completions
+            print(
+                f"{users:>7} {rows:>16}"
+                + "".join(f" {value:>26.1f}" for value in medians.values())
+            )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+
+class CacheStats(namedtuple("CacheStats", ["hits", "misses", "evictions", "size", "maxsize"])):
+    """Counters of a HabitCache"""
+
+    __slots__ = ()
+
+
+class HabitCache:
+    # A marker for keys that are not in the cache, `None` is a valid cached value for a missing habit
+    MISSING = object()
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        A bounded, thread-safe cache of habit rows that evicts the least recently used rows
+        :param maxsize: the maximal number of cached rows
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Grows with every invalidation, a row that was read before an invalidation is not stored
+        self.generation = 0
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a cached row and mark it as recently used
+        :param key: a triple of a database key, a user and a habit's title
+        :return: the cached row or HabitCache.MISSING
+        """
+        with self._lock:
+            row = self._rows.get(key, self.MISSING)
+            if row is self.MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._rows.move_to_end(key)
+            return row
+
+    def put(self, key, row, generation=None):
+        """
+        Store a row, evicting the least recently used row if the cache is full
+        :param key: a triple of a database key, a user and a habit's title
+        :param row: a habit's row or None if the habit does not exist
+        :param generation: the generation of the cache before the row was read, the row is not stored if there
+         were invalidations since then
+        :return: None
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._rows[key] = row
+            self._rows.move_to_end(key)
+            if len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Remove a row from the cache
+        :param key: a triple of a database key, a user and a habit's title
+        :return: None
+        """
+        with self._lock:
+            self.generation += 1
+            self._rows.pop(key, None)
+
+    def clear(self, database_key=None):
+        """
+        Remove all rows of a database or all rows at all
+        :param database_key: a database key or None to remove every row
+        :return: None
+        """
+        with self._lock:
+            self.generation += 1
+            if database_key is None:
+                self._rows.clear()
+                return
+            for key in [key for key in self._rows if key[0] == database_key]:
+                del self._rows[key]
+
+    def stats(self):
+        """
+        Return the counters of the cache
+        :return: CacheStats
+        """
+        return CacheStats(
+            self.hits, self.misses, self.evictions, len(self._rows), self.maxsize
+        )
@@ -0,0 +1,105 @@
+"""
+A thin client of the daemon, see `daemon.py`.
+
+It imports nothing but socket and json, so that a short-lived process which sends one command stays cheap.
+"""
+import json
+import socket
+
+
+class RequestError(Exception):
+    """The daemon rejected a request or could not be reached, the message is shown to the user"""
+
+
+def is_loopback(host):
+    """
+    Check if a host name or address is the local machine, without a name lookup
+    :param host: a host name or an IP address
+    :return: True or False
+    """
+    if host in ("localhost", "::1"):
+        return True
+    parts = host.split(".")
+    return len(parts) == 4 and parts[0] == "127" and all(part.isdigit() for part in parts)
+
+
+def parse_address(address):
+    """
+    Split the address of a daemon, raise ValueError if a TCP address is not on the local machine. The daemon does
+    not authenticate its clients, so it must not be reachable from other machines
+    :param address: a Unix domain socket path or HOST:PORT
+    :return: a socket path or a pair of a host and a port
+    """
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        host = host or "localhost"
+        if not is_loopback(host):
+            raise ValueError(
+                f"The daemon only listens on localhost, `{host}` is not a loopback address."
+            )
+        return host, int(port)
+    return address
+
+
+class HabitClient:
+    def __init__(self, address, timeout=None):
+        """
+        A connection to a daemon that sends one request at a time
+        :param address: a Unix domain socket path or HOST:PORT
+        :param timeout: the seconds to wait for the daemon or None to wait forever
+        """
+        try:
+            address = parse_address(address)
+        except ValueError as error:
+            raise RequestError(str(error)) from None
+        try:
+            if isinstance(address, tuple):
+                self._socket = socket.create_connection(address, timeout)
+            else:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.settimeout(timeout)
+                self._socket.connect(address)
+        except OSError as error:
+            raise RequestError(f"The daemon is not running at `{address}`: {error}") from None
+        self._file = self._socket.makefile("rb")
+        self._id = 0
+
+    def request(self, op, **params):
+        """
+        Send a request and wait for its response
+        :param op: the name of the operation, see `operations.py`
+        :param params: the parameters of the operation, dates are sent as YYYY-MM-DD
+        :return: the result of the operation as JSON objects
+        """
+        self._id += 1
+        message = {"id": self._id, "op": op, "params": params}
+        self._socket.sendall(json.dumps(message, default=str).encode() + b"\n")
+        line = self._file.readline()
+        if not line:
+            raise RequestError("The daemon closed the connection.")
+        response = json.loads(line)
+        if "error" in response:
+            raise RequestError(response["error"])
+        return response["result"]
+
+    def close(self):
+        """
+        Close the connection
+        :return: None
+        """
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        """
+        Use the client as a context manager that closes it at the end
+        :return: the client
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Close the client
+        :return: None
+        """
+        self.close()
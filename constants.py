@@ -1,5 +1,8 @@
-# Set a data type for periodicity
-Periodicity: list = ["daily", "weekly"]
-
 # A message in case of the invalid input
 invalid_value_message = "Not a valid input"
+
+# The number of habits on a page when browsing habits
+PAGE_SIZE = 10
+
+# The user of the habits in a single-user database, habits that were added before there were users belong to them
+DEFAULT_USER = 0
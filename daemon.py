@@ -0,0 +1,214 @@
+"""
+A long-running daemon that keeps a warm database connection and serves the habit operations and analytics.
+
+Run it from the repository root with
+
+    python -m daemon [--address habits.sock] [--database main.db] [--user 0] [--profile durable] [--instrument]
+
+The address is a Unix domain socket path or HOST:PORT on the local machine, e.g. localhost:8765. The daemon does not
+authenticate its clients: the socket file is only accessible by the user who started the daemon, a TCP address must
+be a loopback address, and the daemon serves the habits of the user given by --user, a request cannot choose another
+one. Requests and responses are JSON objects, one per line. A request names an operation of `operations.py` and its parameters, dates are YYYY-MM-DD:
+
+    {"id": 1, "op": "complete_task", "params": {"title": "reading", "custom_date": "2023-08-02"}}
+
+The response carries the id of the request and its result or an error message:
+
+    {"id": 1, "result": {"title": "reading", "date": "2023-08-02", ...}}
+    {"id": 1, "error": "The habit with the title `reading` does not exist."}
+
+A client may send further requests before the responses arrive, the responses can then come in a different order.
+The writes of all clients that arrive in the same event loop iteration are committed in one transaction, see
+`aio.AsyncHabitDB`. `habits.py --daemon ADDRESS` sends its commands to the daemon. With --instrument the statements
+of the daemon are profiled and the `metrics` operation returns them in the Prometheus text format, see `profiling.py`.
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import signal
+import stat
+
+from aio import AsyncHabitDB
+from client import parse_address
+from constants import DEFAULT_USER
+from db import set_profiler
+from operations import CommandError, as_json, prepare, run
+from profiling import Profiler
+
+
+def check_parameters(function, params):
+    """
+    Fail if an operation does not accept the parameters of a request
+    :param function: the function of the operation
+    :param params: a dictionary of the parameters
+    :return: None
+    """
+    try:
+        inspect.signature(function).bind(None, **params)
+    except TypeError as error:
+        raise CommandError(f"Invalid parameters: {error}") from None
+
+
+def bind_user(function, params, user_id):
+    """
+    Pass the user of the daemon to an operation, fail if a request names a user itself
+    :param function: the function of the operation
+    :param params: a dictionary of the parameters
+    :param user_id: the user of the daemon
+    :return: the parameters with the user
+    """
+    if "user_id" in params:
+        raise CommandError("A request cannot choose the user, the daemon serves the user given by --user.")
+    if "user_id" in inspect.signature(function).parameters:
+        params = {**params, "user_id": user_id}
+    return params
+
+
+async def answer(adb, line, user_id=DEFAULT_USER):
+    """
+    Run the operation of a request
+    :param adb: an AsyncHabitDB
+    :param line: a line of JSON with the request
+    :param user_id: the user of the daemon
+    :return: the response
+    """
+    request_id = None
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict) or not isinstance(request.get("params", {}), dict):
+            raise CommandError("A request must be a JSON object with an object of params.")
+        request_id = request.get("id")
+        kind, function, params = prepare(request.get("op"), request.get("params", {}))
+        params = bind_user(function, params, user_id)
+        check_parameters(function, params)
+        if kind == "write":
+            result = await adb.write(run, function, params)
+        else:
+            result = await adb.read(run, function, params)
+        return {"id": request_id, "result": as_json(result)}
+    except CommandError as error:
+        return {"id": request_id, "error": str(error)}
+    except json.JSONDecodeError:
+        return {"id": request_id, "error": "A request must be a line of JSON."}
+    except Exception as error:
+        return {"id": request_id, "error": f"The request failed: {error!r}"}
+
+
+async def respond(adb, line, writer, user_id):
+    """
+    Answer a request and send the response
+    :param adb: an AsyncHabitDB
+    :param line: a line of JSON with the request
+    :param writer: the StreamWriter of the client
+    :param user_id: the user of the daemon
+    :return: None
+    """
+    response = await answer(adb, line, user_id)
+    if not writer.is_closing():
+        writer.write(json.dumps(response, default=str).encode() + b"\n")
+        await writer.drain()
+
+
+async def serve_client(adb, user_id, reader, writer):
+    """
+    Answer the requests of a client until it closes the connection
+    :param adb: an AsyncHabitDB
+    :param user_id: the user of the daemon
+    :param reader: the StreamReader of the client
+    :param writer: the StreamWriter of the client
+    :return: None
+    """
+    tasks = set()
+    try:
+        while line := await reader.readline():
+            task = asyncio.create_task(respond(adb, line, writer, user_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    except (ConnectionError, ValueError):
+        # the client went away or sent a line longer than the limit of the StreamReader
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(
+    address, database="main.db", profile="durable", started=None, stop=None, user_id=DEFAULT_USER
+):
+    """
+    Serve requests until the stop event is set
+    :param address: a Unix domain socket path or localhost:PORT
+    :param database: name of the database
+    :param profile: the connection profile, see `db.PROFILES`
+    :param started: an asyncio.Event that is set once the daemon accepts connections, or None
+    :param stop: an asyncio.Event that stops the daemon, or None to stop it on SIGINT and SIGTERM
+    :param user_id: the user whose habits the daemon serves
+    :return: None
+    """
+    address = parse_address(address)
+    signals = ()
+    if stop is None:
+        stop = asyncio.Event()
+        signals = (signal.SIGINT, signal.SIGTERM)
+    loop = asyncio.get_running_loop()
+    for signal_number in signals:
+        loop.add_signal_handler(signal_number, stop.set)
+
+    async with AsyncHabitDB(database, profile) as adb:
+        # open the connection and create the tables before the first request
+        await adb.read(lambda db: None)
+        handler = functools.partial(serve_client, adb, user_id)
+        if isinstance(address, tuple):
+            server = await asyncio.start_server(handler, *address)
+        else:
+            # a socket file is left behind if the previous daemon was killed
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+            # the socket file is created without permissions for the group and others
+            mask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(handler, address)
+            finally:
+                os.umask(mask)
+        try:
+            async with server:
+                if started is not None:
+                    started.set()
+                await stop.wait()
+        finally:
+            if not isinstance(address, tuple) and os.path.exists(address):
+                os.unlink(address)
+            for signal_number in signals:
+                loop.remove_signal_handler(signal_number)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--address", default="habits.sock")
+    parser.add_argument("--database", default="main.db")
+    parser.add_argument(
+        "--user", type=int, default=DEFAULT_USER, help="the user whose habits the daemon serves"
+    )
+    parser.add_argument("--profile", default="durable")
+    parser.add_argument("--instrument", action="store_true", help="profile the statements")
+    parser.add_argument(
+        "--slow-query-ms",
+        type=float,
+        default=10,
+        help="capture the query plans of statements that take longer, with --instrument",
+    )
+    args = parser.parse_args(argv)
+    try:
+        parse_address(args.address)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.instrument:
+        set_profiler(Profiler(args.slow_query_ms))
+    asyncio.run(serve(args.address, args.database, args.profile, user_id=args.user))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,691 @@
+import os
 import sqlite3
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import date
 
+from cache import HabitCache
+from constants import DEFAULT_USER
+from periods import FIXED, get_period, is_periodicity
+from results import HabitChange, emit
+from runs import Run
 
-def get_db(name="main.db"):
+# Transaction depths of the connections that are inside `transaction`
+_transactions = {}
+
+# Users and titles of the habits that a connection changed since its last commit
+_changed_titles = {}
+
+# Depths of the connections that are inside `read_batch`
+_read_batches = {}
+
+# The number of rows that the iterators of this module fetch at once
+BATCH_SIZE = 500
+
+# The PRAGMA settings of the connection profiles of `get_db`. All of them use write-ahead logging so that
+# readers do not block the writer, they differ in how much durability they trade for speed
+PROFILES = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -8_000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5_000,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64_000,
+        "mmap_size": 268_435_456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5_000,
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256_000,
+        "mmap_size": 1_073_741_824,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5_000,
+    },
+}
+
+# The number of prepared statements that every connection keeps
+CACHED_STATEMENTS = 256
+
+# The cache of habit rows in front of `get_habit`, None when caching is disabled
+_habit_cache = HabitCache()
+
+# The Profiler of the connections that `get_db` opens, None when profiling is disabled, see `profiling.py`
+_profiler = None
+
+# Dates are stored as INTEGER day ordinals, see `date.toordinal`. Columns that are declared as DAYINT are
+# converted back to dates when they are read
+sqlite3.register_adapter(date, date.toordinal)
+sqlite3.register_converter("DAYINT", lambda value: date.fromordinal(int(value)))
+
+# The difference between the julianday() of a date and its day ordinal, to convert text dates in SQL
+JULIAN_DAY_OFFSET = 1721424
+
+# The period bucket of a day in SQL, see `periods.Period.bucket`. {periodicity} is a row of the periodicity table
+PERIOD_BUCKET = (
+    "(CASE {periodicity}.unit"
+    f" WHEN 'month' THEN CAST(strftime('%Y', {{day}} + {JULIAN_DAY_OFFSET + 0.5}) AS INTEGER) * 12"
+    f" + CAST(strftime('%m', {{day}} + {JULIAN_DAY_OFFSET + 0.5}) AS INTEGER) - 1"
+    " WHEN 'weekday' THEN ({day} - 1) / 7 * 5 + MIN(({day} - 1) % 7, 4)"
+    " ELSE {day} - 1 END) / {periodicity}.size"
+)
+
+
+class Connection(sqlite3.Connection):
+    """A database connection that knows the database file it is connected to"""
+
+    database_key = None
+    # the last `PRAGMA data_version` of the connection, see `check_data_version`
+    data_version = None
+
+
+# The records of this module and of the modules it imports are `collections.namedtuple` classes: importing `typing`
+# would take a large part of the startup budget of a command, see `benchmarks/startup.py`
+class HabitState(
+    namedtuple(
+        "HabitState",
+        [
+            "title",
+            "description",
+            "periodicity",
+            "streak_count",
+            "longest_streak",
+            "creation_time",
+            # the day ordinal of the latest completed task or None
+            "latest_day",
+            # the habit's last streak run or None, see `runs.py`
+            "last_run",
+        ],
+    )
+):
+    """A habit's row together with the date of its latest completed task"""
+
+    __slots__ = ()
+
+
+class CompletionStats(
+    namedtuple(
+        "CompletionStats",
+        [
+            "title",
+            "periodicity",
+            "expected",
+            "completed",
+            "missed",
+            "completion_rate",
+            "longest_gap",
+        ],
+    )
+):
+    """How regularly a habit was completed within a date range"""
+
+    __slots__ = ()
+
+
+def get_db(name="main.db", profile="durable", check_same_thread=True, read_only=False):
     """
-    Create a connection to the database and initialize tables
+    Create a connection to the database, configure it and initialize tables
     :param name: name of the database
+    :param profile: `durable`, `fast` or `bulk-load`, see PROFILES
+    :param check_same_thread: whether only the creating thread may use the connection
+    :param read_only: whether an existing database file is opened with `mode=ro`. Its journal mode and its tables
+     are left as they are, sqlite3.DatabaseError is raised if its schema is older than SCHEMA_VERSION
     :return: a database connection
     """
-    db = sqlite3.connect(name)
-    create_tables(db)
+    if profile not in PROFILES:
+        raise ValueError(f"There is no connection profile `{profile}`")
+    database = name
+    if read_only:
+        from pathlib import Path
+
+        database = f"{Path(name).absolute().as_uri()}?mode=ro"
+    db = sqlite3.connect(
+        database,
+        factory=Connection if _profiler is None else _profiler.connection_factory,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=check_same_thread,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        uri=read_only,
+    )
+    try:
+        for pragma, value in PROFILES[profile].items():
+            if not (read_only and pragma == "journal_mode"):
+                db.execute(f"PRAGMA {pragma}={value}")
+        db.database_key = db if name == ":memory:" else os.path.abspath(name)
+        if _habit_cache is not None:
+            # the file could have been changed while no connection to it was open
+            _habit_cache.clear(db.database_key)
+        if read_only:
+            check_schema(db)
+        else:
+            create_tables(db)
+    except BaseException:
+        db.close()
+        raise
     return db
 
 
+def database_key(db):
+    """
+    Return a key that is shared by all connections to the same database file
+    :param db: a database connection
+    :return: the database key
+    """
+    return getattr(db, "database_key", None) or db
+
+
+def set_habit_cache(cache):
+    """
+    Replace the cache of habit rows, e.g. to disable it in tests
+    :param cache: a HabitCache or None to disable caching
+    :return: the previous cache
+    """
+    global _habit_cache
+    previous, _habit_cache = _habit_cache, cache
+    return previous
+
+
+def get_habit_cache():
+    """
+    Return the cache of habit rows
+    :return: a HabitCache or None if caching is disabled
+    """
+    return _habit_cache
+
+
+def set_profiler(profiler):
+    """
+    Profile the connections that `get_db` opens from now on, see `profiling.profiled`
+    :param profiler: a Profiler or None to disable profiling
+    :return: the previous profiler
+    """
+    global _profiler
+    previous, _profiler = _profiler, profiler
+    return previous
+
+
+def get_profiler():
+    """
+    Return the profiler of new connections
+    :return: a Profiler or None if profiling is disabled
+    """
+    return _profiler
+
+
+def check_data_version(db):
+    """
+    Remove the cached rows of a database if another connection, e.g. of another process, committed changes since the
+    connection looked last. The changes of other processes are not invalidated row by row like the changes of this
+    process
+    :param db: a database connection
+    :return: None
+    """
+    version = db.execute("PRAGMA data_version").fetchone()[0]
+    # a connection that was not opened by `get_db` cannot keep its version, its rows are cleared at every check
+    if version != getattr(db, "data_version", None):
+        _habit_cache.clear(database_key(db))
+        if isinstance(db, Connection):
+            db.data_version = version
+
+
+def checks_data_version(db):
+    """
+    Return whether a read of the cache has to check the data version first, see `read_batch`
+    :param db: a database connection
+    :return: a boolean
+    """
+    return _habit_cache is not None and db not in _read_batches and db not in _transactions
+
+
+@contextmanager
+def read_batch(db):
+    """
+    Check once whether other connections changed the database, see `check_data_version`, and read the cached rows
+    of the enclosed statements without checking again. A `transaction` checks once when it begins as well
+    :param db: a database connection
+    :return: a context manager that yields the database connection
+    """
+    depth = _read_batches.get(db, 0)
+    if depth == 0 and checks_data_version(db):
+        check_data_version(db)
+    _read_batches[db] = depth + 1
+    try:
+        yield db
+    finally:
+        if depth > 0:
+            _read_batches[db] = depth
+        else:
+            del _read_batches[db]
+
+
+def invalidate_habit(db, title, user_id=DEFAULT_USER):
+    """
+    Remove a habit's row from the cache after it was changed. The row is removed once more after the commit,
+    because other connections could have cached the old row in the meantime
+    :param db: a database connection
+    :param title: a habit's title
+    :param user_id: the user of the habit
+    :return: None
+    """
+    if _habit_cache is not None:
+        _habit_cache.invalidate((database_key(db), user_id, title))
+        _changed_titles.setdefault(db, set()).add((user_id, title))
+
+
+def invalidate_committed(db):
+    """
+    Remove the rows of the habits that were changed by a committed transaction from the cache
+    :param db: a database connection
+    :return: None
+    """
+    titles = _changed_titles.pop(db, ())
+    if _habit_cache is not None:
+        for user_id, title in titles:
+            _habit_cache.invalidate((database_key(db), user_id, title))
+
+
+@contextmanager
+def transaction(db):
+    """
+    Run the enclosed statements as one transaction. The helpers of this module do not commit inside of it,
+    they join the outer transaction instead. A nested transaction becomes a savepoint
+    :param db: a database connection
+    :return: a context manager that yields the database connection
+    """
+    depth = _transactions.get(db, 0)
+    if depth > 0:
+        db.execute(f"SAVEPOINT transaction_{depth}")
+    else:
+        if checks_data_version(db):
+            check_data_version(db)
+        if not db.in_transaction:
+            db.execute("BEGIN")
+    _transactions[db] = depth + 1
+    try:
+        yield db
+    except BaseException:
+        if depth > 0:
+            db.execute(f"ROLLBACK TO transaction_{depth}")
+            db.execute(f"RELEASE transaction_{depth}")
+        else:
+            db.rollback()
+            _changed_titles.pop(db, None)
+        if _habit_cache is not None:
+            _habit_cache.clear(database_key(db))
+        raise
+    else:
+        if depth > 0:
+            db.execute(f"RELEASE transaction_{depth}")
+        else:
+            db.commit()
+            invalidate_committed(db)
+    finally:
+        if depth > 0:
+            _transactions[db] = depth
+        else:
+            del _transactions[db]
+
+
+def commit(db):
+    """
+    Commit the changes unless the connection is inside `transaction`
+    :param db: a database connection
+    :return: None
+    """
+    if db not in _transactions:
+        db.commit()
+        invalidate_committed(db)
+
+
 def create_tables(db):
     """
-    Create habit and completed task tables if they do not exist
+    Create habit and completed task tables if they do not exist and upgrade them to the current schema version
     :param db: a database connection
     :return: None
     """
     cur = db.cursor()
+    version = cur.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    with transaction(db):
+        cur.execute(
+            """CREATE TABLE IF NOT EXISTS habit (
+            title TEXT PRIMARY KEY,
+            description TEXT,
+            periodicity TEXT,
+            streak_count INT,
+            longest_streak INT,
+            creation_time TEXT
+        )"""
+        )
+
+        cur.execute(
+            """CREATE TABLE IF NOT EXISTS completed_task (
+            date TEXT,
+            habit_title TEXT,
+            FOREIGN KEY (habit_title) REFERENCES habit(title)
+        )"""
+        )
+
+        for migration in MIGRATIONS[version:]:
+            migration(cur)
+        cur.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+
+def check_schema(db):
+    """
+    Fail if the tables of a database that cannot be upgraded, e.g. a read-only one, are older than SCHEMA_VERSION
+    :param db: a database connection
+    :return: None
+    """
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        raise sqlite3.DatabaseError(
+            f"The database has the schema version {version}, open it once for writing to upgrade it to "
+            f"{SCHEMA_VERSION}"
+        )
+
+
+def migrate_completed_task_primary_key(cur):
+    """
+    Rebuild the completed task table with the primary key (habit_title, date), dropping duplicate completed tasks
+    :param cur: a database cursor
+    :return: None
+    """
+    cur.execute(
+        """CREATE TABLE completed_task_new (
+        date TEXT NOT NULL,
+        habit_title TEXT NOT NULL,
+        PRIMARY KEY (habit_title, date),
+        FOREIGN KEY (habit_title) REFERENCES habit(title)
+    ) WITHOUT ROWID"""
+    )
+    cur.execute(
+        """INSERT OR IGNORE INTO completed_task_new
+        SELECT date, habit_title FROM completed_task
+        WHERE date IS NOT NULL AND habit_title IS NOT NULL"""
+    )
+    cur.execute("DROP TABLE completed_task")
+    cur.execute("ALTER TABLE completed_task_new RENAME TO completed_task")
+
+
+def migrate_streak_indexes(cur):
+    """
+    Add the indexes that keep the habits of every periodicity ordered by their streaks
+    :param cur: a database cursor
+    :return: None
+    """
+    cur.execute(
+        "CREATE INDEX habit_longest_streak ON habit (periodicity, longest_streak DESC)"
+    )
+    cur.execute("CREATE INDEX habit_streak_count ON habit (periodicity, streak_count)")
+
+
+def migrate_day_ordinals(cur):
+    """
+    Rebuild the habit and completed task tables with the creation times and the dates of completed tasks stored as
+    INTEGER day ordinals instead of YYYY-MM-DD text. Completed tasks without a valid date are dropped
+    :param cur: a database cursor
+    :return: None
+    """
+    day = f"CAST(julianday(date({{}})) AS INTEGER) - {JULIAN_DAY_OFFSET}"
     cur.execute(
-        """CREATE TABLE IF NOT EXISTS habit (
+        """CREATE TABLE habit_new (
         title TEXT PRIMARY KEY,
         description TEXT,
         periodicity TEXT,
         streak_count INT,
         longest_streak INT,
-        creation_time TEXT
+        creation_time DAYINT
     )"""
     )
+    cur.execute(
+        f"""INSERT INTO habit_new
+        SELECT title, description, periodicity, streak_count, longest_streak, {day.format("creation_time")}
+        FROM habit ORDER BY rowid"""
+    )
+    cur.execute("DROP TABLE habit")
+    cur.execute("ALTER TABLE habit_new RENAME TO habit")
+    migrate_streak_indexes(cur)
 
     cur.execute(
-        """CREATE TABLE IF NOT EXISTS completed_task (
-        date TEXT,
-        habit_title TEXT,
+        """CREATE TABLE completed_task_new (
+        date DAYINT NOT NULL,
+        habit_title TEXT NOT NULL,
+        PRIMARY KEY (habit_title, date),
         FOREIGN KEY (habit_title) REFERENCES habit(title)
+    ) WITHOUT ROWID"""
+    )
+    cur.execute(
+        f"""INSERT OR IGNORE INTO completed_task_new
+        SELECT {day.format("date")}, habit_title FROM completed_task WHERE julianday(date) IS NOT NULL"""
+    )
+    cur.execute("DROP TABLE completed_task")
+    cur.execute("ALTER TABLE completed_task_new RENAME TO completed_task")
+
+
+def migrate_completion_rollup(cur):
+    """
+    Add the rollup table with the number of completed tasks of every habit per period bucket. Its triggers and its
+    rows are created by `migrate_user_partitioning`, which rebuilds the table and always runs in the same upgrade
+    :param cur: a database cursor
+    :return: None
+    """
+    cur.execute(
+        """CREATE TABLE completion_rollup (
+        habit_title TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        completed INTEGER NOT NULL,
+        PRIMARY KEY (habit_title, bucket)
+    ) WITHOUT ROWID"""
+    )
+    cur.execute("CREATE INDEX completion_rollup_bucket ON completion_rollup (bucket)")
+
+
+def migrate_user_partitioning(cur):
+    """
+    Rebuild the habit, completed task and rollup tables with a user_id column that leads their primary keys and
+    indexes, so that the queries of a user are range scans over the user's rows. The existing habits belong to
+    DEFAULT_USER. The triggers and the rows of the rollup table are created by `migrate_periodicities`, which always
+    runs in the same upgrade
+    :param cur: a database cursor
+    :return: None
+    """
+    # the triggers of version 4 refer to the tables that are replaced
+    for trigger in ("insert", "delete", "habit_delete"):
+        cur.execute(f"DROP TRIGGER IF EXISTS completion_rollup_{trigger}")
+
+    cur.execute(
+        f"""CREATE TABLE habit_new (
+        user_id INTEGER NOT NULL DEFAULT {DEFAULT_USER},
+        title TEXT NOT NULL,
+        description TEXT,
+        periodicity TEXT,
+        streak_count INT,
+        longest_streak INT,
+        creation_time DAYINT,
+        PRIMARY KEY (user_id, title)
     )"""
     )
+    cur.execute(
+        f"""INSERT INTO habit_new
+        SELECT {DEFAULT_USER}, title, description, periodicity, streak_count, longest_streak, creation_time
+        FROM habit ORDER BY rowid"""
+    )
+    cur.execute("DROP TABLE habit")
+    cur.execute("ALTER TABLE habit_new RENAME TO habit")
+    cur.execute(
+        "CREATE INDEX habit_longest_streak ON habit (user_id, periodicity, longest_streak DESC)"
+    )
+    cur.execute(
+        "CREATE INDEX habit_streak_count ON habit (user_id, periodicity, streak_count)"
+    )
 
-    db.commit()
+    cur.execute(
+        f"""CREATE TABLE completed_task_new (
+        user_id INTEGER NOT NULL DEFAULT {DEFAULT_USER},
+        date DAYINT NOT NULL,
+        habit_title TEXT NOT NULL,
+        PRIMARY KEY (user_id, habit_title, date),
+        FOREIGN KEY (user_id, habit_title) REFERENCES habit(user_id, title)
+    ) WITHOUT ROWID"""
+    )
+    cur.execute(
+        f"""INSERT INTO completed_task_new
+        SELECT {DEFAULT_USER}, date, habit_title FROM completed_task"""
+    )
+    cur.execute("DROP TABLE completed_task")
+    cur.execute("ALTER TABLE completed_task_new RENAME TO completed_task")
+
+    cur.execute("DROP TABLE completion_rollup")
+    cur.execute(
+        """CREATE TABLE completion_rollup (
+        user_id INTEGER NOT NULL,
+        habit_title TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        completed INTEGER NOT NULL,
+        PRIMARY KEY (user_id, habit_title, bucket)
+    ) WITHOUT ROWID"""
+    )
+    cur.execute(
+        "CREATE INDEX completion_rollup_bucket ON completion_rollup (user_id, bucket)"
+    )
+    cur.execute(
+        """CREATE TRIGGER completion_rollup_habit_delete AFTER DELETE ON habit
+        BEGIN DELETE FROM completion_rollup WHERE user_id=OLD.user_id AND habit_title=OLD.title; END"""
+    )
+
+
+def create_rollup_triggers(cur):
+    """
+    Create the triggers that update the rollup table when completed tasks are added or deleted
+    :param cur: a database cursor
+    :return: None
+    """
+    # a habit with an unknown periodicity has no bucket and no rollup rows
+    habit_period = """FROM habit JOIN periodicity ON periodicity.name=habit.periodicity
+        WHERE habit.user_id={row}.user_id AND habit.title={row}.habit_title"""
+    for event, row in (("INSERT", "NEW"), ("DELETE", "OLD")):
+        bucket = PERIOD_BUCKET.format(periodicity="periodicity", day=f"{row}.date")
+        if event == "INSERT":
+            body = f"""INSERT INTO completion_rollup
+            SELECT NEW.user_id, NEW.habit_title, {bucket}, 1 {habit_period.format(row=row)}
+            ON CONFLICT (user_id, habit_title, bucket) DO UPDATE SET completed=completed + 1;"""
+        else:
+            bucket = f"(SELECT {bucket} {habit_period.format(row=row)})"
+            body = f"""UPDATE completion_rollup SET completed=completed - 1
+            WHERE user_id=OLD.user_id AND habit_title=OLD.habit_title AND bucket={bucket};
+            DELETE FROM completion_rollup
+            WHERE user_id=OLD.user_id AND habit_title=OLD.habit_title AND bucket={bucket} AND completed <= 0;"""
+        cur.execute(
+            f"""CREATE TRIGGER completion_rollup_{event.lower()} AFTER {event} ON completed_task
+            BEGIN {body} END"""
+        )
+
+
+def migrate_streak_runs(cur):
+    """
+    Add the table of streak runs, see `runs.py`. Its rows and the streaks of the habits are calculated by
+    `migrate_periodicities`, which always runs in the same upgrade
+    :param cur: a database cursor
+    :return: None
+    """
+    cur.execute(
+        """CREATE TABLE streak_run (
+        user_id INTEGER NOT NULL,
+        habit_title TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        end INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        PRIMARY KEY (user_id, habit_title, start)
+    ) WITHOUT ROWID"""
+    )
+    cur.execute(
+        "CREATE INDEX streak_run_length ON streak_run (user_id, habit_title, length)"
+    )
+
+
+def migrate_periodicities(cur):
+    """
+    Add the periodicity table with the unit, the size, the quota and the gap of the periods of every periodicity, see
+    `periods.py`. The rollup table is rebuilt with the buckets of PERIOD_BUCKET, and the streak runs and the streaks of
+    all habits are recalculated from it. The buckets of daily and weekly habits are days, and a streak of a weekly
+    habit still allows 7 days between its tasks, so the streaks only change where tasks were completed out of order
+    :param cur: a database cursor
+    :return: None
+    """
+    cur.execute(
+        """CREATE TABLE periodicity (
+        name TEXT PRIMARY KEY,
+        unit TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        quota INTEGER NOT NULL,
+        gap INTEGER NOT NULL
+    ) WITHOUT ROWID"""
+    )
+    add_periodicities(cur.connection, FIXED)
+    # habits with an unknown periodicity keep no rollup rows and streak runs
+    periodicities = [row[0] for row in cur.execute("SELECT DISTINCT periodicity FROM habit")]
+    add_periodicities(cur.connection, filter(is_periodicity, periodicities))
+    for trigger in ("insert", "delete"):
+        cur.execute(f"DROP TRIGGER IF EXISTS completion_rollup_{trigger}")
+    create_rollup_triggers(cur)
+    rebuild_rollup(cur.connection)
+    rebuild_streak_runs(cur.connection)
+    set_streaks_from_runs(cur.connection)
+
+
+@contextmanager
+def bulk_completed_tasks(db, user_id=None, titles=None):
+    """
+    Add or delete many completed tasks without updating the rollup table for every row. The triggers are dropped
+    inside a transaction and the rollup rows of the changed habits are rebuilt once at the end, which is several times
+    faster for large imports
+    :param db: a database connection
+    :param user_id: the user of the changed habits or None for all users
+    :param titles: the titles of the user's changed habits or None for all of them, a set that is filled inside the
+     block is read when the block ends
+    :return: a context manager that yields the database connection
+    """
+    with transaction(db):
+        cur = db.cursor()
+        cur.execute("DROP TRIGGER completion_rollup_insert")
+        cur.execute("DROP TRIGGER completion_rollup_delete")
+        yield db
+        create_rollup_triggers(cur)
+        rebuild_rollup(db, user_id, titles)
+
+
+# Upgrades of the schema, the migration at index i moves a database from version i to version i + 1
+MIGRATIONS = [
+    migrate_completed_task_primary_key,
+    migrate_streak_indexes,
+    migrate_day_ordinals,
+    migrate_completion_rollup,
+    migrate_user_partitioning,
+    migrate_streak_runs,
+    migrate_periodicities,
+]
+
+# The schema version of a database is stored in `PRAGMA user_version`
+SCHEMA_VERSION = len(MIGRATIONS)
 
 
 def add_habit(
-    db, title, description="", periodicity="daily", creation_time=date.today()
+    db,
+    title,
+    description="",
+    periodicity="daily",
+    creation_time=None,
+    sink=None,
+    user_id=DEFAULT_USER,
 ):
     """
     Add a habit to the database
@@ -51,243 +693,968 @@ def add_habit(
     :param title: a habit's title
     :param description: a habit's description
     :param periodicity: a habit's periodicity
-    :param creation_time: a creation time of the habit
-    :return: None
+    :param creation_time: a creation time of the habit, today if it is not given
+    :param sink: a callable that receives the result or None
+    :param user_id: the user of the habit
+    :return: HabitChange
     """
+    if creation_time is None:
+        creation_time = date.today()
+    add_periodicities(db, [periodicity])
     cur = db.cursor()
     streak_count = 0
     longest_streak = 0
     cur.execute(
-        "INSERT INTO habit VALUES (?, ?, ?, ?, ?, ?)",
-        (title, description, periodicity, streak_count, longest_streak, creation_time),
+        """INSERT INTO habit (user_id, title, description, periodicity, streak_count, longest_streak, creation_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (user_id, title, description, periodicity, streak_count, longest_streak, creation_time),
     )
-    print(f"The habit with the title `{title}` was successfully added.")
-    db.commit()
+    invalidate_habit(db, title, user_id)
+    commit(db)
+    return emit(sink, HabitChange("added", title))
 
 
-def delete_completed_tasks(db, habit_title):
+def delete_completed_tasks(db, habit_title, sink=None, user_id=DEFAULT_USER):
     """
     Delete completed tasks of a given habit
     :param db: a database connection
     :param habit_title: a habit's title
-    :return: None
+    :param sink: a callable that receives the result or None
+    :param user_id: the user of the habit
+    :return: HabitChange with the number of deleted tasks
     """
     cur = db.cursor()
-    cur.execute("DELETE FROM completed_task WHERE habit_title=?", (habit_title,))
-    print(
-        f"The completed tasks of the habit `{habit_title}` were successfully deleted."
+    cur.execute(
+        "DELETE FROM completed_task WHERE user_id=? AND habit_title=?",
+        (user_id, habit_title),
     )
-    db.commit()
+    count = cur.rowcount
+    cur.execute(
+        "DELETE FROM streak_run WHERE user_id=? AND habit_title=?", (user_id, habit_title)
+    )
+    commit(db)
+    return emit(sink, HabitChange("tasks_deleted", habit_title, count))
+
+
+def delete_completed_task(db, habit_title, task_date, sink=None, user_id=DEFAULT_USER):
+    """
+    Delete the completed task of a given habit on one day. The streak runs are not changed, see `runs.remove_day`
+    :param db: a database connection
+    :param habit_title: a habit's title
+    :param task_date: a date of the completed task
+    :param sink: a callable that receives the result or None
+    :param user_id: the user of the habit
+    :return: HabitChange with the number of deleted tasks, 0 if the task was not completed on this day
+    """
+    cur = db.cursor()
+    cur.execute(
+        "DELETE FROM completed_task WHERE user_id=? AND habit_title=? AND date=?",
+        (user_id, habit_title, task_date),
+    )
+    commit(db)
+    return emit(sink, HabitChange("task_deleted", habit_title, cur.rowcount))
 
 
-def delete_habit(db, habit_title):
+def delete_habit(db, habit_title, sink=None, user_id=DEFAULT_USER):
     """
     Delete the habit
     :param db: a database connection
     :param habit_title: a habit's title
-    :return: None
+    :param sink: a callable that receives the result or None
+    :param user_id: the user of the habit
+    :return: HabitChange
+    """
+    cur = db.cursor()
+    cur.execute("DELETE FROM habit WHERE user_id=? AND title=?", (user_id, habit_title))
+    invalidate_habit(db, habit_title, user_id)
+    commit(db)
+    return emit(sink, HabitChange("deleted", habit_title, cur.rowcount))
+
+
+def get_habit(db, title, user_id=DEFAULT_USER):
     """
+    Return a habit of a given habit, through the habit cache
+    :param db: a database connection
+    :param title: a habit's title
+    :param user_id: the user of the habit
+    :return: title, description, periodicity, streak count, longest streak and creation time of the habit
+    """
+    cache = _habit_cache
+    if cache is not None:
+        if checks_data_version(db):
+            check_data_version(db)
+        key = (database_key(db), user_id, title)
+        habit = cache.get(key)
+        if habit is not HabitCache.MISSING:
+            return habit
+        generation = cache.generation
     cur = db.cursor()
-    cur.execute("DELETE FROM habit WHERE title=?", (habit_title,))
-    print(f"The habit with the title `{habit_title}` was successfully deleted.")
-    db.commit()
+    cur.execute(
+        """SELECT title, description, periodicity, streak_count, longest_streak, creation_time
+        FROM habit WHERE user_id=? AND title=?""",
+        (user_id, title),
+    )
+    habit = cur.fetchone()
+    if cache is not None:
+        cache.put(key, habit, generation)
+    return habit
 
 
-def get_habit(db, title):
+def get_habit_state(db, title, user_id=DEFAULT_USER):
     """
-    Return a habit of a given habit
+    Return everything that is needed to check off a habit with a single query. The latest completed task is
+    returned as a day ordinal, so that it can be compared without converting it
     :param db: a database connection
     :param title: a habit's title
-    :return: a habit
+    :param user_id: the user of the habit
+    :return: a HabitState or None if such a habit does not exist
+    """
+    cur = db.cursor()
+    cur.execute(
+        """SELECT title, description, periodicity, streak_count, longest_streak, creation_time,
+        (SELECT MAX(date) FROM completed_task WHERE user_id=habit.user_id AND habit_title=habit.title),
+        last_run.start, last_run.end, last_run.length
+        FROM habit LEFT JOIN streak_run AS last_run
+        ON last_run.user_id=habit.user_id AND last_run.habit_title=habit.title AND last_run.start=(
+            SELECT MAX(start) FROM streak_run WHERE user_id=habit.user_id AND habit_title=habit.title
+        )
+        WHERE habit.user_id=? AND habit.title=?""",
+        (user_id, title),
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return HabitState(*row[:7], None if row[7] is None else Run._make(row[7:]))
+
+
+def get_user_ids(db):
+    """
+    Return the users that have habits
+    :param db: a database connection
+    :return: the user ids in ascending order
     """
     cur = db.cursor()
-    cur.execute("SELECT * FROM habit WHERE title=?", (title,))
-    return cur.fetchone()
+    cur.execute("SELECT DISTINCT user_id FROM habit ORDER BY user_id")
+    return [row[0] for row in cur]
 
 
-def get_habits_titles_and_descriptions(db):
+def get_habits_titles_and_descriptions(db, user_id=DEFAULT_USER):
     """
     Return titles and descriptions of all habits from the database
     :param db: a database connection
+    :param user_id: the user of the habits
     :return: titles and descriptions of all habits
     """
     cur = db.cursor()
-    cur.execute("SELECT title, description FROM habit")
+    cur.execute(
+        "SELECT title, description FROM habit WHERE user_id=? ORDER BY rowid", (user_id,)
+    )
     return cur.fetchall()
 
 
-def get_habits_period(db, periodicity):
+def iter_rows(cur, batch_size=BATCH_SIZE):
+    """
+    Yield the rows of an executed query, fetching them in batches
+    :param cur: a database cursor with an executed query
+    :param batch_size: the number of rows to fetch at once
+    :return: a generator of rows
+    """
+    while rows := cur.fetchmany(batch_size):
+        yield from rows
+
+
+def iter_habits(db, batch_size=BATCH_SIZE, user_id=DEFAULT_USER):
+    """
+    Yield titles and descriptions of all habits without loading all of them into memory
+    :param db: a database connection
+    :param batch_size: the number of rows to fetch at once
+    :param user_id: the user of the habits
+    :return: a generator of titles and descriptions of habits
+    """
+    cur = db.cursor()
+    cur.execute(
+        "SELECT title, description FROM habit WHERE user_id=? ORDER BY rowid", (user_id,)
+    )
+    return iter_rows(cur, batch_size)
+
+
+def iter_habit_rows(db, batch_size=BATCH_SIZE, user_id=DEFAULT_USER):
+    """
+    Yield the habits for an export without loading all of them into memory
+    :param db: a database connection
+    :param batch_size: the number of rows to fetch at once
+    :param user_id: the user of the habits
+    :return: a generator of titles, descriptions, periodicities and YYYY-MM-DD creation times of habits, in the
+     order they were added
+    """
+    cur = db.cursor()
+    cur.execute(
+        f"""SELECT title, description, periodicity, date(creation_time + {JULIAN_DAY_OFFSET + 0.5})
+        FROM habit WHERE user_id=? ORDER BY rowid""",
+        (user_id,),
+    )
+    return iter_rows(cur, batch_size)
+
+
+def iter_completed_task_rows(db, batch_size=BATCH_SIZE, user_id=DEFAULT_USER):
+    """
+    Yield the completed tasks for an export without loading all of them into memory
+    :param db: a database connection
+    :param batch_size: the number of rows to fetch at once
+    :param user_id: the user of the habits
+    :return: a generator of habits' titles and YYYY-MM-DD dates of completed tasks
+    """
+    cur = db.cursor()
+    cur.execute(
+        f"""SELECT habit_title, date(date + {JULIAN_DAY_OFFSET + 0.5})
+        FROM completed_task WHERE user_id=?""",
+        (user_id,),
+    )
+    return iter_rows(cur, batch_size)
+
+
+def count_completed_tasks(db):
+    """
+    Return the number of completed tasks of all habits of all users
+    :param db: a database connection
+    :return: the number of completed tasks
+    """
+    cur = db.cursor()
+    cur.execute("SELECT COUNT(*) FROM completed_task")
+    return cur.fetchone()[0]
+
+
+def get_creation_days(db, user_id=DEFAULT_USER):
+    """
+    Return the creation times of all habits
+    :param db: a database connection
+    :param user_id: the user of the habits
+    :return: a dictionary of habits' titles and the day ordinals of their creation times
+    """
+    cur = db.cursor()
+    cur.execute("SELECT title, creation_time FROM habit WHERE user_id=?", (user_id,))
+    return {title: creation_time.toordinal() for title, creation_time in cur}
+
+
+def iter_habits_period(db, periodicity, batch_size=BATCH_SIZE, user_id=DEFAULT_USER):
+    """
+    Yield the titles of habits of a given periodicity without loading all of them into memory
+    :param db: a database connection
+    :param periodicity: a habit's periodicity
+    :param batch_size: the number of rows to fetch at once
+    :param user_id: the user of the habits
+    :return: a generator of titles of habits
+    """
+    cur = db.cursor()
+    cur.execute(
+        "SELECT title FROM habit WHERE user_id=? AND periodicity=? ORDER BY rowid",
+        (user_id, periodicity),
+    )
+    return iter_rows(cur, batch_size)
+
+
+def get_habits_after(db, after_title=None, limit=10, user_id=DEFAULT_USER):
+    """
+    Return a page of habits ordered by title, starting after a given title
+    :param db: a database connection
+    :param after_title: the last title of the previous page or None for the first page
+    :param limit: the maximal number of habits
+    :param user_id: the user of the habits
+    :return: titles and descriptions of habits
+    """
+    cur = db.cursor()
+    if after_title is None:
+        cur.execute(
+            "SELECT title, description FROM habit WHERE user_id=? ORDER BY title LIMIT ?",
+            (user_id, limit),
+        )
+    else:
+        cur.execute(
+            """SELECT title, description FROM habit WHERE user_id=? AND title > ?
+            ORDER BY title LIMIT ?""",
+            (user_id, after_title, limit),
+        )
+    return cur.fetchall()
+
+
+def get_habits_period(db, periodicity, user_id=DEFAULT_USER):
     """
     Return habits of a given periodicity
     :param db: a database connection
     :param periodicity: a habit's periodicity
+    :param user_id: the user of the habits
     :return: titles of habits
     """
     cur = db.cursor()
-    cur.execute("SELECT title FROM habit WHERE periodicity=?", (periodicity,))
+    cur.execute(
+        "SELECT title FROM habit WHERE user_id=? AND periodicity=? ORDER BY rowid",
+        (user_id, periodicity),
+    )
     return cur.fetchall()
 
 
-def get_completed_tasks(db, habit_title):
+def get_completed_tasks(db, habit_title, user_id=DEFAULT_USER):
     """
     Return all completed tasks of a habit from the database if habit exists
     :param db: a database connection
     :param habit_title: a habit's title
+    :param user_id: the user of the habit
     :return: all completed tasks of a habit or a message that such a habit does not exist
     """
     cur = db.cursor()
     does_exist = cur.execute(
-        "SELECT EXISTS (SELECT * FROM completed_task WHERE habit_title=?)",
-        (habit_title,),
+        "SELECT EXISTS (SELECT * FROM completed_task WHERE user_id=? AND habit_title=?)",
+        (user_id, habit_title),
     )
     if does_exist:
-        cur.execute("SELECT * FROM completed_task WHERE habit_title=?", (habit_title,))
+        cur.execute(
+            "SELECT date, habit_title FROM completed_task WHERE user_id=? AND habit_title=?",
+            (user_id, habit_title),
+        )
         return cur.fetchall()
     else:
         return f"There is no habit with title {habit_title}"
 
 
-def get_streak_count(db, title):
+def count_rollup_buckets(db, user_id=None, titles=None):
+    """
+    Return the number of rows of the rollup table, an upper bound of the completed periods of the habits
+    :param db: a database connection
+    :param user_id: the user of the habits or None for the habits of all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: the number of buckets
+    """
+    condition, params = habit_scope(user_id, titles)
+    cur = db.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM completion_rollup WHERE {condition}", params)
+    return cur.fetchone()[0]
+
+
+def get_completion_buckets(db, user_id=None, titles=None):
+    """
+    Return the completed periods of all habits, aggregated per habit. The buckets of a habit are read from its range
+    of the rollup table's primary key, which keeps them in order
+    :param db: a database connection
+    :param user_id: the user of the habits or None for the habits of all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: user, title, the gap of the periodicity and the comma separated buckets or None of the habits, ordered by
+     user and title
+    """
+    condition, params = habit_scope(user_id, titles, "habit", "title")
+    cur = db.cursor()
+    cur.execute(
+        f"""SELECT habit.user_id, habit.title, COALESCE(periodicity.gap, 1), (
+            SELECT GROUP_CONCAT(bucket) FROM completion_rollup
+            WHERE user_id=habit.user_id AND habit_title=habit.title AND completed >= periodicity.quota
+        )
+        FROM habit LEFT JOIN periodicity ON periodicity.name=habit.periodicity
+        WHERE {condition}
+        ORDER BY habit.user_id, habit.title""",
+        params,
+    )
+    return cur
+
+
+def get_habit_days(db, user_id=DEFAULT_USER):
+    """
+    Return all habits together with their completed tasks, aggregated per habit
+    :param db: a database connection
+    :param user_id: the user of the habits
+    :return: title, description, periodicity, creation time and the comma separated day ordinals of all habits,
+        in the order they were added
+    """
+    cur = db.cursor()
+    cur.execute(
+        """SELECT habit.title, habit.description, habit.periodicity, habit.creation_time,
+        GROUP_CONCAT(completed_task.date)
+        FROM habit LEFT JOIN completed_task
+        ON completed_task.user_id=habit.user_id AND completed_task.habit_title=habit.title
+        WHERE habit.user_id=?
+        GROUP BY habit.rowid ORDER BY habit.rowid""",
+        (user_id,),
+    )
+    return cur
+
+
+def rebuild_rollup(db, user_id=None, titles=None):
+    """
+    Recalculate the rollup table from the completed tasks, e.g. after they were changed without the triggers
+    :param db: a database connection
+    :param user_id: the user of the habits or None for all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: the number of buckets
+    """
+    bucket = PERIOD_BUCKET.format(periodicity="periodicity", day="completed_task.date")
+    rollup_condition, params = habit_scope(user_id, titles)
+    condition, _ = habit_scope(user_id, titles, "completed_task")
+    with transaction(db):
+        db.execute(f"DELETE FROM completion_rollup WHERE {rollup_condition}", params)
+        cur = db.execute(
+            f"""INSERT INTO completion_rollup
+            SELECT completed_task.user_id, completed_task.habit_title, {bucket} AS bucket, COUNT(*)
+            FROM completed_task JOIN habit
+            ON habit.user_id=completed_task.user_id AND habit.title=completed_task.habit_title
+            JOIN periodicity ON periodicity.name=habit.periodicity
+            WHERE {condition}
+            GROUP BY completed_task.user_id, completed_task.habit_title, bucket""",
+            params,
+        )
+    return cur.rowcount
+
+
+def habit_scope(user_id=None, titles=None, table="completion_rollup", title_column="habit_title"):
+    """
+    Return an SQL condition that selects the rows of some habits
+    :param user_id: the user of the habits or None for all users
+    :param titles: the titles of the user's habits or None for all of them
+    :param table: the name of the table
+    :param title_column: the name of the title column
+    :return: a pair of the condition and its parameters
+    """
+    conditions, params = ["1"], []
+    if user_id is not None:
+        conditions.append(f"{table}.user_id=?")
+        params.append(user_id)
+    if titles is not None:
+        import json
+
+        conditions.append(f"{table}.{title_column} IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(titles)))
+    return " AND ".join(conditions), params
+
+
+def rebuild_streak_runs(db, user_id=None, titles=None):
+    """
+    Recalculate the streak runs from the completed periods in the rollup table, e.g. after many tasks were added at
+    once. The streaks of the habits are not changed, see `set_streaks_from_runs`
+    :param db: a database connection
+    :param user_id: the user of the habits or None for all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: the number of runs
+    """
+    runs_condition, params = habit_scope(user_id, titles, "streak_run")
+    condition, _ = habit_scope(user_id, titles)
+    with transaction(db):
+        db.execute(f"DELETE FROM streak_run WHERE {runs_condition}", params)
+        cur = db.execute(
+            f"""INSERT INTO streak_run (user_id, habit_title, start, end, length)
+            WITH completed AS (
+                SELECT completion_rollup.user_id, completion_rollup.habit_title, bucket,
+                COALESCE(bucket - LAG(bucket) OVER habit_buckets > periodicity.gap, 1) AS new_run
+                FROM completion_rollup JOIN habit
+                ON habit.user_id=completion_rollup.user_id AND habit.title=completion_rollup.habit_title
+                JOIN periodicity ON periodicity.name=habit.periodicity
+                WHERE {condition} AND completion_rollup.completed >= periodicity.quota
+                WINDOW habit_buckets AS (
+                    PARTITION BY completion_rollup.user_id, completion_rollup.habit_title ORDER BY bucket
+                )
+            ), numbered AS (
+                SELECT user_id, habit_title, bucket, SUM(new_run) OVER (
+                    PARTITION BY user_id, habit_title ORDER BY bucket
+                ) AS run
+                FROM completed
+            )
+            SELECT user_id, habit_title, MIN(bucket), MAX(bucket), COUNT(*) FROM numbered
+            GROUP BY user_id, habit_title, run""",
+            params,
+        )
+    return cur.rowcount
+
+
+def set_streak_runs(db, runs, user_id=None, titles=None):
+    """
+    Replace the streak runs of habits, e.g. with runs that were calculated outside of the database. The streaks of
+    the habits are not changed, see `set_streaks_from_runs`
+    :param db: a database connection
+    :param runs: tuples of a user, a habit's title, the first and the last bucket and the length of every run
+    :param user_id: the user of the habits or None for all users, the runs of other users must not be passed
+    :param titles: the titles of the user's habits or None for all of them, the runs of other habits must not be passed
+    :return: None
+    """
+    condition, params = habit_scope(user_id, titles, "streak_run")
+    with transaction(db):
+        db.execute(f"DELETE FROM streak_run WHERE {condition}", params)
+        db.executemany(
+            "INSERT INTO streak_run (user_id, habit_title, start, end, length) VALUES (?, ?, ?, ?, ?)", runs
+        )
+
+
+def set_streaks_from_runs(db, user_id=None, titles=None):
+    """
+    Set the streak counts and the longest streaks of habits from their streak runs
+    :param db: a database connection
+    :param user_id: the user of the habits or None for all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: the number of habits
+    """
+    condition, params = habit_scope(user_id, titles, "habit", "title")
+    cur = db.execute(
+        f"""UPDATE habit SET
+        streak_count=COALESCE((SELECT length FROM streak_run
+            WHERE user_id=habit.user_id AND habit_title=habit.title ORDER BY start DESC LIMIT 1), 0),
+        longest_streak=COALESCE((SELECT MAX(length) FROM streak_run
+            WHERE user_id=habit.user_id AND habit_title=habit.title), 0)
+        WHERE {condition} RETURNING user_id, title""",
+        params,
+    )
+    habits = cur.fetchall()
+    for habit_user_id, title in habits:
+        invalidate_habit(db, title, habit_user_id)
+    commit(db)
+    return len(habits)
+
+
+class DatabaseRuns:
+    __slots__ = ("db", "title", "user_id")
+
+    def __init__(self, db, title, user_id=DEFAULT_USER):
+        """
+        The streak runs of a habit in the streak_run table, with the methods of `runs.StreakRuns`. Every lookup is a
+        search of the primary key of streak_run or completion_rollup, whose rows are the completed buckets
+        :param db: a database connection
+        :param title: a habit's title
+        :param user_id: the user of the habit
+        """
+        self.db = db
+        self.title = title
+        self.user_id = user_id
+
+    def _run(self, condition, order, params=()):
+        row = self.db.execute(
+            f"""SELECT start, end, length FROM streak_run
+            WHERE user_id=? AND habit_title=? AND {condition} ORDER BY start {order} LIMIT 1""",
+            (self.user_id, self.title, *params),
+        ).fetchone()
+        return None if row is None else Run._make(row)
+
+    def before(self, bucket):
+        """See `runs.StreakRuns.before`"""
+        return self._run("start < ?", "DESC", (bucket,))
+
+    def after(self, bucket):
+        """See `runs.StreakRuns.after`"""
+        return self._run("start > ?", "ASC", (bucket,))
+
+    def _completed(self, aggregate, first, last):
+        return self.db.execute(
+            f"""SELECT {aggregate}(completion_rollup.bucket)
+            FROM completion_rollup JOIN habit
+            ON habit.user_id=completion_rollup.user_id AND habit.title=completion_rollup.habit_title
+            JOIN periodicity ON periodicity.name=habit.periodicity
+            WHERE completion_rollup.user_id=? AND completion_rollup.habit_title=?
+            AND completion_rollup.bucket BETWEEN ? AND ? AND completion_rollup.completed >= periodicity.quota""",
+            (self.user_id, self.title, first, last),
+        ).fetchone()[0]
+
+    def previous_bucket(self, bucket, first):
+        """See `runs.StreakRuns.previous_bucket`"""
+        return self._completed("MAX", first, bucket - 1)
+
+    def next_bucket(self, bucket, last):
+        """See `runs.StreakRuns.next_bucket`"""
+        return self._completed("MIN", bucket + 1, last)
+
+    def count_buckets(self, first, last):
+        """See `runs.StreakRuns.count_buckets`, it is a range scan over a part of one run"""
+        return self._completed("COUNT", first, last)
+
+    def replace(self, old, new):
+        """See `runs.StreakRuns.replace`"""
+        cur = self.db.cursor()
+        cur.executemany(
+            "DELETE FROM streak_run WHERE user_id=? AND habit_title=? AND start=?",
+            ((self.user_id, self.title, run.start) for run in old),
+        )
+        cur.executemany(
+            """INSERT INTO streak_run (user_id, habit_title, start, end, length)
+            VALUES (?, ?, ?, ?, ?)""",
+            ((self.user_id, self.title, *run) for run in new),
+        )
+
+    def streaks(self):
+        """See `runs.StreakRuns.streaks`"""
+        last = self._run("1", "DESC")
+        if last is None:
+            return 0, 0
+        longest = self.db.execute(
+            "SELECT MAX(length) FROM streak_run WHERE user_id=? AND habit_title=?",
+            (self.user_id, self.title),
+        ).fetchone()[0]
+        return last.length, longest
+
+
+def get_bucket_completions(db, title, bucket, user_id=DEFAULT_USER):
+    """
+    Return the number of completed tasks of a habit in a period, read from the rollup table
+    :param db: a database connection
+    :param title: a habit's title
+    :param bucket: the bucket of the period, see `periods.py`
+    :param user_id: the user of the habit
+    :return: the number of completed tasks
+    """
+    row = db.execute(
+        """SELECT completed FROM completion_rollup
+        WHERE user_id=? AND habit_title=? AND bucket=?""",
+        (user_id, title, bucket),
+    ).fetchone()
+    return 0 if row is None else row[0]
+
+
+def get_completed_buckets(db, title, first_bucket, last_bucket, user_id=DEFAULT_USER):
+    """
+    Return the completed period buckets of a habit within a range
+    :param db: a database connection
+    :param title: a habit's title
+    :param first_bucket: the first bucket of the range
+    :param last_bucket: the last bucket of the range
+    :param user_id: the user of the habit
+    :return: the buckets in ascending order
+    """
+    cur = db.cursor()
+    cur.execute(
+        """SELECT completion_rollup.bucket
+        FROM completion_rollup JOIN habit
+        ON habit.user_id=completion_rollup.user_id AND habit.title=completion_rollup.habit_title
+        JOIN periodicity ON periodicity.name=habit.periodicity
+        WHERE completion_rollup.user_id=? AND completion_rollup.habit_title=?
+        AND completion_rollup.bucket BETWEEN ? AND ? AND completion_rollup.completed >= periodicity.quota
+        ORDER BY completion_rollup.bucket""",
+        (user_id, title, first_bucket, last_bucket),
+    )
+    return [row[0] for row in cur]
+
+
+def get_bucket_counts(db, periodicity, first_bucket, last_bucket, user_id=DEFAULT_USER):
+    """
+    Return how many habits of a periodicity were completed in every window of periods within a range of buckets,
+    see `periods.Period.window`
+    :param db: a database connection
+    :param periodicity: a habit's periodicity
+    :param first_bucket: the first bucket of the range
+    :param last_bucket: the last bucket of the range
+    :param user_id: the user of the habits
+    :return: pairs of a window and the number of completed habits, windows without completed habits are left out
+    """
+    cur = db.cursor()
+    cur.execute(
+        """SELECT completion_rollup.bucket / periodicity.gap AS window_bucket, COUNT(DISTINCT habit.title)
+        FROM completion_rollup JOIN habit
+        ON habit.user_id=completion_rollup.user_id AND habit.title=completion_rollup.habit_title
+        JOIN periodicity ON periodicity.name=habit.periodicity
+        WHERE completion_rollup.user_id=? AND habit.periodicity=?
+        AND completion_rollup.bucket BETWEEN ? AND ? AND completion_rollup.completed >= periodicity.quota
+        GROUP BY window_bucket ORDER BY window_bucket""",
+        (user_id, periodicity, first_bucket, last_bucket),
+    )
+    return cur.fetchall()
+
+
+def get_streak_count(db, title, user_id=DEFAULT_USER):
     """
     Return a streak count of a given habit
     :param db: a database connection
     :param title: a habit's title
+    :param user_id: the user of the habit
     :return: streak count of a habit
     """
-    cur = db.cursor()
-    cur.execute("SELECT streak_count FROM habit WHERE title=?", (title,))
-    return cur.fetchone()
+    habit = get_habit(db, title, user_id)
+    return None if habit is None else (habit[3],)
 
 
-def get_all_streak_counts(db, periodicity):
+def get_all_streak_counts(db, periodicity, user_id=DEFAULT_USER):
     """
     Return streak count of all habits of a given periodicity
     :param db: a database connection
     :param periodicity: a habit's periodicity
+    :param user_id: the user of the habits
     :return: title, streak count, periodicity of habits
     """
     cur = db.cursor()
     cur.execute(
-        "SELECT title, streak_count, periodicity FROM habit WHERE periodicity=?",
-        (periodicity,),
+        """SELECT title, streak_count, periodicity FROM habit
+        WHERE user_id=? AND periodicity=? ORDER BY rowid""",
+        (user_id, periodicity),
     )
     return cur.fetchall()
 
 
-def get_longest_streak(db, title):
+def get_longest_streak(db, title, user_id=DEFAULT_USER):
     """
     Return the longest streak of a given habit
     :param db: a database connection
     :param title: a habit's title
+    :param user_id: the user of the habit
     :return: longest streak of a habit
     """
-    cur = db.cursor()
-    cur.execute("SELECT longest_streak FROM habit WHERE title=?", (title,))
-    return cur.fetchone()
+    habit = get_habit(db, title, user_id)
+    return None if habit is None else (habit[4],)
 
 
-def get_longest_streaks(db, periodicity):
+def get_longest_streaks(db, periodicity, user_id=DEFAULT_USER):
     """
     Return longest streak of habits of a given periodicity
     :param db: a database connection
     :param periodicity: a habit's periodicity
+    :param user_id: the user of the habits
     :return: title, longest streak, periodicity of habits
     """
     cur = db.cursor()
     cur.execute(
-        "SELECT title, longest_streak, periodicity FROM habit WHERE periodicity=?",
-        (periodicity,),
+        """SELECT title, longest_streak, periodicity FROM habit
+        WHERE user_id=? AND periodicity=? ORDER BY rowid""",
+        (user_id, periodicity),
     )
     return cur.fetchall()
 
 
-def get_latest_date(db, title):
+def get_ranked_habits(db, column, limit=None, descending=True, user_id=DEFAULT_USER):
+    """
+    Return habits ranked by a streak column within every periodicity, habits with equal streaks keep the order
+    in which they were added
+    :param db: a database connection
+    :param column: `longest_streak` or `streak_count`
+    :param limit: the number of habits to return per periodicity or None to return all of them
+    :param descending: whether the habits with the highest streaks come first
+    :param user_id: the user of the habits
+    :return: periodicity, title and the streak of habits, ordered by periodicity and rank
+    """
+    if column not in ("longest_streak", "streak_count"):
+        raise ValueError(f"Habits cannot be ranked by `{column}`")
+    order = "DESC" if descending else "ASC"
+    query = f"""SELECT periodicity, title, {column} FROM (
+        SELECT periodicity, title, {column},
+        ROW_NUMBER() OVER (PARTITION BY periodicity ORDER BY {column} {order}, rowid) AS rank
+        FROM habit WHERE user_id=?
+    )"""
+    parameters = (user_id,)
+    if limit is not None:
+        query += " WHERE rank <= ?"
+        parameters += (limit,)
+    cur = db.cursor()
+    cur.execute(query + " ORDER BY periodicity, rank", parameters)
+    return cur.fetchall()
+
+
+def get_completion_stats(db, start, end, user_id=DEFAULT_USER):
+    """
+    Return the completion statistics of all habits within a date range with a single aggregate query. The range
+    of a habit starts at its creation time if it was created after `start` and is split into the periods of its
+    periodicity, see `periods.py`, whose `gap` consecutive periods from the start of the range are counted as one. A
+    period is completed if it has as many completed tasks in the range as the quota of the periodicity, and the
+    longest gap is the largest number of consecutive days without a completed task
+    :param db: a database connection
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param user_id: the user of the habits
+    :return: CompletionStats of habits, ordered by periodicity and from the lowest completion rate
+    """
+    cur = db.cursor()
+    cur.execute(
+        f"""WITH habit_range AS (
+            SELECT habit.rowid, title, periodicity, unit, size, quota, gap,
+            MAX(creation_time, :start) AS first_day,
+            {PERIOD_BUCKET.format(periodicity="periodicity", day="MAX(creation_time, :start)")} AS first_bucket,
+            :end AS last_day
+            FROM habit JOIN periodicity ON periodicity.name=habit.periodicity
+            WHERE user_id=:user_id AND creation_time <= :end
+        ), completed_day AS (
+            SELECT habit_range.title, habit_range.quota, habit_range.gap, habit_range.first_bucket,
+            completed_task.date AS day,
+            {PERIOD_BUCKET.format(periodicity="habit_range", day="completed_task.date")} AS bucket
+            FROM habit_range JOIN completed_task ON completed_task.user_id=:user_id
+            AND completed_task.habit_title=habit_range.title
+            AND completed_task.date BETWEEN habit_range.first_day AND :end
+        ), completed_period AS (
+            SELECT title, (bucket - MAX(first_bucket)) / MAX(gap) AS window_bucket FROM completed_day
+            GROUP BY title, bucket HAVING COUNT(*) >= MAX(quota)
+        ), completed_window AS (
+            SELECT title FROM completed_period GROUP BY title, window_bucket
+        ), gap AS (
+            SELECT title, day, day - LAG(day) OVER (PARTITION BY title ORDER BY day) - 1 AS days
+            FROM completed_day
+        ), habit_gap AS (
+            SELECT title, MAX(days) AS days, MIN(day) AS first_completed, MAX(day) AS last_completed
+            FROM gap GROUP BY title
+        ), habit_row AS (
+            -- the completed periods and the gaps are aggregated per habit by grouping them with the habit's row
+            -- instead of joining them, which visits every habit once without depending on an index of the
+            -- aggregated rows
+            SELECT title, rowid, periodicity, first_day, last_day,
+            ({PERIOD_BUCKET.format(periodicity="habit_range", day="last_day")} - first_bucket) / gap + 1 AS expected,
+            0 AS completed, NULL AS days, NULL AS first_completed, NULL AS last_completed
+            FROM habit_range
+            UNION ALL
+            SELECT title, NULL, NULL, NULL, NULL, NULL, 1, NULL, NULL, NULL FROM completed_window
+            UNION ALL
+            SELECT title, NULL, NULL, NULL, NULL, NULL, 0, days, first_completed, last_completed FROM habit_gap
+        ), stats AS (
+            SELECT MAX(rowid) AS rowid, title, MAX(periodicity) AS periodicity, MAX(expected) AS expected,
+            SUM(completed) AS completed,
+            COALESCE(
+                MAX(
+                    COALESCE(MAX(days), 0),
+                    MAX(first_completed) - MAX(first_day),
+                    MAX(last_day) - MAX(last_completed)
+                ),
+                MAX(last_day) - MAX(first_day) + 1
+            ) AS longest_gap
+            FROM habit_row GROUP BY title
+        )
+        SELECT title, periodicity, expected, completed, expected - completed,
+        CAST(completed AS REAL) / expected, longest_gap
+        FROM stats ORDER BY periodicity, completed * 1.0 / expected, longest_gap DESC, rowid""",
+        {"start": start, "end": end, "user_id": user_id},
+    )
+    return [CompletionStats._make(row) for row in cur]
+
+
+def get_latest_date(db, title, user_id=DEFAULT_USER):
     """
     Return the latest completed task of a given habit
     :param db: a database connection
     :param title: a habit's title
+    :param user_id: the user of the habit
     :return: the date of completed task
     """
     cur = db.cursor()
-    cur.execute("SELECT MAX (date) FROM completed_task WHERE habit_title=?", (title,))
-    return cur.fetchone()
+    cur.execute(
+        "SELECT MAX (date) FROM completed_task WHERE user_id=? AND habit_title=?",
+        (user_id, title),
+    )
+    (day,) = cur.fetchone()
+    return (None if day is None else date.fromordinal(day),)
 
 
-def get_creation_time(db, title):
+def get_creation_time(db, title, user_id=DEFAULT_USER):
     """
     Return creation time of a given habit
     :param db: a database connection
     :param title: a habit's title
+    :param user_id: the user of the habit
     :return: creation time of habit
     """
-    cur = db.cursor()
-    cur.execute("SELECT creation_time FROM habit WHERE title=?", (title,))
-    return cur.fetchone()
+    habit = get_habit(db, title, user_id)
+    return None if habit is None else (habit[5],)
 
 
-def get_periodicity(db, title):
+def get_periodicity(db, title, user_id=DEFAULT_USER):
     """
     Return periodicity of a given habit
     :param db: a database connection
     :param title: a habit's title
+    :param user_id: the user of the habit
     :return: periodicity of a habit
     """
-    cur = db.cursor()
-    cur.execute("SELECT periodicity FROM habit WHERE title=?", (title,))
-    return cur.fetchone()
+    habit = get_habit(db, title, user_id)
+    return None if habit is None else (habit[2],)
 
 
-def update_streak_count(db, habit_title, streak_count):
+def add_completed_task(db, habit_title, today_date, user_id=DEFAULT_USER):
     """
-    Update a streak count of a habit
+    Add the completed task to the database, raise sqlite3.IntegrityError if the task was already completed on
+    this day
     :param db: a database connection
     :param habit_title: a habit's title
-    :param streak_count: a habit's streak count
+    :param today_date: a date of the completed task
+    :param user_id: the user of the habit
     :return: None
     """
     cur = db.cursor()
     cur.execute(
-        "UPDATE habit SET streak_count=? WHERE title=?", (streak_count + 1, habit_title)
+        "INSERT INTO completed_task (user_id, date, habit_title) VALUES (?, ?, ?)",
+        (user_id, today_date, habit_title),
     )
-    db.commit()
+    commit(db)
 
 
-def reset_streak_count(db, habit_title):
+def add_completed_tasks(db, completed_tasks, skip_duplicates=False, user_id=DEFAULT_USER, check_habits=True):
     """
-    Set a streak count of a habit to 1
+    Add many completed tasks to the database. The tasks of habits that do not exist are skipped
     :param db: a database connection
-    :param habit_title: a habit's title
-    :return: None
+    :param completed_tasks: pairs of a date of the completed task and a habit's title
+    :param skip_duplicates: whether tasks that were already completed on the same day are skipped, otherwise they
+     raise sqlite3.IntegrityError
+    :param user_id: the user of the habits
+    :param check_habits: whether every task looks up its habit, a caller that already checked the habits in the same
+     transaction can turn it off
+    :return: the number of added completed tasks
     """
     cur = db.cursor()
-    cur.execute("UPDATE habit SET streak_count=? WHERE title=?", (1, habit_title))
-    db.commit()
+    verb = "INSERT OR IGNORE" if skip_duplicates else "INSERT"
+    if check_habits:
+        cur.executemany(
+            f"""{verb} INTO completed_task (user_id, date, habit_title)
+            SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM habit WHERE user_id=? AND title=?)""",
+            ((user_id, task_date, title, user_id, title) for task_date, title in completed_tasks),
+        )
+    else:
+        cur.executemany(
+            f"{verb} INTO completed_task (user_id, date, habit_title) VALUES (?, ?, ?)",
+            ((user_id, task_date, title) for task_date, title in completed_tasks),
+        )
+    commit(db)
+    return cur.rowcount
 
 
-def update_longest_streak(db, habit_title, longest_streak):
+def add_habits(db, habits, user_id=DEFAULT_USER):
     """
-    Update the longest streak of a habit
+    Add many habits with empty streaks to the database
     :param db: a database connection
-    :param habit_title: a habit's title
-    :param longest_streak: the longest streak of a habit
+    :param habits: titles, descriptions, periodicities and creation times of habits
+    :param user_id: the user of the habits
     :return: None
     """
+    habits = list(habits)
+    add_periodicities(db, {periodicity for _, _, periodicity, _ in habits})
     cur = db.cursor()
-    cur.execute(
-        "UPDATE habit SET longest_streak=? WHERE title=?",
-        (longest_streak + 1, habit_title),
+    cur.executemany(
+        """INSERT INTO habit (user_id, title, description, periodicity, streak_count, longest_streak, creation_time)
+        VALUES (?, ?, ?, ?, 0, 0, ?)""",
+        ((user_id, *habit) for habit in habits),
     )
-    db.commit()
+    for title, _, _, _ in habits:
+        invalidate_habit(db, title, user_id)
+    commit(db)
 
 
-def add_completed_task(db, habit_title, today_date):
+def add_periodicities(db, periodicities):
     """
-    Add the completed task to the database
+    Add the periods of periodicities to the periodicity table unless they are already there, raise ValueError if a
+    periodicity is not valid. The rows are committed together with the habits that use the periodicities
     :param db: a database connection
-    :param habit_title: a habit's title
-    :param today_date: a date of the completed task
+    :param periodicities: names of periodicities, see `periods.py`
     :return: None
     """
+    periods = [get_period(periodicity) for periodicity in periodicities]
+    db.executemany(
+        "INSERT OR IGNORE INTO periodicity (name, unit, size, quota, gap) VALUES (?, ?, ?, ?, ?)", periods
+    )
+
+
+def get_periodicities(db):
+    """
+    Return the periodicities of the periodicity table, the fixed ones and those of all habits that were added
+    :param db: a database connection
+    :return: the names of the periodicities, ordered by their unit and from the shortest period
+    """
+    cur = db.execute("SELECT name FROM periodicity ORDER BY unit, size * gap, quota, gap DESC, name")
+    return [row[0] for row in cur]
+
+
+def set_streaks(db, streaks, user_id=DEFAULT_USER):
+    """
+    Set the streak counts and the longest streaks of many habits
+    :param db: a database connection
+    :param streaks: triples of a streak count, the longest streak and a habit's title
+    :param user_id: the user of the habits
+    :return: None
+    """
+    streaks = list(streaks)
     cur = db.cursor()
-    cur.execute("INSERT INTO completed_task VALUES (?, ?)", (today_date, habit_title))
-    db.commit()
+    cur.executemany(
+        "UPDATE habit SET streak_count=?, longest_streak=? WHERE user_id=? AND title=?",
+        ((streak_count, longest_streak, user_id, title) for streak_count, longest_streak, title in streaks),
+    )
+    for _, _, title in streaks:
+        invalidate_habit(db, title, user_id)
+    commit(db)
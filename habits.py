@@ -0,0 +1,319 @@
+"""
+A non-interactive command line interface for scripts, cron jobs and shell pipelines.
+
+Run it from the repository root with
+
+    python habits.py add TITLE [--description TEXT] [--periodicity daily] [--date YYYY-MM-DD]
+    python habits.py done TITLE [--date YYYY-MM-DD]
+    python habits.py undo TITLE [--date YYYY-MM-DD]
+    python habits.py delete TITLE
+    python habits.py list [--periodicity daily]
+    python habits.py stats [--from YYYY-MM-DD --to YYYY-MM-DD]
+    python habits.py export|import DIRECTORY [--format jsonl]
+
+The options --database, --user, --daemon, --json and --instrument go before the command. With --daemon, or the environment
+variable HABITS_DAEMON, the commands except export and import are sent to a running daemon instead of opening the
+database, see `daemon.py`. --instrument prints the statements of the command, their latencies and query plans to
+stderr, see `profiling.py`. Without a command the interactive interface is started. The modules of a command are
+imported when the command runs, so that a call stays cheap.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+from functools import partial
+
+from constants import DEFAULT_USER
+
+
+def call(db, args, name, **params):
+    """
+    Run an operation on the database or send it to the daemon
+    :param db: a database connection or None if the daemon is used
+    :param args: the parsed arguments
+    :param name: the name of the operation, see `operations.py`
+    :param params: the parameters of the operation
+    :return: the result as JSON compatible objects, dates are date objects or YYYY-MM-DD strings
+    """
+    if db is None:
+        from client import HabitClient, RequestError
+
+        # the daemon serves the user that it was started with
+        if params.pop("user_id", DEFAULT_USER) != DEFAULT_USER:
+            raise RequestError("The user of a daemon is set with `python -m daemon --user`.")
+        with HabitClient(args.daemon) as client:
+            return client.request(name, **params)
+
+    import operations
+
+    _, function, params = operations.prepare(name, params)
+    return operations.as_json(operations.run(db, function, params))
+
+
+def output(args, data, lines):
+    """
+    Print the outcome of a command as JSON or as text
+    :param args: the parsed arguments
+    :param data: a JSON compatible object, dates are written as YYYY-MM-DD
+    :param lines: a callable that returns the lines of the text output
+    :return: None
+    """
+    if args.json:
+        import json
+
+        print(json.dumps(data, default=str))
+    else:
+        from render import show
+
+        show(lines())
+
+
+def add(db, args):
+    from render import render_result
+    from results import HabitChange
+
+    result = call(
+        db,
+        args,
+        "add",
+        title=args.title,
+        description=args.description,
+        periodicity=args.periodicity,
+        creation_time=args.date,
+        user_id=args.user,
+    )
+    output(args, result, lambda: render_result(HabitChange(**result)))
+
+
+def done(db, args):
+    from render import render_result
+    from results import CompletionResult
+
+    result = call(
+        db, args, "complete_task", title=args.title, custom_date=args.date, user_id=args.user
+    )
+    output(
+        args,
+        result,
+        lambda: render_result(
+            CompletionResult(**{**result, "date": date.fromisoformat(str(result["date"]))})
+        ),
+    )
+
+
+def undo(db, args):
+    from render import render_result
+    from results import HabitChange
+
+    result = call(
+        db, args, "delete_task", title=args.title, custom_date=args.date, user_id=args.user
+    )
+    output(args, result, lambda: render_result(HabitChange(**result)))
+
+
+def delete(db, args):
+    from render import render_result
+    from results import HabitChange
+
+    result = call(db, args, "delete", title=args.title, user_id=args.user)
+    output(args, result, lambda: render_result(HabitChange(**result)))
+
+
+def list_habits(db, args):
+    from render import render_all_habits, render_period_habits
+
+    habits = call(db, args, "list", periodicity=args.periodicity, user_id=args.user)
+    if args.periodicity is None:
+        lines = lambda: render_all_habits(
+            (habit["title"], habit["description"]) for habit in habits
+        )
+    else:
+        lines = lambda: render_period_habits(
+            args.periodicity, (habit["title"] for habit in habits)
+        )
+    output(args, habits, lines)
+
+
+def stats(db, args):
+    import render
+    from db import CompletionStats
+
+    result = call(db, args, "stats", start=args.start, end=args.end, user_id=args.user)
+
+    def lines():
+        if "completion_rates" in result:
+            yield from render.render_completion_rates(
+                args.start,
+                args.end,
+                {
+                    period: [CompletionStats(**habit) for habit in habits]
+                    for period, habits in result["completion_rates"].items()
+                },
+            )
+            return
+        yield from render.render_streaks(
+            {
+                period: [(habit["title"], habit["streak"]) for habit in habits]
+                for period, habits in result["longest_streaks"].items()
+            }
+        )
+        yield from render.render_weakest_habits(
+            {
+                period: None if habit is None else (habit["title"], habit["streak"])
+                for period, habit in result["weakest"].items()
+            }
+        )
+
+    output(args, result, lines)
+
+
+def transfer_files(db, args):
+    import transfer
+    from render import render_transfer_results
+
+    if args.command == "export":
+        results = transfer.export_directory(db, args.directory, args.format, args.user)
+    else:
+        results = transfer.import_directory(
+            db, args.directory, args.format, user_id=args.user
+        )
+    output(
+        args,
+        [result._asdict() for result in results],
+        lambda: render_transfer_results(args.command, results),
+    )
+
+
+class HelpFormatter(argparse.HelpFormatter):
+    """
+    The help formatter of argparse, which takes the width of the terminal from os. argparse creates a formatter for
+    every argument and imports shutil for it, which costs several milliseconds at every start
+    """
+
+    def __init__(self, prog, **kwargs):
+        if "width" not in kwargs:
+            try:
+                columns = int(os.environ["COLUMNS"])
+            except (KeyError, ValueError):
+                try:
+                    columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+                except (AttributeError, ValueError, OSError):
+                    columns = 80
+            kwargs["width"] = columns - 2
+        super().__init__(prog, **kwargs)
+
+
+def make_parser():
+    """
+    Create the parser of the command line arguments
+    :return: an ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1], formatter_class=HelpFormatter)
+    parser.add_argument("--database", default="main.db")
+    parser.add_argument(
+        "--user", type=int, default=DEFAULT_USER, help="the user of the habits in a shared database"
+    )
+    parser.add_argument(
+        "--daemon",
+        default=os.environ.get("HABITS_DAEMON"),
+        help="the socket path or localhost:PORT of a running daemon",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON instead of text")
+    parser.add_argument(
+        "--instrument", action="store_true", help="print a profile of the statements to stderr"
+    )
+    parser.set_defaults(profile="durable", remote=True)
+    commands = parser.add_subparsers(
+        dest="command", parser_class=partial(argparse.ArgumentParser, formatter_class=HelpFormatter)
+    )
+
+    command = commands.add_parser("add", help="create a new habit")
+    command.add_argument("title")
+    command.add_argument("--description", default="")
+    command.add_argument(
+        "--periodicity",
+        default="daily",
+        help="daily, weekly, 'calendar weekly', monthly, weekdays, 'every N days' or 'N times per week'",
+    )
+    command.add_argument("--date", type=date.fromisoformat, default=date.today())
+    command.set_defaults(handler=add)
+
+    command = commands.add_parser("done", help="check off a habit's task")
+    command.add_argument("title")
+    command.add_argument("--date", type=date.fromisoformat, default=date.today())
+    command.set_defaults(handler=done)
+
+    command = commands.add_parser("undo", help="delete a habit's completed task")
+    command.add_argument("title")
+    command.add_argument("--date", type=date.fromisoformat, default=date.today())
+    command.set_defaults(handler=undo)
+
+    command = commands.add_parser("delete", help="delete a habit")
+    command.add_argument("title")
+    command.set_defaults(handler=delete)
+
+    command = commands.add_parser("list", help="list the habits")
+    command.add_argument("--periodicity")
+    command.set_defaults(handler=list_habits)
+
+    command = commands.add_parser("stats", help="show the streaks or the completion rates")
+    command.add_argument("--from", dest="start", type=date.fromisoformat)
+    command.add_argument("--to", dest="end", type=date.fromisoformat)
+    command.set_defaults(handler=stats)
+
+    for name in ("export", "import"):
+        command = commands.add_parser(name, help=f"{name} habits and completed tasks")
+        command.add_argument("directory")
+        command.add_argument(
+            "--format", choices=["jsonl", "csv", "parquet"], default="jsonl"
+        )
+        # the files are read and written by this process, so the database is always opened directly
+        command.set_defaults(
+            handler=transfer_files,
+            profile="fast" if name == "export" else "bulk-load",
+            remote=False,
+        )
+    return parser
+
+
+def main(argv=None):
+    """
+    Run a command
+    :param argv: the command line arguments, sys.argv by default
+    :return: the exit status
+    """
+    args = make_parser().parse_args(argv)
+    if args.command is None:
+        from main import cli
+
+        cli(args.database)
+        return 0
+
+    if args.daemon and args.remote:
+        from client import RequestError as Error
+
+        db = None
+    else:
+        from db import get_db, set_profiler
+        from operations import CommandError as Error
+
+        if args.instrument:
+            from profiling import Profiler
+
+            set_profiler(Profiler(slow_query_ms=0))
+        db = get_db(args.database, args.profile)
+    try:
+        args.handler(db, args)
+    except Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        if db is not None:
+            db.close()
+            if args.instrument:
+                print(set_profiler(None).report(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
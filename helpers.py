@@ -1,6 +1,7 @@
 from datetime import date, datetime
 import questionary
 from constants import invalid_value_message
+from periods import PERIODICITIES, is_periodicity
 
 from db import get_habit, get_latest_date, get_creation_time
 
@@ -17,6 +18,23 @@ def ask_for_title():
     return title
 
 
+def ask_for_periodicity():
+    """
+    Ask user for a periodicity and for its number if it takes one
+    :return: a periodicity or None
+    """
+    periodicity = questionary.select(
+        "What is the periodicity of your habit?", choices=PERIODICITIES
+    ).ask()
+    if periodicity is not None and "N" in periodicity:
+        number = questionary.text(
+            f"N? E.g. {periodicity.replace('N', '3')}",
+            validate=lambda text: True if text.isdigit() else invalid_value_message,
+        ).ask()
+        periodicity = periodicity.replace("N", number or "")
+    return periodicity if is_periodicity(periodicity) else None
+
+
 def ask_for_date():
     """
     Ask user for a year, a month, and a date and create the date object from them
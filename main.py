@@ -1,24 +1,40 @@
 import questionary
-from datetime import datetime, date
+from datetime import date, timedelta
 from Habit import DatabaseHabit
-from db import get_db, get_creation_time, get_habit
+from db import get_db, get_creation_time, get_habit, get_periodicities
 from analytics import (
     get_habits,
+    get_habits_page,
     get_period_habits,
     get_streaks_for_habits,
     get_streak_for_habit,
     get_weakest_habits,
+    get_completion_rates,
+    get_missed_periods,
 )
-from helpers import ask_for_title, ask_for_date, check_if_exists
-from constants import invalid_value_message
+from helpers import ask_for_title, ask_for_date, ask_for_periodicity, check_if_exists
+from render import (
+    show,
+    show_result,
+    render_all_habits,
+    render_habits_page,
+    render_period_habits,
+    render_streak,
+    render_streaks,
+    render_weakest_habits,
+    render_completion_rates,
+    render_missed_periods,
+)
+from constants import invalid_value_message, PAGE_SIZE
 
 
-def cli():
+def cli(database="main.db"):
     """
     A function that handles the user's requests to the Command Line Interface, using the questionary library
+    :param database: name of the database
     :return: None
     """
-    db = get_db()
+    db = get_db(database)
     questionary.confirm("Do you want to start?").ask()
     stop = False
 
@@ -45,15 +61,13 @@ def cli():
             description = questionary.text(
                 "What is the description of your habit?"
             ).ask()
-            periodicity = questionary.select(
-                "What is the periodicity of your habit?", choices=["daily", "weekly"]
-            ).ask()
+            periodicity = ask_for_periodicity()
             questionary.confirm(
                 f"You cannot enter the habit`s creation date later than today."
             ).ask()
             custom_date = ask_for_date()
 
-            if custom_date is None or title is None:
+            if custom_date is None or title is None or periodicity is None:
                 print(invalid_value_message)
                 return
 
@@ -62,7 +76,7 @@ def cli():
                 return
 
             habit = DatabaseHabit(title, description, periodicity, custom_date)
-            habit.store(db)
+            habit.store(db, sink=show_result)
         elif choice == "Check off the habit`s task":
             title = ask_for_title()
 
@@ -71,8 +85,7 @@ def cli():
                 return
 
             habit = DatabaseHabit(title)
-            creation_time_string = get_creation_time(db, title)[0]
-            creation_time = datetime.strptime(creation_time_string, "%Y-%m-%d")
+            creation_time = get_creation_time(db, title)[0]
             questionary.confirm(
                 f"You cannot enter the task completion date earlier than creation time "
                 f"`{str(creation_time)}` and later than today."
@@ -84,44 +97,80 @@ def cli():
                 print(invalid_value_message)
                 return
 
-            if custom_date > date.today() or custom_date < creation_time.date():
+            if custom_date > date.today() or custom_date < creation_time:
                 print(
                     "The creation date cannot be earlier than creation time and later than today!"
                 )
                 return
 
-            habit.complete_task(db, custom_date)
+            habit.complete_task(db, custom_date, sink=show_result)
         elif choice == "Get analytics":
             analytics_choice = questionary.select(
                 "Which kind of analytics do you want to receive?",
                 choices=[
                     "List of all habits",
+                    "Browse all habits page by page",
                     "List of habits with the same periodicity",
                     "The longest streak of a habit",
                     "The longest streak of all habits",
                     "Habits I struggle the most last month",
+                    "Completion rates within a date range",
+                    "Missed periods of a habit last month",
                 ],
             ).ask()
 
             if analytics_choice == "List of all habits":
-                get_habits(db)
+                show(render_all_habits(get_habits(db)))
+            elif analytics_choice == "Browse all habits page by page":
+                after_title = None
+                start = 1
+                while True:
+                    habits, after_title = get_habits_page(db, after_title, PAGE_SIZE)
+                    show(render_habits_page(habits, start))
+                    if after_title is None:
+                        break
+                    if not questionary.confirm("Show the next page?").ask():
+                        break
+                    start += PAGE_SIZE
             elif analytics_choice == "List of habits with the same periodicity":
                 period = questionary.select(
                     "What is the periodicity of your habit?",
-                    choices=["daily", "weekly"],
+                    choices=get_periodicities(db),
                 ).ask()
-                get_period_habits(db, period)
+                show(render_period_habits(period, get_period_habits(db, period)))
             elif analytics_choice == "The longest streak of a habit":
                 title = ask_for_title()
 
                 if check_if_exists(db, title) is False:
                     return
 
-                get_streak_for_habit(db, title)
+                show(render_streak(title, get_streak_for_habit(db, title)))
             elif analytics_choice == "The longest streak of all habits":
-                get_streaks_for_habits(db)
+                show(render_streaks(get_streaks_for_habits(db)))
             elif analytics_choice == "Habits I struggle the most last month":
-                get_weakest_habits(db)
+                start = date.today() - timedelta(days=30)
+                show(render_weakest_habits(get_weakest_habits(db, start, date.today())))
+            elif analytics_choice == "Completion rates within a date range":
+                print("The first date of the range:")
+                start = ask_for_date()
+                print("The last date of the range:")
+                end = ask_for_date()
+
+                if start is None or end is None or start > end:
+                    print(invalid_value_message)
+                    return
+
+                rates = get_completion_rates(db, start, end)
+                show(render_completion_rates(start, end, rates))
+            elif analytics_choice == "Missed periods of a habit last month":
+                title = ask_for_title()
+
+                if check_if_exists(db, title) is False:
+                    return
+
+                start = date.today() - timedelta(days=30)
+                missed = get_missed_periods(db, title, start, date.today())
+                show(render_missed_periods(title, missed))
         elif choice == "Delete the habit":
             title = ask_for_title()
 
@@ -129,7 +178,7 @@ def cli():
                 return
 
             habit = DatabaseHabit(title)
-            habit.delete(db)
+            habit.delete(db, sink=show_result)
             del habit
         elif choice == "Exit":
             print("See you next time!")
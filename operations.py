@@ -0,0 +1,263 @@
+"""
+The operations of the scriptable command line interface and of the daemon.
+
+Every operation receives a database connection and keyword parameters and returns its result. A request that the
+interactive interface would reject raises CommandError. Dates may be given as date objects or as YYYY-MM-DD.
+"""
+from datetime import date
+
+import analytics
+from constants import DEFAULT_USER
+from db import get_habit, get_profiler, iter_habits, iter_habits_period, read_batch
+from Habit import DatabaseHabit
+from periods import get_period
+
+
+class CommandError(Exception):
+    """A request that the application rejects, the message is shown to the user"""
+
+
+def parse_date(value):
+    """
+    Convert a parameter to a date
+    :param value: a date, a YYYY-MM-DD string or None
+    :return: the date or None
+    """
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise CommandError(f"`{value}` is not a date in the format YYYY-MM-DD.") from None
+
+
+def find_habit(db, title, user_id=DEFAULT_USER):
+    """
+    Return a habit's row or fail if it does not exist
+    :param db: a database connection
+    :param title: a habit's title
+    :param user_id: the user of the habit
+    :return: the habit's row
+    """
+    habit = get_habit(db, title, user_id)
+    if habit is None:
+        raise CommandError(f"The habit with the title `{title}` does not exist.")
+    return habit
+
+
+def add(
+    db, title, description="", periodicity="daily", creation_time=None, user_id=DEFAULT_USER
+):
+    """
+    Create a habit
+    :param db: a database connection
+    :param title: a habit's title
+    :param description: a habit's description
+    :param periodicity: a habit's periodicity, see `periods.py`
+    :param creation_time: the creation date, today if it is not given
+    :param user_id: the user of the habit
+    :return: HabitChange
+    """
+    creation_time = parse_date(creation_time) or date.today()
+    if get_habit(db, title, user_id) is not None:
+        raise CommandError(f"The habit with the title `{title}` already exists.")
+    try:
+        get_period(periodicity)
+    except ValueError as error:
+        raise CommandError(str(error)) from None
+    if creation_time > date.today():
+        raise CommandError("The creation date cannot be later than today!")
+    return DatabaseHabit(title, description, periodicity, creation_time, user_id).store(db)
+
+
+def complete_task(db, title, custom_date=None, user_id=DEFAULT_USER):
+    """
+    Check off a habit's task
+    :param db: a database connection
+    :param title: a habit's title
+    :param custom_date: the date of the completed task, today if it is not given
+    :param user_id: the user of the habit
+    :return: CompletionResult
+    """
+    custom_date = parse_date(custom_date) or date.today()
+    creation_time = find_habit(db, title, user_id)[5]
+    if custom_date > date.today() or custom_date < creation_time:
+        raise CommandError(
+            "The creation date cannot be earlier than creation time and later than today!"
+        )
+    return DatabaseHabit(title, user_id=user_id).complete_task(db, custom_date)
+
+
+def delete_task(db, title, custom_date=None, user_id=DEFAULT_USER):
+    """
+    Delete a habit's completed task of one day, e.g. a check-off by mistake
+    :param db: a database connection
+    :param title: a habit's title
+    :param custom_date: the date of the completed task, today if it is not given
+    :param user_id: the user of the habit
+    :return: HabitChange
+    """
+    custom_date = parse_date(custom_date) or date.today()
+    find_habit(db, title, user_id)
+    change = DatabaseHabit(title, user_id=user_id).delete_task(db, custom_date)
+    if not change.count:
+        raise CommandError(f"The habit `{title}` was not completed on {custom_date}.")
+    return change
+
+
+def delete(db, title, user_id=DEFAULT_USER):
+    """
+    Delete a habit and its completed tasks
+    :param db: a database connection
+    :param title: a habit's title
+    :param user_id: the user of the habit
+    :return: HabitChange
+    """
+    find_habit(db, title, user_id)
+    return DatabaseHabit(title, user_id=user_id).delete(db)
+
+
+def list_habits(db, periodicity=None, user_id=DEFAULT_USER):
+    """
+    Return all habits or the habits of a periodicity
+    :param db: a database connection
+    :param periodicity: a habit's periodicity or None for all habits
+    :param user_id: the user of the habits
+    :return: a list of dictionaries with the title and, for all habits, the description
+    """
+    if periodicity is None:
+        return [
+            {"title": title, "description": description}
+            for title, description in iter_habits(db, user_id=user_id)
+        ]
+    return [
+        {"title": row[0]} for row in iter_habits_period(db, periodicity, user_id=user_id)
+    ]
+
+
+def stats(db, start=None, end=None, user_id=DEFAULT_USER):
+    """
+    Return the longest streaks and the weakest habits, or the completion rates within a date range
+    :param db: a database connection
+    :param start: the first date of the range or None
+    :param end: the last date of the range or None
+    :param user_id: the user of the habits
+    :return: a dictionary of `longest_streaks` and `weakest`, or of `completion_rates`
+    """
+    start, end = parse_date(start), parse_date(end)
+    if (start is None) != (end is None):
+        raise CommandError("Both the first and the last date are needed for a date range.")
+    if start is not None:
+        if start > end:
+            raise CommandError("The first date of the range is later than the last one.")
+        return {
+            "completion_rates": analytics.get_completion_rates(db, start, end, user_id)
+        }
+    return {
+        "longest_streaks": {
+            period: [{"title": title, "streak": streak} for title, streak in habits]
+            for period, habits in analytics.get_streaks_for_habits(
+                db, user_id=user_id
+            ).items()
+        },
+        "weakest": {
+            period: None if habit is None else {"title": habit[0], "streak": habit[1]}
+            for period, habit in analytics.get_weakest_habits(
+                db, user_id=user_id
+            ).items()
+        },
+    }
+
+
+def metrics(db, format="prometheus"):
+    """
+    Return the measurements of the profiled connections, see `profiling.py`
+    :param db: a database connection
+    :param format: `prometheus` or `text`
+    :return: the metrics in the Prometheus text format or a text report
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        raise CommandError("Profiling is disabled, start the daemon with --instrument.")
+    return profiler.prometheus() if format == "prometheus" else profiler.report()
+
+
+# The operations that change the database, the daemon commits the writes that arrive together in one transaction
+WRITES = {
+    "add": add,
+    "complete_task": complete_task,
+    "delete_task": delete_task,
+    "delete": delete,
+}
+
+READS = {
+    "list": list_habits,
+    "stats": stats,
+    "get_habits": analytics.get_habits,
+    "get_habits_page": analytics.get_habits_page,
+    "get_period_habits": analytics.get_period_habits,
+    "get_streak_for_habit": analytics.get_streak_for_habit,
+    "get_streaks_for_habits": analytics.get_streaks_for_habits,
+    "get_completion_rates": analytics.get_completion_rates,
+    "get_weakest_habits": analytics.get_weakest_habits,
+    "get_completions_per_period": analytics.get_completions_per_period,
+    "get_missed_periods": analytics.get_missed_periods,
+    "metrics": metrics,
+}
+
+# The parameters of the analytics functions that are dates
+DATE_PARAMETERS = ("start", "end")
+
+
+def prepare(name, params):
+    """
+    Look up an operation and convert its date parameters
+    :param name: the name of the operation
+    :param params: a dictionary of its parameters
+    :return: `read` or `write`, the function of the operation and the converted parameters
+    """
+    if name in WRITES:
+        kind, function = "write", WRITES[name]
+    elif name in READS:
+        kind, function = "read", READS[name]
+    else:
+        raise CommandError(f"There is no operation `{name}`.")
+    params = {
+        key: parse_date(value) if key in DATE_PARAMETERS else value
+        for key, value in params.items()
+    }
+    return kind, function, params
+
+
+def run(db, function, params):
+    """
+    Call an operation and load the rows of a returned generator. The operation is one read batch, whether other
+    processes changed the database is checked once before it, see `db.read_batch`
+    :param db: a database connection
+    :param function: the function of the operation
+    :param params: a dictionary of its parameters
+    :return: the result of the operation
+    """
+    with read_batch(db):
+        result = function(db, **params)
+        if hasattr(result, "__next__"):
+            result = list(result)
+    return result
+
+
+def as_json(data):
+    """
+    Convert the results of operations to JSON compatible objects, dates are kept and written with `default=str`
+    :param data: results, lists, tuples and dictionaries of them
+    :return: an object for json.dumps
+    """
+    if hasattr(data, "_asdict"):
+        return {key: as_json(value) for key, value in data._asdict().items()}
+    if isinstance(data, dict):
+        return {
+            str(key) if isinstance(key, date) else key: as_json(value)
+            for key, value in data.items()
+        }
+    if isinstance(data, (list, tuple)):
+        return [as_json(value) for value in data]
+    return data
@@ -0,0 +1,140 @@
+"""
+The periodicities of habits and their period buckets.
+
+A periodicity splits the days into periods, and every period has an integer bucket id. Consecutive periods have
+consecutive ids. A period is completed when it has `quota` completed tasks, and a streak continues while the next
+completed period is at most `gap` buckets after the previous one, which is the next bucket for every periodicity but
+`weekly`.
+
+The periodicity of a habit is one of
+
+- `daily` and `monthly`
+- `weekly`, a period per day and a gap of 7 days, so a streak counts the tasks that are at most a week apart
+- `calendar weekly`, weeks from Monday to Sunday
+- `weekdays`, a period per weekday, a task on a weekend counts for the Friday before
+- `every N days`, periods of N days that are counted from the day ordinal 1
+- `N times per week`, weeks that are completed by N tasks
+
+A bucket is the index of the period's first unit, a day, a weekday or a month, divided by the number of units in a
+period. It is calculated in O(1) in Python, see `Period.bucket`, and in SQL, see `db.PERIOD_BUCKET`. The analytics
+count the completed periods of `gap` consecutive periods together, see `Period.window`.
+"""
+import re
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+# The periodicities that are offered when a habit is created, N stands for a number
+PERIODICITIES = ["daily", "weekly", "calendar weekly", "monthly", "weekdays", "every N days", "N times per week"]
+
+# The periodicities that take a number, and the unit, the size, the quota and the gap of their periods
+PATTERNS = {
+    re.compile(r"every ([1-9][0-9]*) days"): lambda n: ("day", n, 1, 1),
+    re.compile(r"([1-7]) times per week"): lambda n: ("day", 7, n, 1),
+}
+
+# The periodicities without a number
+FIXED = {
+    "daily": ("day", 1, 1, 1),
+    "weekly": ("day", 1, 1, 7),
+    "calendar weekly": ("day", 7, 1, 1),
+    "monthly": ("month", 1, 1, 1),
+    "weekdays": ("weekday", 1, 1, 1),
+}
+
+
+class Period(
+    namedtuple(
+        "Period",
+        [
+            "name",
+            # `day`, `weekday` or `month`
+            "unit",
+            # the number of units in a period
+            "size",
+            # the number of completed tasks that complete a period
+            "quota",
+            # the largest number of periods from one completed period of a streak to the next one
+            "gap",
+        ],
+    )
+):
+    """How a periodicity splits the days into periods"""
+
+    __slots__ = ()
+
+    def bucket(self, day):
+        """
+        Return the bucket of the period that contains a day
+        :param day: a day ordinal
+        :return: the bucket
+        """
+        if self.unit == "day":
+            unit = day - 1
+        elif self.unit == "weekday":
+            week, weekday = divmod(day - 1, 7)
+            unit = week * 5 + min(weekday, 4)
+        else:
+            month = date.fromordinal(day)
+            unit = month.year * 12 + month.month - 1
+        return unit // self.size
+
+    def first_day(self, bucket):
+        """
+        Return the first day of a period
+        :param bucket: a bucket, see `bucket`
+        :return: a day ordinal
+        """
+        unit = bucket * self.size
+        if self.unit == "day":
+            return unit + 1
+        if self.unit == "weekday":
+            week, weekday = divmod(unit, 5)
+            return week * 7 + weekday + 1
+        year, month = divmod(unit, 12)
+        return date(year, month + 1, 1).toordinal()
+
+    def last_day(self, bucket):
+        """
+        Return the last day of a period, the weekend belongs to the period of the Friday before it
+        :param bucket: a bucket, see `bucket`
+        :return: a day ordinal
+        """
+        return self.first_day(bucket + 1) - 1
+
+    def window(self):
+        """
+        Return the periods that the analytics count as one, `gap` consecutive periods each, e.g. the calendar weeks of
+        a weekly habit whose streaks count days. The window of a bucket is the bucket divided by `gap`
+        :return: Period
+        """
+        return self._replace(size=self.size * self.gap, gap=1)
+
+
+@lru_cache(maxsize=None)
+def get_period(periodicity):
+    """
+    Return the periods of a periodicity
+    :param periodicity: a habit's periodicity, see PERIODICITIES
+    :return: Period
+    """
+    if periodicity in FIXED:
+        return Period(periodicity, *FIXED[periodicity])
+    for pattern, period in PATTERNS.items():
+        match = pattern.fullmatch(periodicity)
+        if match is not None:
+            return Period(periodicity, *period(int(match.group(1))))
+    raise ValueError(f"`{periodicity}` is not a periodicity, use one of {', '.join(PERIODICITIES)}.")
+
+
+def is_periodicity(periodicity):
+    """
+    Check if a value is a valid periodicity
+    :param periodicity: a value
+    :return: True or False
+    """
+    try:
+        get_period(periodicity)
+    except (TypeError, ValueError):
+        return False
+    return True
@@ -0,0 +1,203 @@
+import functools
+import queue
+import threading
+import types
+
+from db import get_db, transaction
+
+# The maximal number of queued writes that the writer commits in one transaction
+MAX_GROUP_SIZE = 256
+
+
+class ConnectionPool:
+    def __init__(self, name="main.db", readers=4, profile="fast"):
+        """
+        A pool of reader connections and a single writer thread that serializes all writes to a database file.
+        Writes that are queued at the same time are committed together in one transaction, each of them in its
+        own savepoint
+        :param name: name of the database file
+        :param readers: the number of reader connections
+        :param profile: the connection profile, see `db.PROFILES`
+        """
+        if name == ":memory:":
+            raise ValueError("A connection pool needs a database file")
+        self.name = name
+        self.profile = profile
+        self._writes = queue.Queue()
+        self._readers = queue.Queue()
+
+        # concurrent.futures imports logging, it is only loaded once a pool is created, see `habits.py`
+        from concurrent.futures import Future
+
+        started = Future()
+        self._writer = threading.Thread(
+            target=self._write_loop, args=(started,), name="habit-writer", daemon=True
+        )
+        self._writer.start()
+        started.result()
+        for _ in range(readers):
+            self._readers.put(get_db(name, profile, check_same_thread=False))
+
+    def read(self, function, *args, **kwargs):
+        """
+        Call a function with a reader connection as its first argument
+        :param function: a function that receives a database connection
+        :return: the function's result
+        """
+        db = self._readers.get()
+        try:
+            return function(db, *args, **kwargs)
+        finally:
+            if db.in_transaction:
+                db.rollback()
+            self._readers.put(db)
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue a function that receives the writer connection as its first argument
+        :param function: a function that receives a database connection
+        :return: a Future of the function's result
+        """
+        from concurrent.futures import Future
+
+        future = Future()
+        self._writes.put((function, args, kwargs, future))
+        return future
+
+    def write(self, function, *args, **kwargs):
+        """
+        Call a function with the writer connection as its first argument and wait until it is committed
+        :param function: a function that receives a database connection
+        :return: the function's result
+        """
+        return self.submit(function, *args, **kwargs).result()
+
+    def run(self, kind, function, *args, **kwargs):
+        """
+        Call a function with a reader or the writer connection
+        :param kind: `read` or `write`
+        :param function: a function that receives a database connection
+        :return: the function's result
+        """
+        if kind == "read":
+            return self.read(function, *args, **kwargs)
+        return self.write(function, *args, **kwargs)
+
+    def close(self):
+        """
+        Finish the queued writes and close all connections
+        :return: None
+        """
+        self._writes.put(None)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+    def __enter__(self):
+        """
+        Use the pool as a context manager that closes it at the end
+        :return: the pool
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Close the pool
+        :return: None
+        """
+        self.close()
+
+    def _write_loop(self, started):
+        """
+        Run the queued writes in groups on the writer connection until the pool is closed
+        :param started: a Future that is resolved when the writer connection is open
+        :return: None
+        """
+        try:
+            db = get_db(self.name, self.profile)
+        except Exception as error:
+            started.set_exception(error)
+            return
+        started.set_result(None)
+
+        stop = False
+        while not stop:
+            jobs = [self._writes.get()]
+            while len(jobs) < MAX_GROUP_SIZE:
+                try:
+                    jobs.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in jobs
+            jobs = [job for job in jobs if job is not None]
+
+            results = run_group(db, [job[:3] for job in jobs])
+            for (_, _, _, future), (result, error) in zip(jobs, results):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+        db.close()
+
+
+def run_group(db, calls):
+    """
+    Run many writes in one transaction, each of them in its own savepoint so that a failing write does not undo
+    the others
+    :param db: a database connection
+    :param calls: triples of a function that receives the database connection, its arguments and keyword arguments
+    :return: pairs of the result and the raised exception or None of every call
+    """
+    results = []
+    try:
+        with transaction(db):
+            for function, args, kwargs in calls:
+                try:
+                    with transaction(db):
+                        result = function(db, *args, **kwargs)
+                    results.append((result, None))
+                except Exception as error:
+                    results.append((None, error))
+    except Exception as error:
+        results = [(None, error) for _ in calls]
+    return results
+
+
+def pooled(kind, method=False):
+    """
+    Let a function whose first argument is a database connection (after `self` for methods) also receive a
+    ConnectionPool, the function then runs on a reader or the writer connection of the pool. A generator that
+    a read returns is turned into a list before the connection goes back to the pool
+    :param kind: `read` or `write`
+    :param method: whether the function is a method
+    :return: a decorator
+    """
+
+    def decorator(function):
+        def materialized(*args, **kwargs):
+            result = function(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                return list(result)
+            return result
+
+        if method:
+
+            @functools.wraps(function)
+            def wrapper(self, db, *args, **kwargs):
+                if isinstance(db, ConnectionPool):
+                    return db.run(
+                        kind, functools.partial(materialized, self), *args, **kwargs
+                    )
+                return function(self, db, *args, **kwargs)
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(db, *args, **kwargs):
+                if isinstance(db, ConnectionPool):
+                    return db.run(kind, materialized, *args, **kwargs)
+                return function(db, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,380 @@
+"""
+Opt-in instrumentation of the database work: call counts, latencies and row counts of every SQL statement and of
+the functions that run them, the statements that SQLite executes, e.g. in triggers, and the query plans of slow
+statements.
+
+    with profiled(slow_query_ms=5) as profiler:
+        db = get_db()
+        ...
+    print(profiler.report())
+    print(profiler.prometheus())
+
+Only the connections that `get_db` opens while a profiler is set are instrumented. All other connections are plain
+`db.Connection`s, so profiling costs nothing while it is disabled.
+"""
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from db import Connection, set_profiler
+
+# String and number literals of the SQL that the trace callback receives, their values are replaced by `?`
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# The statements that SQLite can explain
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def normalize(sql):
+    """
+    Collapse the whitespace of a statement and replace its literals by `?`, so that the executions of a statement
+    with different values are counted together
+    :param sql: a statement
+    :return: the normalized statement
+    """
+    return LITERALS.sub("?", " ".join(sql.split()))
+
+
+class Stats:
+    __slots__ = ("calls", "seconds", "max_seconds", "rows")
+
+    def __init__(self):
+        """The counters of a statement or a function"""
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+
+class Profiler:
+    def __init__(self, slow_query_ms=None):
+        """
+        The collected measurements of the profiled connections
+        :param slow_query_ms: the latency from which the query plan of a statement is captured, None for never
+        """
+        self.slow_query_ms = slow_query_ms
+        # statement -> Stats of the statements that the application executed
+        self.statements = {}
+        # `module.function` -> Stats of the statements that the function executed
+        self.functions = {}
+        # statement -> count of the statements that SQLite executed, including transaction control. The trace
+        # callback receives the outer statement once more for every trigger program that it runs
+        self.traced = Counter()
+        # statement -> details of its query plan, and the details that scan a whole table
+        self.plans = {}
+        self.scans = {}
+        self._lock = threading.Lock()
+
+    def connection_factory(self, *args, **kwargs):
+        """
+        Open a profiled connection, it is passed to `sqlite3.connect` as factory
+        :return: ProfiledConnection
+        """
+        db = ProfiledConnection(*args, **kwargs)
+        db.profiler = self
+        db.set_trace_callback(self.trace)
+        return db
+
+    def trace(self, sql):
+        """
+        Count a statement that SQLite executes, the trace callback of the profiled connections
+        :param sql: the statement with its values
+        :return: None
+        """
+        sql = normalize(sql)
+        with self._lock:
+            self.traced[sql] += 1
+
+    def record(self, sql, function, seconds, rows, calls=1):
+        """
+        Add a measurement of a statement
+        :param sql: the statement
+        :param function: the `module.function` that executed it
+        :param seconds: the elapsed time
+        :param rows: the number of changed or fetched rows
+        :param calls: 1 for an execution, 0 for fetching more rows of a previous execution
+        :return: None
+        """
+        sql = " ".join(sql.split())
+        with self._lock:
+            for key, table in ((sql, self.statements), (function, self.functions)):
+                stats = table.get(key)
+                if stats is None:
+                    stats = table[key] = Stats()
+                stats.calls += calls
+                stats.seconds += seconds
+                stats.max_seconds = max(stats.max_seconds, seconds)
+                stats.rows += rows
+
+    def explain(self, db, sql, parameters):
+        """
+        Capture the query plan of a slow statement once
+        :param db: the connection that executed the statement
+        :param sql: the statement
+        :param parameters: its parameters
+        :return: None
+        """
+        sql = " ".join(sql.split())
+        if sql in self.plans or not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        cursor = sqlite3.Connection.cursor(db, sqlite3.Cursor)
+        # the statements of the profiler are not traced
+        db.set_trace_callback(None)
+        try:
+            plan = [
+                row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            ]
+            tables = {
+                row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            }
+        except sqlite3.Error as error:
+            plan, tables = [f"EXPLAIN failed: {error}"], set()
+        finally:
+            db.set_trace_callback(self.trace)
+        # subqueries and common table expressions are scanned as well, only the scans of tables are kept
+        scans = [
+            detail
+            for detail in plan
+            if detail.startswith("SCAN ") and detail.split()[1] in tables
+        ]
+        with self._lock:
+            self.plans[sql] = plan
+            self.scans[sql] = scans
+
+    def full_scans(self):
+        """
+        Return the slow statements whose query plan scans a whole table
+        :return: a dictionary of the statements and the scanned tables of their plans
+        """
+        return {sql: scans for sql, scans in self.scans.items() if scans}
+
+    def reset(self):
+        """
+        Remove all measurements
+        :return: None
+        """
+        with self._lock:
+            self.statements.clear()
+            self.functions.clear()
+            self.traced.clear()
+            self.plans.clear()
+            self.scans.clear()
+
+    def report(self, limit=20):
+        """
+        Return a text report of the measurements, ordered by the total time
+        :param limit: the number of statements and functions to show
+        :return: the report
+        """
+        with self._lock:
+            tables = [
+                ("SQL statements", dict(self.statements)),
+                ("Functions", dict(self.functions)),
+            ]
+            traced = Counter(self.traced)
+            plans = dict(self.plans)
+        lines = []
+        for title, table in tables:
+            lines.append(f"{title} by total time")
+            lines.append(f"{'calls':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>9}  name")
+            ranked = sorted(table.items(), key=lambda item: item[1].seconds, reverse=True)
+            for name, stats in ranked[:limit]:
+                lines.append(
+                    f"{stats.calls:>8} {stats.seconds * 1000:>10.2f} "
+                    f"{stats.seconds * 1000 / max(stats.calls, 1):>9.3f} "
+                    f"{stats.max_seconds * 1000:>9.3f} {stats.rows:>9}  {name}"
+                )
+            lines.append("")
+        lines.append("Statements executed by SQLite, once more for every trigger program that they run")
+        for sql, count in traced.most_common(limit):
+            lines.append(f"{count:>8}  {sql}")
+        if plans:
+            lines.append("")
+            lines.append("Query plans of slow statements")
+            for sql, plan in plans.items():
+                lines.append(sql)
+                lines.extend(f"    {detail}" for detail in plan)
+        return "\n".join(lines)
+
+    def prometheus(self, prefix="habits"):
+        """
+        Return the measurements in the Prometheus text exposition format
+        :param prefix: the prefix of the metric names
+        :return: the metrics
+        """
+        lines = []
+        with self._lock:
+            tables = [
+                ("sql", "statement", "SQL statements", dict(self.statements)),
+                ("function", "function", "functions", dict(self.functions)),
+            ]
+            traced = dict(self.traced)
+            scans = self.full_scans()
+        for kind, label, description, table in tables:
+            for metric, help_text, value in (
+                ("calls_total", f"Executions of {description}", lambda s: s.calls),
+                ("seconds_total", f"Time spent in {description}", lambda s: s.seconds),
+                ("rows_total", f"Rows changed or fetched by {description}", lambda s: s.rows),
+            ):
+                name = f"{prefix}_{kind}_{metric}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for key, stats in table.items():
+                    lines.append(f'{name}{{{label}="{escape(key)}"}} {value(stats)}')
+        name = f"{prefix}_sqlite_statements_total"
+        lines.append(
+            f"# HELP {name} Statements executed by SQLite, once more for every trigger program that they run"
+        )
+        lines.append(f"# TYPE {name} counter")
+        for sql, count in traced.items():
+            lines.append(f'{name}{{statement="{escape(sql)}"}} {count}')
+        name = f"{prefix}_sql_full_scans"
+        lines.append(f"# HELP {name} Tables that the query plan of a slow statement scans completely")
+        lines.append(f"# TYPE {name} gauge")
+        for sql, details in scans.items():
+            lines.append(f'{name}{{statement="{escape(sql)}"}} {len(details)}')
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    """
+    Escape a Prometheus label value
+    :param value: the value
+    :return: the escaped value
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def caller(frame):
+    """
+    Return the name of the first function outside of this module
+    :param frame: the frame to start from
+    :return: `module.function`
+    """
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "<unknown>"
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    # The statement of the latest execution, the function that executed it, its parameters, its elapsed time and
+    # whether its plan was captured. The time and the rows of the fetches are added to it
+    _sql = None
+    _function = None
+    _parameters = None
+    _elapsed = 0.0
+    _explained = False
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, None)
+
+    def _run(self, execute, sql, parameters, explain_parameters):
+        """
+        Execute a statement and record its latency and its changed rows
+        :param execute: the execute method of sqlite3.Cursor
+        :param sql: the statement
+        :param parameters: the parameters or the sequence of parameters
+        :param explain_parameters: the parameters for EXPLAIN or None if it cannot be explained
+        :return: the cursor
+        """
+        self._sql = sql
+        self._function = caller(sys._getframe(1))
+        self._parameters = explain_parameters
+        self._elapsed = 0.0
+        self._explained = False
+        started = time.perf_counter()
+        try:
+            return execute(sql, parameters)
+        finally:
+            self._measure(time.perf_counter() - started, max(self.rowcount, 0), 1)
+
+    def _measure(self, seconds, rows, calls):
+        """
+        Record the measurement of the current statement and capture its plan if it became slow
+        :param seconds: the elapsed time
+        :param rows: the number of changed or fetched rows
+        :param calls: 1 for an execution, 0 for a fetch
+        :return: None
+        """
+        if self._sql is None:
+            return
+        profiler = self.connection.profiler
+        profiler.record(self._sql, self._function, seconds, rows, calls)
+        self._elapsed += seconds
+        slow = profiler.slow_query_ms
+        if (
+            slow is not None
+            and not self._explained
+            and self._parameters is not None
+            and self._elapsed * 1000 >= slow
+        ):
+            self._explained = True
+            profiler.explain(self.connection, self._sql, self._parameters)
+
+    def _fetch(self, fetch, *args):
+        """
+        Fetch rows and add the time and the rows to the current statement
+        :param fetch: a fetch method of sqlite3.Cursor
+        :return: the fetched rows
+        """
+        started = time.perf_counter()
+        rows = fetch(*args)
+        count = len(rows) if isinstance(rows, list) else int(rows is not None)
+        self._measure(time.perf_counter() - started, count, 0)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._fetch(super().fetchmany)
+        return self._fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class ProfiledConnection(Connection):
+    """A database connection whose statements are measured by a Profiler"""
+
+    profiler = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+@contextmanager
+def profiled(slow_query_ms=None):
+    """
+    Profile the connections that `get_db` opens within the block
+    :param slow_query_ms: the latency from which the query plan of a statement is captured, None for never
+    :return: a context manager that yields the Profiler
+    """
+    profiler = Profiler(slow_query_ms)
+    previous = set_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        set_profiler(previous)
@@ -0,0 +1,231 @@
+from db import CompletionStats
+from periods import get_period
+from results import HabitChange, CompletionResult
+
+
+def render_result(result):
+    """
+    Describe the result of a habit operation for the user
+    :param result: a HabitChange or a CompletionResult
+    :return: a generator of lines
+    """
+    if isinstance(result, HabitChange):
+        if result.action == "added":
+            yield f"The habit with the title `{result.title}` was successfully added."
+        elif result.action == "deleted":
+            yield f"The habit with the title `{result.title}` was successfully deleted."
+        elif result.action == "tasks_deleted":
+            yield f"The completed tasks of the habit `{result.title}` were successfully deleted."
+        elif result.action == "task_deleted":
+            yield f"The completed task of the habit `{result.title}` was successfully deleted."
+    elif isinstance(result, CompletionResult):
+        if result.duplicate:
+            yield "You have already completed this task on this day."
+        elif result.broke_streak:
+            period = get_period(result.periodicity)
+            if period.unit == "day" and period.size == 1:
+                yield f"You broke your habit! You skipped more than {period.gap} day(s)"
+            else:
+                yield f"You broke your habit! You skipped at least one period ({result.periodicity})"
+            yield "The successful streak count was updated."
+        else:
+            yield "The successful streak count was updated."
+            if result.new_record:
+                yield (
+                    f"You have a new record! Your longest streak for the habit `{result.title}` is "
+                    f"{result.new_streak}."
+                )
+
+
+def render_habits(habits, start=1):
+    """
+    Describe habits as a numbered list
+    :param habits: titles and descriptions of habits
+    :param start: the number of the first habit
+    :return: a generator of lines
+    """
+    for idx, x in enumerate(habits):
+        yield f"{start + idx}. {x[0]}: {x[1]} "
+
+
+def render_all_habits(habits):
+    """
+    Describe all current habits
+    :param habits: titles and descriptions of habits, see `analytics.get_habits`
+    :return: a generator of lines
+    """
+    yield "Your current habits are: "
+    yield from render_habits(habits)
+
+
+def render_habits_page(habits, start=1):
+    """
+    Describe one page of habits
+    :param habits: titles and descriptions of the habits on the page
+    :param start: the number of the first habit on the page
+    :return: a generator of lines
+    """
+    if len(habits) < 1:
+        yield "None"
+    yield from render_habits(habits, start)
+
+
+def render_period_habits(period, titles):
+    """
+    Describe the habits of a periodicity
+    :param period: periodicity of habits
+    :param titles: titles of habits, see `analytics.get_period_habits`
+    :return: a generator of lines
+    """
+    yield f"The habits of the period `{period}` are: "
+    idx = -1
+    for idx, title in enumerate(titles):
+        yield f"{idx + 1}. {title} "
+    if idx < 0:
+        yield "None"
+
+
+def render_streak(title, streak):
+    """
+    Describe the longest streak of a habit
+    :param title: a habit's title
+    :param streak: the longest streak, see `analytics.get_streak_for_habit`
+    :return: a generator of lines
+    """
+    yield f"Your longest streak of the habit `{title}` is: {streak}"
+
+
+def render_streaks(streaks):
+    """
+    Describe the longest streaks of all habits
+    :param streaks: a dictionary of every periodicity and the titles and longest streaks of its habits
+    :return: a generator of lines
+    """
+    yield "The longest streaks of all habits are: "
+    for period, habits in streaks.items():
+        yield period
+        for idx, x in enumerate(habits):
+            yield f"{idx + 1}. {x[0]} - {x[1]} "
+
+
+def render_stats(habit_stats):
+    """
+    Describe the CompletionStats of a habit
+    :param habit_stats: CompletionStats of a habit
+    :return: a string
+    """
+    return (
+        f"{habit_stats.title}: {habit_stats.completed} of {habit_stats.expected} periods completed "
+        f"({habit_stats.completion_rate:.0%}), {habit_stats.missed} missed, "
+        f"the longest gap is {habit_stats.longest_gap} day(s)"
+    )
+
+
+def render_weakest_habits(weakest):
+    """
+    Describe the weakest habit of every periodicity
+    :param weakest: a dictionary of every periodicity and the title and streak count or the CompletionStats of its
+     weakest habit, see `analytics.get_weakest_habits`
+    :return: a generator of lines
+    """
+    yield "Lately you struggled the most with these habits: "
+    for period, habit in weakest.items():
+        yield period
+        if habit is None:
+            yield "None"
+        elif isinstance(habit, CompletionStats):
+            yield f"{render_stats(habit)} "
+        else:
+            yield f"{habit[0]}: the current streak count is {habit[1]} "
+
+
+def render_completion_rates(start, end, rates):
+    """
+    Describe the completion statistics of all habits within a date range
+    :param start: the first date of the range
+    :param end: the last date of the range
+    :param rates: a dictionary of every periodicity and the CompletionStats of its habits
+    :return: a generator of lines
+    """
+    yield f"Your completion rates from {start} to {end} are: "
+    for period, habits_stats in rates.items():
+        yield period
+        if len(habits_stats) < 1:
+            yield "None"
+        for idx, habit_stats in enumerate(habits_stats):
+            yield f"{idx + 1}. {render_stats(habit_stats)} "
+
+
+def render_missed_periods(title, missed):
+    """
+    Describe the periods in which a habit was not completed
+    :param title: a habit's title
+    :param missed: the first dates of the missed periods, see `analytics.get_missed_periods`
+    :return: a generator of lines
+    """
+    yield f"The missed periods of the habit `{title}` are: "
+    if len(missed) < 1:
+        yield "None"
+    for idx, period_start in enumerate(missed):
+        yield f"{idx + 1}. {period_start} "
+
+
+def render_completions_per_period(period, counts):
+    """
+    Describe how many habits of a periodicity were completed in every period
+    :param period: periodicity of habits
+    :param counts: a dictionary of the first date of every period and the number of completed habits, see
+     `analytics.get_completions_per_period`
+    :return: a generator of lines
+    """
+    yield f"The completed habits of the period `{period}` are: "
+    for period_start, count in counts.items():
+        yield f"{period_start}: {count} "
+
+
+def render_transfer_results(command, results):
+    """
+    Describe the outcome of an import or an export
+    :param command: `import` or `export`
+    :param results: TransferResults of the tables
+    :return: a generator of lines
+    """
+    verb = "imported" if command == "import" else "exported"
+    for result in results:
+        line = f"{result.rows} rows of the table `{result.table}` were {verb}."
+        if result.skipped:
+            line += f" {result.skipped} rows were skipped."
+        yield line
+
+
+def render_batch_report(path, databases, rows, failed):
+    """
+    Describe the outcome of a batch report
+    :param path: the path of the report file
+    :param databases: the number of database files
+    :param rows: the number of written rows
+    :param failed: the number of database files that could not be read
+    :return: a generator of lines
+    """
+    yield f"{rows} rows of {databases} database files were written to `{path}`."
+    if failed:
+        yield f"{failed} database files could not be read, see the `error` column."
+
+
+def show(lines):
+    """
+    Print lines as soon as they are rendered
+    :param lines: an iterable of lines
+    :return: None
+    """
+    for line in lines:
+        print(line)
+
+
+def show_result(result):
+    """
+    An event sink that prints the results of habit operations
+    :param result: a HabitChange or a CompletionResult
+    :return: None
+    """
+    show(render_result(result))
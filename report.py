@@ -0,0 +1,146 @@
+"""
+A batch report of the streaks in many database files, computed by a pool of worker processes.
+
+Run it from the repository root with
+
+    python -m report DIRECTORY_OR_GLOB... [--output report.jsonl] [--format jsonl] [--workers N]
+
+A directory stands for the `*.db` files in it. Every file is opened read-only by a worker, nothing is written to it
+and its schema is not upgraded. The report has one row per file, user and periodicity with the number of habits, the
+habit with the longest streak and the habit with the lowest current streak count. A file that cannot be read gets
+one row with the error instead. The progress is printed to stderr.
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import analytics
+from db import get_db, get_user_ids
+from render import show, render_batch_report
+from transfer import write_rows
+
+# The columns of the report
+COLUMNS = (
+    "database",
+    "user_id",
+    "periodicity",
+    "habits",
+    "best_habit",
+    "longest_streak",
+    "weakest_habit",
+    "streak_count",
+    "error",
+)
+
+FORMATS = ("jsonl", "csv")
+
+# The number of chunks of database files per worker. A worker receives a chunk at once, several chunks per worker
+# keep all of them busy until the end when the files differ in size
+CHUNKS_PER_WORKER = 4
+
+
+def find_databases(patterns):
+    """
+    Return the database files of directories and glob patterns
+    :param patterns: paths of directories, paths of files or glob patterns
+    :return: the sorted paths of the files without duplicates
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.db")
+        paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def report_database(path):
+    """
+    Compute the report rows of a database file, it runs in a worker process
+    :param path: the path of the database file
+    :return: a list of rows with the values of COLUMNS
+    """
+    rows = []
+    try:
+        db = get_db(path, "fast", read_only=True)
+        try:
+            for user_id in get_user_ids(db):
+                streaks = analytics.get_streaks_for_habits(db, user_id=user_id)
+                weakest = analytics.get_weakest_habits(db, user_id=user_id)
+                for period, habits in streaks.items():
+                    best = habits[0] if habits else (None, None)
+                    weak = weakest.get(period) or (None, None)
+                    rows.append((path, user_id, period, len(habits), *best, *weak, None))
+        finally:
+            db.close()
+    except sqlite3.Error as error:
+        return [(path, *[None] * (len(COLUMNS) - 2), str(error))]
+    return rows
+
+
+def iter_reports(paths, workers=None, progress=None):
+    """
+    Yield the report rows of database files in the order of the paths. The files are spread over worker processes in
+    chunks, so that the work grows linearly with the number of workers
+    :param paths: the paths of the database files
+    :param workers: the number of worker processes, all CPUs if it is not given, 1 computes the rows in this process
+    :param progress: a callable that receives the number of finished files and the number of all files, or None
+    :return: a generator of rows with the values of COLUMNS
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        reports = map(report_database, paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers)
+        chunksize = max(1, len(paths) // (workers * CHUNKS_PER_WORKER))
+        reports = executor.map(report_database, paths, chunksize=chunksize)
+    try:
+        for done, rows in enumerate(reports, 1):
+            yield from rows
+            if progress is not None:
+                progress(done, len(paths))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def print_progress(done, total):
+    """
+    Print the progress of a report to stderr, about once per percent
+    :param done: the number of finished database files
+    :param total: the number of all database files
+    :return: None
+    """
+    if done == total or done % max(1, total // 100) == 0:
+        end = "\n" if done == total else ""
+        print(f"\r{done}/{total} database files", end=end, file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("patterns", nargs="+", metavar="DIRECTORY_OR_GLOB")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--output", help="the path of the report, report.FORMAT by default")
+    parser.add_argument("--workers", type=int, help="the number of worker processes, all CPUs by default")
+    args = parser.parse_args(argv)
+
+    paths = find_databases(args.patterns)
+    output = args.output or f"report.{args.format}"
+    failed = set()
+
+    def rows():
+        for row in iter_reports(paths, args.workers, print_progress):
+            if row[-1] is not None:
+                failed.add(row[0])
+            yield row
+
+    count = write_rows(output, args.format, COLUMNS, rows())
+    show(render_batch_report(output, len(paths), count, len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from collections import namedtuple
+
+
+class HabitChange(
+    namedtuple(
+        "HabitChange",
+        [
+            # `added`, `deleted`, `tasks_deleted` or `task_deleted`
+            "action",
+            "title",
+            # the number of added or deleted rows
+            "count",
+        ],
+        defaults=[1],
+    )
+):
+    """A habit or its completed tasks were added or deleted"""
+
+    __slots__ = ()
+
+
+class CompletionResult(
+    namedtuple(
+        "CompletionResult",
+        [
+            "title",
+            "date",
+            "new_streak",
+            "longest_streak",
+            "broke_streak",
+            "new_record",
+            # whether the task was already completed on this day, nothing was changed then
+            "duplicate",
+            # the habit's periodicity, see `periods.py`
+            "periodicity",
+        ],
+    )
+):
+    """The outcome of checking off a habit's task"""
+
+    __slots__ = ()
+
+
+class TransferResult(
+    namedtuple(
+        "TransferResult",
+        [
+            "table",
+            # the number of imported or exported rows
+            "rows",
+            # the number of rows that failed the integrity checks or were already in the database
+            "skipped",
+        ],
+        defaults=[0],
+    )
+):
+    """The outcome of importing or exporting the rows of a table"""
+
+    __slots__ = ()
+
+
+def emit(sink, result):
+    """
+    Pass a result to an event sink if there is one
+    :param sink: a callable that receives results or None
+    :param result: a result object
+    :return: the result
+    """
+    if sink is not None:
+        sink(result)
+    return result
@@ -0,0 +1,209 @@
+"""
+Incremental maintenance of streak runs.
+
+A run is a maximal sequence of a habit's completed periods in which every period is at most `gap` buckets after the
+previous one, see `periods.py`. The runs of a habit are disjoint and ordered by their first bucket, the last run is the
+current streak and the longest run is the longest streak. A period that becomes completed or stops being completed
+only changes the runs around its bucket: it extends, merges or splits them, so the streaks are updated with a few
+ordered lookups instead of replaying the habit's history.
+
+The functions of this module work with any ordered collection of runs that has the methods of StreakRuns. StreakRuns
+keeps them in memory with bisect lookups, `db.DatabaseRuns` keeps them in the streak_run table whose primary key orders
+them in the same way.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+
+class Run(namedtuple("Run", ["start", "end", "length"])):
+    """A streak run of a habit, its first and last bucket and the number of completed periods in it"""
+
+    __slots__ = ()
+
+
+def merge_bucket(runs, bucket, gap, left, right):
+    """
+    Add a completed period to the runs of a habit, given the runs around it
+    :param runs: the runs of the habit, see StreakRuns
+    :param bucket: the bucket of the completed period, it must not be in a run yet
+    :param gap: the largest number of buckets between two completed periods of a run
+    :param left: the last run that starts before the bucket or None
+    :param right: the first run that starts after the bucket or None, it is not needed if the left run contains the
+     bucket
+    :return: the Run that contains the bucket, its length is 1 if the period did not continue a streak
+    """
+    if left is not None and left.end > bucket:
+        # a period between two completed periods of a run only shortens a gap
+        run = Run(left.start, left.end, left.length + 1)
+        runs.replace([left], [run])
+        return run
+    joins_left = left is not None and bucket - left.end <= gap
+    joins_right = right is not None and right.start - bucket <= gap
+    merged = [left] * joins_left + [right] * joins_right
+    run = Run(
+        left.start if joins_left else bucket,
+        right.end if joins_right else bucket,
+        1 + sum(run.length for run in merged),
+    )
+    runs.replace(merged, [run])
+    return run
+
+
+def add_bucket(runs, bucket, gap):
+    """
+    Add a completed period to the runs of a habit, the period can be earlier than the latest completed one
+    :param runs: the runs of the habit, see StreakRuns
+    :param bucket: the bucket of the completed period, it must not be in a run yet
+    :param gap: the largest number of buckets between two completed periods of a run
+    :return: the Run that contains the bucket, see `merge_bucket`
+    """
+    left = runs.before(bucket)
+    right = None if left is not None and left.end > bucket else runs.after(bucket)
+    return merge_bucket(runs, bucket, gap, left, right)
+
+
+def remove_bucket(runs, bucket, gap):
+    """
+    Remove a period that is not completed anymore from the runs of a habit, splitting its run in two if the gap that
+    is left is longer than `gap`
+    :param runs: the runs of the habit, see StreakRuns. The bucket must already be removed from its completed buckets
+    :param bucket: the bucket of the period
+    :param gap: the largest number of buckets between two completed periods of a run
+    :return: the runs that replaced the bucket's run, an empty list if it was the only period of its run
+    """
+    run = runs.before(bucket + 1)
+    if run is None or run.end < bucket:
+        return []
+    if gap == 1:
+        # the periods of the run are consecutive, there is nothing to look up
+        previous = bucket - 1 if run.start < bucket else None
+        following = bucket + 1 if run.end > bucket else None
+    else:
+        previous = runs.previous_bucket(bucket, run.start)
+        following = runs.next_bucket(bucket, run.end)
+    if previous is None and following is None:
+        parts = []
+    elif previous is None:
+        parts = [Run(following, run.end, run.length - 1)]
+    elif following is None:
+        parts = [Run(run.start, previous, run.length - 1)]
+    elif following - previous <= gap:
+        parts = [Run(run.start, run.end, run.length - 1)]
+    else:
+        length = bucket - run.start if gap == 1 else runs.count_buckets(run.start, previous)
+        parts = [
+            Run(run.start, previous, length),
+            Run(following, run.end, run.length - 1 - length),
+        ]
+    runs.replace([run], parts)
+    return parts
+
+
+class StreakRuns:
+    __slots__ = ("buckets", "starts", "ends", "lengths", "sorted_lengths")
+
+    def __init__(self, buckets=(), gap=1):
+        """
+        The runs of a habit in memory, parallel lists ordered by the first bucket of the runs
+        :param buckets: the sorted buckets of the habit's completed periods
+        :param gap: the largest number of buckets between two completed periods of a run
+        """
+        # the completed buckets, the caller keeps them up to date
+        self.buckets = list(buckets)
+        self.starts = []
+        self.ends = []
+        self.lengths = []
+        for bucket in self.buckets:
+            if self.ends and bucket - self.ends[-1] <= gap:
+                self.ends[-1] = bucket
+                self.lengths[-1] += 1
+            else:
+                self.starts.append(bucket)
+                self.ends.append(bucket)
+                self.lengths.append(1)
+        # the run lengths in ascending order, the last one is the longest streak
+        self.sorted_lengths = sorted(self.lengths)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def run(self, i):
+        """
+        Return a run by its position
+        :param i: the index of the run
+        :return: Run
+        """
+        return Run(self.starts[i], self.ends[i], self.lengths[i])
+
+    def before(self, bucket):
+        """
+        Return the last run that starts before a bucket
+        :param bucket: a bucket
+        :return: Run or None
+        """
+        i = bisect_left(self.starts, bucket) - 1
+        return None if i < 0 else self.run(i)
+
+    def after(self, bucket):
+        """
+        Return the first run that starts after a bucket
+        :param bucket: a bucket
+        :return: Run or None
+        """
+        i = bisect_right(self.starts, bucket)
+        return None if i == len(self.starts) else self.run(i)
+
+    def previous_bucket(self, bucket, first):
+        """
+        Return the latest completed bucket before a bucket, but not before `first`
+        :param bucket: a bucket
+        :param first: the earliest bucket that is returned
+        :return: a bucket or None
+        """
+        i = bisect_left(self.buckets, bucket)
+        return self.buckets[i - 1] if i > 0 and self.buckets[i - 1] >= first else None
+
+    def next_bucket(self, bucket, last):
+        """
+        Return the earliest completed bucket after a bucket, but not after `last`
+        :param bucket: a bucket
+        :param last: the latest bucket that is returned
+        :return: a bucket or None
+        """
+        i = bisect_right(self.buckets, bucket)
+        return self.buckets[i] if i < len(self.buckets) and self.buckets[i] <= last else None
+
+    def count_buckets(self, first, last):
+        """
+        Return the number of completed buckets within a range
+        :param first: the first bucket of the range
+        :param last: the last bucket of the range
+        :return: the number of buckets
+        """
+        return bisect_right(self.buckets, last) - bisect_left(self.buckets, first)
+
+    def replace(self, old, new):
+        """
+        Replace consecutive runs with new runs that cover the same position
+        :param old: the replaced runs in order, can be empty
+        :param new: the new runs in order, can be empty
+        :return: None
+        """
+        i = bisect_left(self.starts, (old or new)[0].start)
+        j = i + len(old)
+        for run in old:
+            del self.sorted_lengths[bisect_left(self.sorted_lengths, run.length)]
+        for run in new:
+            insort(self.sorted_lengths, run.length)
+        self.starts[i:j] = [run.start for run in new]
+        self.ends[i:j] = [run.end for run in new]
+        self.lengths[i:j] = [run.length for run in new]
+
+    def streaks(self):
+        """
+        Return the current streak count and the longest streak
+        :return: a pair of the streak count and the longest streak
+        """
+        if not self.lengths:
+            return 0, 0
+        return self.lengths[-1], self.sorted_lengths[-1]
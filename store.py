@@ -0,0 +1,278 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import groupby
+
+from constants import DEFAULT_USER
+from db import get_habit_days, CompletionStats
+from periods import Period, get_period, is_periodicity
+from runs import StreakRuns, add_bucket, remove_bucket
+
+
+def parse_days(dates):
+    """
+    Convert comma separated day ordinals to a sorted array
+    :param dates: the comma separated day ordinals or None
+    :return: an array('i') of day ordinals
+    """
+    if not dates:
+        return array("i")
+    days = array("i", map(int, dates.split(",")))
+    # the aggregated dates are not guaranteed to be ordered
+    if any(days[i] > days[i + 1] for i in range(len(days) - 1)):
+        days = array("i", sorted(days))
+    return days
+
+
+class HabitRecord:
+    __slots__ = ("title", "description", "periodicity", "creation_day", "days", "_runs")
+
+    def __init__(
+        self,
+        title: str,
+        description: str,
+        periodicity: Period,
+        creation_day: int,
+        days: array,
+    ):
+        """
+        A habit that is kept in memory by a HabitStore
+        :param title: a habit's title, interned
+        :param description: a habit's description
+        :param periodicity: the periods of the habit's periodicity
+        :param creation_day: the ordinal of the habit's creation date
+        :param days: the sorted ordinals of the habit's completed tasks
+        """
+        self.title = title
+        self.description = description
+        self.periodicity = periodicity
+        self.creation_day = creation_day
+        self.days = days
+        self._runs = None
+
+    def runs(self):
+        """
+        Return the habit's streak runs, they are built from the completed tasks when they are needed first and
+        updated incrementally afterwards
+        :return: StreakRuns
+        """
+        if self._runs is None:
+            self._runs = StreakRuns(self.completed_buckets(self.days), self.periodicity.gap)
+        return self._runs
+
+    def completed_buckets(self, days):
+        """
+        Return the buckets of the completed periods of some completed tasks
+        :param days: sorted day ordinals of completed tasks
+        :return: the buckets in ascending order
+        """
+        period = self.periodicity
+        return [
+            bucket
+            for bucket, tasks in groupby(days, period.bucket)
+            if sum(1 for _ in tasks) >= period.quota
+        ]
+
+    def bucket_completions(self, bucket):
+        """
+        Return the number of completed tasks in a period
+        :param bucket: the bucket of the period
+        :return: the number of completed tasks
+        """
+        period = self.periodicity
+        return bisect_right(self.days, period.last_day(bucket)) - bisect_left(
+            self.days, period.first_day(bucket)
+        )
+
+    def add_day(self, day):
+        """
+        Add a completed task on any day that was not completed yet
+        :param day: a day ordinal
+        :return: None
+        """
+        insort(self.days, day)
+        if self._runs is not None:
+            bucket = self.periodicity.bucket(day)
+            if self.bucket_completions(bucket) == self.periodicity.quota:
+                insort(self._runs.buckets, bucket)
+                add_bucket(self._runs, bucket, self.periodicity.gap)
+
+    def remove_day(self, day):
+        """
+        Remove a completed task
+        :param day: a completed day ordinal
+        :return: None
+        """
+        del self.days[bisect_left(self.days, day)]
+        if self._runs is not None:
+            bucket = self.periodicity.bucket(day)
+            if self.bucket_completions(bucket) == self.periodicity.quota - 1:
+                del self._runs.buckets[bisect_left(self._runs.buckets, bucket)]
+                remove_bucket(self._runs, bucket, self.periodicity.gap)
+
+    def streaks(self):
+        """
+        Return the current streak count and the longest streak of the habit
+        :return: a pair of the streak count and the longest streak
+        """
+        return self.runs().streaks()
+
+    def completion_stats(self, start, end):
+        """
+        Return the completion statistics of the habit within a date range, see `db.get_completion_stats`
+        :param start: the first date of the range
+        :param end: the last date of the range
+        :return: CompletionStats or None if the habit was created after the range
+        """
+        last_day = end.toordinal()
+        if self.creation_day > last_day:
+            return None
+        first_day = max(self.creation_day, start.toordinal())
+        days = self.days[
+            bisect_left(self.days, first_day) : bisect_right(self.days, last_day)
+        ]
+        period = self.periodicity
+        first_bucket = period.bucket(first_day)
+        expected = (period.bucket(last_day) - first_bucket) // period.gap + 1
+        completed = len(
+            {
+                (bucket - first_bucket) // period.gap
+                for bucket in self.completed_buckets(days)
+            }
+        )
+        if days:
+            longest_gap = max(
+                days[0] - first_day,
+                last_day - days[-1],
+                max((b - a - 1 for a, b in zip(days, days[1:])), default=0),
+            )
+        else:
+            longest_gap = last_day - first_day + 1
+        return CompletionStats(
+            self.title,
+            self.periodicity.name,
+            expected,
+            completed,
+            expected - completed,
+            completed / expected,
+            longest_gap,
+        )
+
+
+class HabitStore:
+    def __init__(self):
+        """A compact in-memory copy of all habits and their completed tasks for analytics without the database"""
+        self.habits = {}
+
+    @classmethod
+    def load(cls, db, user_id=DEFAULT_USER):
+        """
+        Load all habits of a user and their completed tasks from the database in a single query. Habits with an
+        unknown periodicity are skipped
+        :param db: a database connection
+        :param user_id: the user of the habits
+        :return: HabitStore
+        """
+        store = cls()
+        for title, description, periodicity, creation_time, dates in get_habit_days(
+            db, user_id
+        ):
+            if not is_periodicity(periodicity):
+                # a legacy habit with an unknown periodicity has no periods, like in the rollup table
+                continue
+            title = sys.intern(title)
+            store.habits[title] = HabitRecord(
+                title,
+                description,
+                get_period(periodicity),
+                creation_time.toordinal(),
+                parse_days(dates),
+            )
+        return store
+
+    def __len__(self):
+        return len(self.habits)
+
+    def __contains__(self, title):
+        return title in self.habits
+
+    def __getitem__(self, title):
+        return self.habits[title]
+
+    def add_completed_task(self, title, custom_date):
+        """
+        Add a completed task to the store, e.g. after it was added to the database
+        :param title: a habit's title
+        :param custom_date: a date of the completed task
+        :return: False if the task was already completed on this day, otherwise True
+        """
+        if self.is_completed(title, custom_date):
+            return False
+        self.habits[title].add_day(custom_date.toordinal())
+        return True
+
+    def remove_completed_task(self, title, custom_date):
+        """
+        Remove a completed task from the store, e.g. after it was deleted from the database
+        :param title: a habit's title
+        :param custom_date: a date of the completed task
+        :return: False if the task was not completed on this day, otherwise True
+        """
+        if not self.is_completed(title, custom_date):
+            return False
+        self.habits[title].remove_day(custom_date.toordinal())
+        return True
+
+    def is_completed(self, title, custom_date):
+        """
+        Check if a habit's task was completed on a given day
+        :param title: a habit's title
+        :param custom_date: a date
+        :return: True or False
+        """
+        days = self.habits[title].days
+        day = custom_date.toordinal()
+        i = bisect_left(days, day)
+        return i < len(days) and days[i] == day
+
+    def streaks(self, title):
+        """
+        Return the current streak count and the longest streak of a habit
+        :param title: a habit's title
+        :return: a pair of the streak count and the longest streak
+        """
+        return self.habits[title].streaks()
+
+    def completion_stats(self, start, end):
+        """
+        Return the completion statistics of all habits within a date range, ordered as `db.get_completion_stats`
+        :param start: the first date of the range
+        :param end: the last date of the range
+        :return: a list of CompletionStats
+        """
+        stats = []
+        for i, habit in enumerate(self.habits.values()):
+            habit_stats = habit.completion_stats(start, end)
+            if habit_stats is not None:
+                stats.append((habit_stats, i))
+        stats.sort(
+            key=lambda item: (
+                item[0].periodicity,
+                item[0].completion_rate,
+                -item[0].longest_gap,
+                item[1],
+            )
+        )
+        return [habit_stats for habit_stats, _ in stats]
+
+    def nbytes(self):
+        """
+        Return an estimate of the memory that is used by the habits, the interned titles are not counted
+        :return: the number of bytes
+        """
+        return sum(
+            sys.getsizeof(habit)
+            + sys.getsizeof(habit.description)
+            + sys.getsizeof(habit.days)
+            for habit in self.habits.values()
+        ) + sys.getsizeof(self.habits)
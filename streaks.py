@@ -0,0 +1,141 @@
+from itertools import groupby
+
+import numpy as np
+
+from db import count_rollup_buckets, get_completion_buckets, set_streak_runs, set_streaks, transaction
+
+# The number of habits whose buckets are fetched from the database at once
+FETCH_HABITS = 1000
+
+
+def compute_runs(habit_index, buckets, gaps):
+    """
+    Split the completed periods of every habit into streak runs. A run continues while the next completed period is
+    at most the habit's gap after the previous one
+    :param habit_index: the habit of every completed period as an integer array, sorted
+    :param buckets: the buckets of completed periods as an integer array, sorted within every habit, see `periods.py`
+    :param gaps: the gap of every habit's periodicity as an integer array
+    :return: integer arrays with the habit, the first bucket, the last bucket and the length of every run, ordered by
+     habit and first bucket
+    """
+    if len(buckets) == 0:
+        return (np.zeros(0, dtype=np.int64),) * 4
+
+    new_run = np.ones(len(buckets), dtype=bool)
+    new_run[1:] = habit_index[1:] != habit_index[:-1]
+    new_run[1:] |= np.diff(buckets) > gaps[habit_index[1:]]
+
+    first = np.flatnonzero(new_run)
+    last = np.append(first[1:], len(buckets)) - 1
+    return habit_index[first], buckets[first], buckets[last], last - first + 1
+
+
+def compute_streaks(habit_index, buckets, gaps):
+    """
+    Calculate the current and the longest streak of every habit from its completed periods, see `compute_runs`
+    :param habit_index: the habit of every completed period as an integer array, sorted
+    :param buckets: the buckets of completed periods as an integer array, sorted within every habit, see `periods.py`
+    :param gaps: the gap of every habit's periodicity as an integer array
+    :return: arrays with the current streak counts and the longest streaks of the habits
+    """
+    run_habits, _, _, run_lengths = compute_runs(habit_index, buckets, gaps)
+    return streaks_of_runs(run_habits, run_lengths, len(gaps))
+
+
+def streaks_of_runs(run_habits, run_lengths, habits):
+    """
+    Calculate the current and the longest streak of every habit from its streak runs
+    :param run_habits: the habit of every run as an integer array, sorted
+    :param run_lengths: the length of every run as an integer array, the runs of a habit ordered by their start
+    :param habits: the number of habits
+    :return: arrays with the current streak counts and the longest streaks of the habits
+    """
+    streak_counts = np.zeros(habits, dtype=np.int64)
+    longest_streaks = np.zeros(habits, dtype=np.int64)
+    if len(run_habits) == 0:
+        return streak_counts, longest_streaks
+
+    new_habit = np.ones(len(run_habits), dtype=bool)
+    new_habit[1:] = run_habits[1:] != run_habits[:-1]
+    first_runs = np.flatnonzero(new_habit)
+    last_runs = np.append(first_runs[1:], len(run_lengths)) - 1
+
+    streak_counts[run_habits[first_runs]] = run_lengths[last_runs]
+    longest_streaks[run_habits[first_runs]] = np.maximum.reduceat(run_lengths, first_runs)
+    return streak_counts, longest_streaks
+
+
+def load_completions(db, user_id=None, titles=None):
+    """
+    Load the completed periods of habits as arrays. The habits are fetched in batches and their buckets are written
+    into one preallocated array
+    :param db: a database connection
+    :param user_id: the user of the habits or None for the habits of all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: users and titles of habits, the gaps of their periodicities, and the habit index and the bucket of every
+     completed period
+    """
+    habits = []
+    gaps = []
+    counts = []
+    position = 0
+    # the size of the rollup table and the buckets are read in one transaction, so that they agree
+    with transaction(db):
+        buckets = np.empty(count_rollup_buckets(db, user_id, titles), dtype=np.int64)
+        cur = get_completion_buckets(db, user_id, titles)
+        while rows := cur.fetchmany(FETCH_HABITS):
+            for user, title, gap, habit_buckets in rows:
+                habits.append((user, title))
+                gaps.append(gap)
+                count = 0
+                if habit_buckets:
+                    values = np.array(habit_buckets.split(","), dtype=np.int64)
+                    count = len(values)
+                    buckets[position : position + count] = values
+                    position += count
+                counts.append(count)
+
+    buckets = buckets[:position]
+    habit_index = np.repeat(np.arange(len(habits), dtype=np.int64), counts)
+    # SQLite does not promise the order of GROUP_CONCAT, the buckets are only sorted if a habit's are not in order
+    if np.any((buckets[1:] <= buckets[:-1]) & (habit_index[1:] == habit_index[:-1])):
+        order = np.lexsort((buckets, habit_index))
+        buckets = buckets[order]
+    return habits, np.array(gaps, dtype=np.int64), habit_index, buckets
+
+
+def recompute_streaks(db, user_id=None, titles=None):
+    """
+    Recalculate the streak counts and the longest streaks of habits from their completed periods in the rollup table
+    and store them, together with their streak runs
+    :param db: a database connection
+    :param user_id: the user of the habits or None for the habits of all users
+    :param titles: the titles of the user's habits or None for all of them
+    :return: the number of updated habits
+    """
+    with transaction(db):
+        habits, gaps, habit_index, buckets = load_completions(db, user_id, titles)
+        run_habits, starts, ends, lengths = compute_runs(habit_index, buckets, gaps)
+        # free the completed periods before the runs are stored
+        del habit_index, buckets
+        streak_counts, longest_streaks = streaks_of_runs(run_habits, lengths, len(habits))
+        streaks = zip(streak_counts.tolist(), longest_streaks.tolist(), habits)
+        # the habits are ordered by user, the streaks of every user are set at once
+        for user, user_streaks in groupby(streaks, key=lambda streak: streak[2][0]):
+            set_streaks(
+                db,
+                ((count, longest, title) for count, longest, (_, title) in user_streaks),
+                user,
+            )
+        set_streak_runs(
+            db,
+            (
+                (*habits[habit], start, end, length)
+                for habit, start, end, length in zip(
+                    run_habits.tolist(), starts.tolist(), ends.tolist(), lengths.tolist()
+                )
+            ),
+            user_id,
+            titles,
+        )
+    return len(habits)
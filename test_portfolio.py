@@ -1,5 +1,7 @@
-from datetime import date
-from Habit import DatabaseHabit
+import pytest
+from datetime import date, timedelta
+from Habit import DatabaseHabit, bulk_complete
+from results import CompletionResult, HabitChange
 from analytics import (
     get_habits,
     get_period_habits,
@@ -7,7 +9,26 @@ from analytics import (
     get_streaks_for_habits,
     get_weakest_habits,
 )
-from db import get_db
+from render import (
+    show,
+    show_result,
+    render_all_habits,
+    render_habits_page,
+    render_period_habits,
+    render_streak,
+    render_streaks,
+    render_weakest_habits,
+    render_completion_rates,
+)
+from db import (
+    get_db,
+    get_habit,
+    get_completed_tasks,
+    add_habit,
+    transaction,
+    SCHEMA_VERSION,
+    set_habit_cache,
+)
 
 
 class TestHabit:
@@ -54,35 +75,35 @@ class TestHabit:
         habit = DatabaseHabit(
             "test_title5", "test_description5", "weekly", date(2023, 8, 5)
         )
-        habit.store(self.db)
+        habit.store(self.db, sink=show_result)
         captured = capsys.readouterr()
         assert (
             captured.out
             == "The habit with the title `test_title5` was successfully added.\n"
         )
 
-        habit.complete_task(self.db, date(2023, 8, 12))
+        habit.complete_task(self.db, date(2023, 8, 12), sink=show_result)
         captured = capsys.readouterr()
         assert (
             captured.out
             == "The successful streak count was updated.\nYou have a new record! Your longest streak for the habit `test_title5` is 1.\n"
         )
 
-        habit.complete_task(self.db, date(2023, 8, 19))
+        habit.complete_task(self.db, date(2023, 8, 19), sink=show_result)
         captured = capsys.readouterr()
         assert (
             captured.out
             == "The successful streak count was updated.\nYou have a new record! Your longest streak for the habit `test_title5` is 2.\n"
         )
 
-        habit.complete_task(self.db, date(2023, 8, 27))
+        habit.complete_task(self.db, date(2023, 8, 27), sink=show_result)
         captured = capsys.readouterr()
         assert (
             captured.out
             == "You broke your habit! You skipped more than 7 day(s)\nThe successful streak count was updated.\n"
         )
 
-        habit.delete(self.db)
+        habit.delete(self.db, sink=show_result)
         captured = capsys.readouterr()
         assert (
             captured.out
@@ -90,38 +111,918 @@ class TestHabit:
         )
 
     def test_analytics(self, capsys):
-        get_habits(self.db)
+        show(render_all_habits(get_habits(self.db)))
         captured = capsys.readouterr()
         assert (
             captured.out
             == "Your current habits are: \n1. test_title1: test_description1 \n2. test_title2: test_description2 \n3. test_title3: test_description3 \n4. test_title4: test_description4 \n"
         )
 
-        get_period_habits(self.db, "daily")
+        show(render_period_habits("daily", get_period_habits(self.db, "daily")))
         captured = capsys.readouterr()
         assert (
             captured.out
             == "The habits of the period `daily` are: \n1. test_title1 \n2. test_title3 \n"
         )
 
-        get_streak_for_habit(self.db, "test_title4")
+        show(render_streak("test_title4", get_streak_for_habit(self.db, "test_title4")))
         captured = capsys.readouterr()
         assert captured.out == "Your longest streak of the habit `test_title4` is: 4\n"
 
-        get_streaks_for_habits(self.db)
+        show(render_streaks(get_streaks_for_habits(self.db)))
         captured = capsys.readouterr()
         assert (
             captured.out
             == "The longest streaks of all habits are: \ndaily\n1. test_title3 - 3 \n2. test_title1 - 2 \nweekly\n1. test_title4 - 4 \n2. test_title2 - 2 \n"
         )
 
-        get_weakest_habits(self.db)
+        show(render_weakest_habits(get_weakest_habits(self.db)))
         captured = capsys.readouterr()
         assert (
             captured.out
             == "Lately you struggled the most with these habits: \ndaily\ntest_title1: the current streak count is 2 \nweekly\ntest_title2: the current streak count is 1 \n"
         )
 
+    def test_habits_page(self, capsys):
+        from analytics import get_habits_page
+        from db import iter_habits
+
+        assert list(iter_habits(self.db, batch_size=3)) == [
+            (f"test_title{i}", f"test_description{i}") for i in range(1, 5)
+        ]
+        habits, after_title = get_habits_page(self.db, page_size=3)
+        assert after_title == "test_title3"
+        show(render_habits_page(habits))
+        habits, after_title = get_habits_page(self.db, after_title, page_size=3)
+        assert after_title is None
+        show(render_habits_page(habits, start=4))
+        captured = capsys.readouterr()
+        assert captured.out == (
+            "1. test_title1: test_description1 \n2. test_title2: test_description2 \n"
+            "3. test_title3: test_description3 \n4. test_title4: test_description4 \n"
+        )
+
+    def test_analytics_empty_period(self, capsys):
+        db = get_db(":memory:")
+        DatabaseHabit("daily", "", "daily", date(2023, 8, 1)).store(db)
+        DatabaseHabit("daily2", "", "daily", date(2023, 8, 1)).store(db)
+        DatabaseHabit("daily2").complete_task(db, date(2023, 8, 2))
+        capsys.readouterr()
+
+        show(render_weakest_habits(get_weakest_habits(db)))
+        show(render_streaks(get_streaks_for_habits(db, limit=1)))
+        captured = capsys.readouterr()
+        assert captured.out == (
+            "Lately you struggled the most with these habits: \ndaily\ndaily: the current streak count is 0 \n"
+            "weekly\nNone\nThe longest streaks of all habits are: \ndaily\n1. daily2 - 1 \nweekly\n"
+        )
+
+    def test_completion_rates(self, capsys):
+        from analytics import get_completion_rates
+
+        weakest = get_weakest_habits(self.db, date(2023, 8, 1), date(2023, 8, 10))
+        rates = get_completion_rates(self.db, date(2023, 8, 1), date(2023, 8, 10))
+        show(render_weakest_habits(weakest))
+        show(render_completion_rates(date(2023, 8, 1), date(2023, 8, 10), rates))
+        captured = capsys.readouterr()
+        assert captured.out == (
+            "Lately you struggled the most with these habits: \n"
+            "daily\ntest_title1: 4 of 10 periods completed (40%), 6 missed, the longest gap is 4 day(s) \n"
+            "weekly\ntest_title4: 0 of 1 periods completed (0%), 1 missed, the longest gap is 7 day(s) \n"
+            "Your completion rates from 2023-08-01 to 2023-08-10 are: \n"
+            "daily\n1. test_title1: 4 of 10 periods completed (40%), 6 missed, the longest gap is 4 day(s) \n"
+            "2. test_title3: 4 of 8 periods completed (50%), 4 missed, the longest gap is 2 day(s) \n"
+            "weekly\n1. test_title4: 0 of 1 periods completed (0%), 1 missed, the longest gap is 7 day(s) \n"
+            "2. test_title2: 1 of 2 periods completed (50%), 1 missed, the longest gap is 7 day(s) \n"
+        )
+
+    def test_bulk_complete(self):
+        dates = [
+            date(2023, 8, 20),
+            date(2023, 8, 12),
+            date(2023, 8, 13),
+            date(2023, 8, 13),
+            date(2023, 8, 15),
+            date(2023, 8, 16),
+        ]
+        single_db = get_db(":memory:")
+        bulk_db = get_db(":memory:")
+        for db in (single_db, bulk_db):
+            DatabaseHabit("daily", "", "daily", date(2023, 8, 10)).store(db)
+            DatabaseHabit("weekly", "", "weekly", date(2023, 8, 10)).store(db)
+            DatabaseHabit("daily", "", "daily").complete_task(db, date(2023, 8, 11))
+
+        for custom_date in sorted(dates):
+            DatabaseHabit("daily").complete_task(single_db, custom_date)
+            DatabaseHabit("weekly").complete_task(single_db, custom_date)
+        added = bulk_complete(
+            bulk_db, [(title, d) for d in dates for title in ("weekly", "daily")]
+        )
+
+        assert added == 10
+        for title in ("daily", "weekly"):
+            assert get_habit(bulk_db, title) == get_habit(single_db, title)
+            assert sorted(get_completed_tasks(bulk_db, title)) == sorted(
+                get_completed_tasks(single_db, title)
+            )
+
+    def test_bulk_complete_unknown_habit(self):
+        added = bulk_complete(
+            self.db, [("ghost", date(2023, 8, 9)), ("ghost", date(2023, 8, 10)), ("test_title1", date(2023, 8, 11))]
+        )
+        assert added == 1
+        assert get_completed_tasks(self.db, "ghost") == []
+
+        DatabaseHabit("ghost", "", "daily", date(2023, 8, 9)).store(self.db)
+        result = DatabaseHabit("ghost").complete_task(self.db, date(2023, 8, 10))
+        assert not result.broke_streak
+        assert get_habit(self.db, "ghost")[3] == 1
+
+    def test_unknown_habit(self):
+        with pytest.raises(LookupError):
+            DatabaseHabit("ghost").complete_task(self.db, date(2023, 8, 10))
+        with pytest.raises(LookupError):
+            DatabaseHabit("ghost").delete_task(self.db, date(2023, 8, 10))
+        assert not self.db.in_transaction
+        assert get_completed_tasks(self.db, "ghost") == []
+
+    def test_transaction(self):
+        db = get_db(":memory:")
+        with pytest.raises(ValueError):
+            with transaction(db):
+                add_habit(db, "rolled_back")
+                raise ValueError
+        assert get_habit(db, "rolled_back") is None
+
+        with transaction(db):
+            add_habit(db, "outer")
+            with pytest.raises(ValueError):
+                with transaction(db):
+                    add_habit(db, "inner")
+                    raise ValueError
+            assert db.in_transaction
+        assert get_habit(db, "outer") is not None
+        assert get_habit(db, "inner") is None
+
+    def test_duplicate_completed_task(self, capsys):
+        DatabaseHabit("test_title1").complete_task(self.db, date(2023, 8, 3), sink=show_result)
+        captured = capsys.readouterr()
+        assert captured.out == "You have already completed this task on this day.\n"
+        assert len(get_completed_tasks(self.db, "test_title1")) == 4
+        assert get_habit(self.db, "test_title1")[3] == 2
+
+    def test_results_without_sink(self, capsys):
+        result = DatabaseHabit("test_title1").complete_task(self.db, date(2023, 8, 7))
+        duplicate = DatabaseHabit("test_title1").complete_task(self.db, date(2023, 8, 7))
+        change = DatabaseHabit("test_title4").delete(self.db)
+        assert capsys.readouterr().out == ""
+        assert result == CompletionResult(
+            "test_title1", date(2023, 8, 7), 3, 3, False, True, False, "daily"
+        )
+        assert duplicate.duplicate
+        assert change == HabitChange("deleted", "test_title4")
+
+    def test_habit_store(self):
+        from db import get_completion_stats
+        from periods import get_period
+        from store import HabitStore
+
+        store = HabitStore.load(self.db)
+        assert len(store) == 4
+        assert store["test_title2"].periodicity is get_period("weekly")
+        for i in range(1, 5):
+            habit = get_habit(self.db, f"test_title{i}")
+            assert store.streaks(habit[0]) == (habit[3], habit[4])
+        for start, end in [
+            (date(2023, 8, 1), date(2023, 8, 10)),
+            (date(2023, 8, 5), date(2023, 9, 30)),
+        ]:
+            assert store.completion_stats(start, end) == get_completion_stats(
+                self.db, start, end
+            )
+
+        assert store.is_completed("test_title1", date(2023, 8, 3))
+        assert not store.add_completed_task("test_title1", date(2023, 8, 3))
+        assert store.add_completed_task("test_title1", date(2023, 8, 4))
+        assert list(store["test_title1"].days) == [
+            date(2023, 8, day).toordinal() for day in range(2, 7)
+        ]
+        assert store.streaks("test_title1") == (5, 5)
+
+        # a habit with a legacy periodicity is left out like in the analytics of the database
+        self.db.execute(
+            """INSERT INTO habit (title, description, periodicity, streak_count, longest_streak, creation_time)
+            VALUES ('legacy', '', 'fortnightly', 0, 0, 738733)"""
+        )
+        self.db.execute("INSERT INTO completed_task (date, habit_title) VALUES (738734, 'legacy')")
+        self.db.commit()
+        store = HabitStore.load(self.db)
+        assert "legacy" not in store and len(store) == 4
+        assert store.completion_stats(date(2023, 8, 1), date(2023, 8, 10)) == get_completion_stats(
+            self.db, date(2023, 8, 1), date(2023, 8, 10)
+        )
+
+    def test_completion_rollup(self):
+        from analytics import get_completions_per_period, get_missed_periods
+        from db import rebuild_rollup
+
+        assert get_missed_periods(
+            self.db, "test_title2", date(2023, 8, 1), date(2023, 9, 10)
+        ) == [date(2023, 7, 31), date(2023, 8, 28)]
+        assert get_missed_periods(
+            self.db, "test_title1", date(2023, 7, 1), date(2023, 8, 7)
+        ) == [date(2023, 8, 1), date(2023, 8, 4), date(2023, 8, 7)]
+        assert (
+            get_missed_periods(self.db, "test_title5", date(2023, 8, 1), date(2023, 8, 7))
+            is None
+        )
+        assert list(
+            get_completions_per_period(
+                self.db, "daily", date(2023, 8, 1), date(2023, 8, 8)
+            ).values()
+        ) == [0, 1, 1, 1, 1, 2, 1, 1]
+        assert get_completions_per_period(
+            self.db, "weekly", date(2023, 8, 1), date(2023, 8, 27)
+        ) == {
+            date(2023, 7, 31): 0,
+            date(2023, 8, 7): 2,
+            date(2023, 8, 14): 2,
+            date(2023, 8, 21): 2,
+        }
+
+        DatabaseHabit("test_title1").complete_task(self.db, date(2023, 8, 4))
+        DatabaseHabit("test_title4").delete(self.db)
+        bulk_complete(self.db, [("test_title2", date(2023, 8, 29))])
+        rollup = self.db.execute("SELECT * FROM completion_rollup").fetchall()
+        assert (0, "test_title1", date(2023, 8, 5).toordinal() - 1, 1) in rollup
+        assert all(row[1] != "test_title4" for row in rollup)
+        assert rebuild_rollup(self.db) == len(rollup)
+        assert self.db.execute("SELECT * FROM completion_rollup").fetchall() == rollup
+
+    def test_transfer(self, tmp_path):
+        import importlib.util
+        import transfer
+
+        formats = [f for f in transfer.FORMATS if f != "parquet"]
+        if importlib.util.find_spec("pyarrow") is not None:
+            formats.append("parquet")
+        for file_format in formats:
+            directory = str(tmp_path / file_format)
+            assert transfer.export_directory(self.db, directory, file_format) == [
+                ("habit", 4, 0),
+                ("completed_task", 16, 0),
+            ]
+            db = get_db(":memory:")
+            assert transfer.import_directory(db, directory, file_format) == [
+                ("habit", 4, 0),
+                ("completed_task", 16, 0),
+            ]
+            for query in (
+                "SELECT * FROM habit ORDER BY rowid",
+                "SELECT * FROM completed_task",
+                "SELECT * FROM completion_rollup",
+            ):
+                assert db.execute(query).fetchall() == self.db.execute(query).fetchall()
+
+        habits = [
+            ("test_title1", "", "daily", "2023-08-01"),
+            ("new", "", "daily", "2023-08-01"),
+            ("new", "", "daily", "2023-08-01"),
+            ("hourly", "", "hourly", "2023-08-01"),
+            ("future", "", "daily", "2023-09-11"),
+            ("invalid", "", "daily", "2023-02-30"),
+        ]
+        assert transfer.import_habits(self.db, habits, date(2023, 9, 10)) == (
+            "habit",
+            1,
+            5,
+        )
+        completions = [
+            ("new", "2023-08-02"),
+            ("new", "2023-08-03"),
+            ("new", "2023-08-03"),
+            ("new", "2023-07-31"),
+            ("new", "2023-09-11"),
+            ("missing", "2023-08-02"),
+            ("test_title1", "2023-08-02"),
+        ]
+        assert transfer.import_completed_tasks(
+            self.db, completions, date(2023, 9, 10)
+        ) == ("completed_task", 2, 5)
+        assert get_habit(self.db, "new")[3:5] == (2, 2)
+
+        # the import into an empty database is a bulk import, which only rebuilds the imported habits
+        db = get_db(":memory:")
+        transfer.import_habits(db, habits[:2], date(2023, 9, 10))
+        db.execute("UPDATE habit SET streak_count=9 WHERE title='test_title1'")
+        db.execute("INSERT INTO completion_rollup VALUES (0, 'test_title1', 738732, 1)")
+        db.commit()
+        assert transfer.import_completed_tasks(db, completions[:6], date(2023, 9, 10)) == (
+            "completed_task",
+            2,
+            4,
+        )
+        assert get_habit(db, "new")[3:5] == (2, 2)
+        assert get_habit(db, "test_title1")[3] == 9
+        assert db.execute("SELECT * FROM completion_rollup WHERE habit_title='test_title1'").fetchall() == [
+            (0, "test_title1", 738732, 1)
+        ]
+
+    def test_scriptable_cli(self, tmp_path, capsys):
+        import json
+        import subprocess
+        import sys
+        import habits
+
+        path = str(tmp_path / "cli.db")
+        assert habits.main(["--database", path, "add", "read", "--date", "2023-08-01"]) == 0
+        assert habits.main(["--database", path, "add", "read"]) == 1
+        assert habits.main(["--database", path, "done", "read", "--date", "2023-07-31"]) == 1
+        assert habits.main(["--database", path, "done", "missing"]) == 1
+        capsys.readouterr()
+        assert habits.main(["--database", path, "--json", "done", "read", "--date", "2023-08-01"]) == 0
+        assert json.loads(capsys.readouterr().out)["date"] == "2023-08-01"
+        assert habits.main(["--database", path, "--json", "stats"]) == 0
+        assert json.loads(capsys.readouterr().out)["longest_streaks"] == {
+            "daily": [{"title": "read", "streak": 1}],
+            "weekly": [],
+        }
+
+        # a command must not import the interactive interface or numpy
+        code = (
+            "import sys, habits; habits.main(sys.argv[1:]); "
+            "print(sorted({'questionary', 'numpy', 'concurrent.futures'} & set(sys.modules)))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code, "--database", path, "done", "read"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        assert output.splitlines()[-1] == "[]"
+
+    def test_startup_budget(self):
+        from benchmarks.startup import BUDGET_MS, first_query_ms, measure
+
+        interpreter, medians = measure(runs=11, labels=["list"])
+        assert first_query_ms(interpreter, medians) <= BUDGET_MS
+
+    def test_daemon(self, tmp_path):
+        import asyncio
+        import os
+        import stat
+        import daemon
+        from client import HabitClient, RequestError
+
+        address = str(tmp_path / "daemon.sock")
+        database = str(tmp_path / "daemon.db")
+
+        def check_off(day):
+            with HabitClient(address) as client:
+                return client.request(
+                    "complete_task", title="read", custom_date=date(2023, 8, day)
+                )
+
+        async def run():
+            started, stop = asyncio.Event(), asyncio.Event()
+            server = asyncio.create_task(
+                daemon.serve(address, database, "fast", started, stop, user_id=7)
+            )
+            await started.wait()
+            try:
+                assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+                with HabitClient(address) as client:
+                    assert await asyncio.to_thread(
+                        client.request, "add", title="read", creation_time="2023-08-01"
+                    ) == {"action": "added", "title": "read", "count": 1}
+                    with pytest.raises(RequestError, match="already exists"):
+                        await asyncio.to_thread(client.request, "add", title="read")
+                    with pytest.raises(RequestError, match="no operation"):
+                        await asyncio.to_thread(client.request, "drop")
+                    with pytest.raises(RequestError, match="Invalid parameters"):
+                        await asyncio.to_thread(client.request, "get_habits", limit=1)
+                    with pytest.raises(RequestError, match="cannot choose the user"):
+                        await asyncio.to_thread(client.request, "list", user_id=0)
+
+                    # concurrent check-offs of many clients are committed together
+                    results = await asyncio.gather(
+                        *(asyncio.to_thread(check_off, day) for day in range(1, 6))
+                    )
+                    assert sorted(result["date"] for result in results) == [
+                        f"2023-08-0{day}" for day in range(1, 6)
+                    ]
+                    # the check-offs arrive in any order, the streak counts all of them
+                    assert await asyncio.to_thread(
+                        client.request, "get_streak_for_habit", title="read"
+                    ) == 5
+                    assert await asyncio.to_thread(
+                        client.request, "delete_task", title="read", custom_date="2023-08-03"
+                    ) == {"action": "task_deleted", "title": "read", "count": 1}
+                    with pytest.raises(RequestError, match="was not completed"):
+                        await asyncio.to_thread(
+                            client.request, "delete_task", title="read", custom_date="2023-08-03"
+                        )
+                    assert await asyncio.to_thread(
+                        client.request,
+                        "get_completions_per_period",
+                        period="daily",
+                        start="2023-08-01",
+                        end="2023-08-06",
+                    ) == {f"2023-08-0{day}": int(day not in (3, 6)) for day in range(1, 7)}
+            finally:
+                stop.set()
+                await server
+
+        asyncio.run(run())
+        assert not (tmp_path / "daemon.sock").exists()
+        db = get_db(database)
+        assert get_habit(db, "read", 7) is not None and get_habit(db, "read") is None
+        db.close()
+        with pytest.raises(RequestError, match="loopback"):
+            HabitClient("0.0.0.0:8765")
+
+    def test_profiling(self):
+        from db import Connection, get_latest_date
+        from profiling import ProfiledConnection, profiled
+
+        with profiled(slow_query_ms=0) as profiler:
+            db = get_db(":memory:")
+            DatabaseHabit("read", "", "daily", date(2023, 8, 1)).store(db)
+            DatabaseHabit("read").complete_task(db, date(2023, 8, 2))
+            assert get_latest_date(db, "read") == (date(2023, 8, 2),)
+            assert len(db.execute("SELECT * FROM completed_task WHERE date > ?", (0,)).fetchall()) == 1
+        assert isinstance(db, ProfiledConnection)
+        assert type(get_db(":memory:")) is Connection
+
+        latest = "SELECT MAX (date) FROM completed_task WHERE user_id=? AND habit_title=?"
+        stats = profiler.statements[latest]
+        assert (stats.calls, stats.rows) == (1, 1)
+        assert profiler.functions["db.get_latest_date"].calls == 1
+        assert profiler.traced[latest] == 1
+        # the insert runs the trigger of the completion rollup
+        insert = "INSERT INTO completed_task (user_id, date, habit_title) VALUES (?, ?, ?)"
+        assert profiler.traced[insert] > profiler.statements[insert].calls == 1
+        assert profiler.plans[latest] == [
+            "SEARCH completed_task USING PRIMARY KEY (user_id=? AND habit_title=?)"
+        ]
+        assert profiler.full_scans()["SELECT * FROM completed_task WHERE date > ?"] == [
+            "SCAN completed_task"
+        ]
+        metrics = profiler.prometheus()
+        assert 'habits_function_calls_total{function="db.get_latest_date"} 1\n' in metrics
+        assert "# TYPE habits_sql_full_scans gauge\n" in metrics
+        assert latest in profiler.report()
+
+    def test_batch_report(self, tmp_path, capsys):
+        import csv
+        import sqlite3
+        import report
+
+        for name, users in (("a.db", (0,)), ("b.db", (0, 5))):
+            db = get_db(str(tmp_path / name))
+            for user_id in users:
+                DatabaseHabit("read", "", "daily", date(2023, 8, 1), user_id).store(db)
+                DatabaseHabit("read", user_id=user_id).complete_task(db, date(2023, 8, 2))
+            db.close()
+        (tmp_path / "broken.db").write_text("not a database")
+        sqlite3.connect(tmp_path / "old.db").execute("CREATE TABLE habit (title TEXT)").connection.close()
+
+        output = str(tmp_path / "report.csv")
+        assert report.main([str(tmp_path), "--format", "csv", "--output", output, "--workers", "2"]) == 1
+        assert "8 rows of 4 database files" in capsys.readouterr().out
+        with open(output, newline="") as file:
+            rows = list(csv.DictReader(file))
+        assert [(row["database"][-5:], row["user_id"], row["periodicity"]) for row in rows[:6]] == [
+            ("/a.db", "0", "daily"),
+            ("/a.db", "0", "weekly"),
+            ("/b.db", "0", "daily"),
+            ("/b.db", "0", "weekly"),
+            ("/b.db", "5", "daily"),
+            ("/b.db", "5", "weekly"),
+        ]
+        assert (rows[0]["habits"], rows[0]["best_habit"], rows[0]["longest_streak"]) == ("1", "read", "1")
+        assert (rows[1]["habits"], rows[1]["best_habit"], rows[1]["error"]) == ("0", "", "")
+        assert rows[6]["error"] == "file is not a database"
+        assert "schema version 0" in rows[7]["error"]
+        # the files are only read, the old one is not upgraded
+        assert sqlite3.connect(tmp_path / "old.db").execute("PRAGMA user_version").fetchone() == (0,)
+        assert report.find_databases([str(tmp_path / "[ab].db"), str(tmp_path / "a.db")]) == [
+            str(tmp_path / "a.db"),
+            str(tmp_path / "b.db"),
+        ]
+        assert [row[1] for row in report.iter_reports([str(tmp_path / "b.db")], workers=1)] == [0, 0, 5, 5]
+
+    def test_schema_migration(self, tmp_path):
+        import sqlite3
+
+        path = str(tmp_path / "old.db")
+        old_db = sqlite3.connect(path)
+        old_db.execute(
+            "CREATE TABLE habit (title TEXT PRIMARY KEY, description TEXT, periodicity TEXT, "
+            "streak_count INT, longest_streak INT, creation_time TEXT)"
+        )
+        old_db.execute("CREATE TABLE completed_task (date TEXT, habit_title TEXT)")
+        old_db.execute(
+            "INSERT INTO habit VALUES ('old', '', 'daily', 1, 1, '2023-08-01')"
+        )
+        old_db.executemany(
+            "INSERT INTO completed_task VALUES (?, 'old')",
+            [("2023-08-02",), ("2023-08-02",)],
+        )
+        old_db.commit()
+        old_db.close()
+
+        db = get_db(path)
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert get_completed_tasks(db, "old") == [(date(2023, 8, 2), "old")]
+        assert get_habit(db, "old")[5] == date(2023, 8, 1)
+        plan = db.execute(
+            "EXPLAIN QUERY PLAN SELECT MAX(date) FROM completed_task WHERE user_id=0 AND habit_title='old'"
+        ).fetchall()
+        assert "PRIMARY KEY" in plan[0][3]
+        db.close()
+
+    def test_user_partitioning(self):
+        from analytics import get_completion_rates, get_completions_per_period
+        from profiling import profiled
+        from streaks import recompute_streaks
+
+        with profiled(slow_query_ms=0) as profiler:
+            db = get_db(":memory:")
+            profiler.reset()
+            for user_id in (0, 1):
+                habit = DatabaseHabit("read", "", "daily", date(2023, 8, 1), user_id)
+                habit.store(db)
+            assert get_habit(db, "read", 1)[3] == 0
+            for day in (2, 3, 4):
+                DatabaseHabit("read", user_id=1).complete_task(db, date(2023, 8, day))
+            DatabaseHabit("read").complete_task(db, date(2023, 8, 2))
+
+            assert get_streak_for_habit(db, "read", 1) == 3
+            assert get_streak_for_habit(db, "read") == 1
+            assert get_completed_tasks(db, "read") == [(date(2023, 8, 2), "read")]
+            assert list(
+                get_completions_per_period(
+                    db, "daily", date(2023, 8, 2), date(2023, 8, 4), 1
+                ).values()
+            ) == [1, 1, 1]
+            rates = get_completion_rates(db, date(2023, 8, 1), date(2023, 8, 4), 1)
+            assert rates["daily"][0].completed == 3
+            assert list(get_habits(db, 2)) == []
+        # every statement of a user is a range scan over the user's rows
+        assert profiler.full_scans() == {}
+
+        assert recompute_streaks(db) == 2
+        assert get_streak_for_habit(db, "read", 1) == 3
+        DatabaseHabit("read", user_id=1).delete(db)
+        assert get_habit(db, "read", 1) is None
+        assert get_streak_for_habit(db, "read") == 1
+        assert db.execute("SELECT DISTINCT user_id FROM completion_rollup").fetchall() == [(0,)]
+        db.close()
+
+    def test_habit_state_statements(self):
+        from db import (
+            get_habit_state,
+            get_streak_count,
+            get_longest_streak,
+            get_periodicity,
+            get_creation_time,
+            get_latest_date,
+        )
+
+        def before(db, title):
+            return (
+                get_streak_count(db, title),
+                get_longest_streak(db, title),
+                get_periodicity(db, title),
+                get_creation_time(db, title),
+                get_latest_date(db, title),
+            )
+
+        def after(db, title):
+            return get_habit_state(db, title)
+
+        queries = {}
+        cache = set_habit_cache(None)
+        for name, fetch in (("before", before), ("after", after)):
+            statements = []
+            self.db.set_trace_callback(statements.append)
+            fetch(self.db, "test_title1")
+            self.db.set_trace_callback(None)
+            queries[name] = len(statements)
+
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        DatabaseHabit("test_title1").complete_task(self.db, date(2023, 8, 7))
+        self.db.set_trace_callback(None)
+        set_habit_cache(cache)
+
+        assert queries == {"before": 5, "after": 1}
+        assert sum(s.startswith("SELECT") for s in statements) == 1
+
+    def test_recompute_streaks(self):
+        from streaks import recompute_streaks
+
+        self.db.execute("UPDATE habit SET streak_count=0, longest_streak=0")
+        self.db.execute(
+            """INSERT INTO habit (title, description, periodicity, streak_count, longest_streak, creation_time)
+            VALUES ('test_title5', '', 'daily', 7, 7, '2023-08-01')"""
+        )
+        self.db.commit()
+
+        assert recompute_streaks(self.db) == 5
+        streaks = self.db.execute(
+            "SELECT title, streak_count, longest_streak FROM habit ORDER BY title"
+        ).fetchall()
+        assert streaks == [
+            ("test_title1", 2, 2),
+            ("test_title2", 1, 2),
+            ("test_title3", 3, 3),
+            ("test_title4", 4, 4),
+            ("test_title5", 0, 0),
+        ]
+
+    def test_connection_profiles(self, tmp_path):
+        path = str(tmp_path / "profile.db")
+        for profile, synchronous in (("durable", 2), ("fast", 1), ("bulk-load", 0)):
+            db = get_db(path, profile)
+            assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert db.execute("PRAGMA synchronous").fetchone()[0] == synchronous
+            db.close()
+        with pytest.raises(ValueError):
+            get_db(path, "unknown")
+
+    def test_pool_concurrent_check_offs(self, tmp_path):
+        import threading
+        from datetime import timedelta
+        from pool import ConnectionPool
+
+        errors = []
+        with ConnectionPool(str(tmp_path / "pool.db"), readers=3) as pool:
+            for i in range(8):
+                DatabaseHabit(f"habit{i}", "", "daily", date(2023, 1, 1)).store(pool)
+            DatabaseHabit("shared", "", "daily", date(2023, 1, 1)).store(pool)
+
+            def check_off(i):
+                try:
+                    for day in range(1, 41):
+                        custom_date = date(2023, 1, 1) + timedelta(days=day)
+                        DatabaseHabit(f"habit{i}").complete_task(pool, custom_date)
+                        DatabaseHabit("shared").complete_task(
+                            pool, custom_date + timedelta(days=100 * i)
+                        )
+                except Exception as error:
+                    errors.append(error)
+
+            def read():
+                try:
+                    for _ in range(20):
+                        get_streaks_for_habits(pool)
+                        get_weakest_habits(pool)
+                except Exception as error:
+                    errors.append(error)
+
+            threads = [threading.Thread(target=check_off, args=(i,)) for i in range(8)]
+            threads += [threading.Thread(target=read) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert errors == []
+            for i in range(8):
+                assert pool.read(get_habit, f"habit{i}")[3:5] == (40, 40)
+            assert len(pool.read(get_completed_tasks, "shared")) == 320
+
+    def test_aio(self, tmp_path):
+        import asyncio
+        import aio
+
+        async def scenario():
+            async with aio.AsyncHabitDB(str(tmp_path / "aio.db")) as adb:
+                habits = [
+                    DatabaseHabit(f"habit{i}", "", "daily", date(2023, 8, 1))
+                    for i in range(10)
+                ]
+                await asyncio.gather(*(aio.habits.store(adb, h) for h in habits))
+
+                statements = []
+                await adb.read(lambda db: db.set_trace_callback(statements.append))
+                await asyncio.gather(
+                    *(
+                        aio.habits.complete_task(adb, h, date(2023, 8, 2))
+                        for h in habits
+                    )
+                )
+                await adb.read(lambda db: db.set_trace_callback(None))
+                assert statements.count("COMMIT") == 1
+
+                streaks = await aio.analytics.get_streaks_for_habits(adb, limit=1)
+                weakest = await aio.analytics.get_weakest_habits(adb)
+                return streaks, weakest
+
+        streaks, weakest = asyncio.run(scenario())
+        assert streaks == {"daily": [("habit0", 1)], "weekly": []}
+        assert weakest == {"daily": ("habit0", 1), "weekly": None}
+
+    def test_habit_cache(self):
+        from cache import HabitCache
+        from db import delete_habit, get_periodicity, get_creation_time
+
+        previous = set_habit_cache(HabitCache(maxsize=2))
+        try:
+            statements = []
+            self.db.set_trace_callback(statements.append)
+            assert get_periodicity(self.db, "test_title2") == ("weekly",)
+            assert get_creation_time(self.db, "test_title2") == (date(2023, 8, 2),)
+            assert get_habit(self.db, "test_title5") is None
+            assert len([statement for statement in statements if statement.startswith("SELECT")]) == 2
+
+            add_habit(self.db, "test_title5")
+            assert get_habit(self.db, "test_title5")[0] == "test_title5"
+            delete_habit(self.db, "test_title5")
+            assert get_habit(self.db, "test_title5") is None
+
+            DatabaseHabit("test_title2").complete_task(self.db, date(2023, 9, 7))
+            assert get_habit(self.db, "test_title2")[3] == 2
+            get_habit(self.db, "test_title1")
+            self.db.set_trace_callback(None)
+
+            stats = set_habit_cache(previous).stats()
+            assert (stats.hits, stats.evictions, stats.size) == (1, 1, 2)
+        finally:
+            set_habit_cache(previous)
+
+        # the changes of another process are seen although they do not invalidate the cached rows
+        import sqlite3
+
+        assert get_habit(self.db, "test_title1")[3] == 2 and get_habit(self.db, "imported") is None
+        other = sqlite3.connect("test.db")
+        other.execute("UPDATE habit SET streak_count=9 WHERE title='test_title1'")
+        other.execute(
+            "INSERT INTO habit (title, periodicity, streak_count, longest_streak, creation_time) "
+            "VALUES ('imported', 'daily', 0, 0, 738733)"
+        )
+        other.commit()
+        other.close()
+        assert get_habit(self.db, "test_title1")[3] == 9 and get_habit(self.db, "imported") is not None
+
+        # a read batch checks the data version once, a plain connection can use the cache as well
+        from db import read_batch
+
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        with read_batch(self.db):
+            for _ in range(3):
+                get_habit(self.db, "test_title1")
+        self.db.set_trace_callback(None)
+        assert statements == ["PRAGMA data_version"]
+        plain = sqlite3.connect("test.db")
+        assert get_habit(plain, "test_title1")[3] == get_habit(plain, "test_title1")[3] == 9
+        plain.close()
+
+    def test_streak_runs(self):
+        import random
+        from collections import Counter
+        from db import DatabaseRuns, get_habit_state
+        from periods import get_period
+        from runs import Run, StreakRuns
+        from store import HabitStore
+
+        habit = DatabaseHabit("test_title1")
+        result = habit.complete_task(self.db, date(2023, 8, 4))
+        assert result.new_streak == result.longest_streak == 5
+        assert not result.broke_streak and result.new_record
+        assert habit.delete_task(self.db, date(2023, 8, 3)) == HabitChange(
+            "task_deleted", "test_title1", 1
+        )
+        assert get_habit(self.db, "test_title1")[3:5] == (3, 3)
+        assert habit.delete_task(self.db, date(2023, 8, 3)).count == 0
+        result = DatabaseHabit("test_title2").complete_task(self.db, date(2023, 8, 31))
+        assert (result.new_streak, result.longest_streak) == (3, 3)
+        # a check-off after the latest task extends the last run even if the stored streak count is off
+        self.db.execute("UPDATE habit SET streak_count=9 WHERE title='test_title2'")
+        assert get_habit_state(self.db, "test_title2").last_run == Run(
+            date(2023, 8, 25).toordinal() - 1, date(2023, 9, 6).toordinal() - 1, 3
+        )
+        result = DatabaseHabit("test_title2").complete_task(self.db, date(2023, 9, 7))
+        assert (result.new_streak, result.longest_streak) == (4, 4)
+
+        # random check-offs and deletions in any order give the streaks of the completed periods of the sorted days
+        generator = random.Random(0)
+        db = get_db(":memory:")
+        titles = ("daily", "weekly", "calendar weekly", "monthly", "weekdays", "every 3 days", "2 times per week")
+        for title in titles:
+            DatabaseHabit(title, "", title, date(2023, 1, 1)).store(db)
+        days = {title: set() for title in titles}
+        for _ in range(600):
+            title = generator.choice(titles)
+            custom_date = date(2023, 1, 1) + timedelta(days=generator.randrange(90))
+            if custom_date.toordinal() in days[title]:
+                DatabaseHabit(title).delete_task(db, custom_date)
+                days[title].remove(custom_date.toordinal())
+            else:
+                DatabaseHabit(title).complete_task(db, custom_date)
+                days[title].add(custom_date.toordinal())
+            period = get_period(title)
+            tasks = Counter(map(period.bucket, days[title]))
+            expected = StreakRuns(
+                sorted(bucket for bucket, count in tasks.items() if count >= period.quota), period.gap
+            )
+            assert get_habit(db, title)[3:5] == expected.streaks()
+            assert db.execute(
+                "SELECT start, end, length FROM streak_run WHERE habit_title=?", (title,)
+            ).fetchall() == [expected.run(i) for i in range(len(expected))]
+
+        store = HabitStore.load(db)
+        for title in days:
+            assert store.streaks(title) == DatabaseRuns(db, title).streaks()
+            for day in sorted(days[title])[::2]:
+                assert store.remove_completed_task(title, date.fromordinal(day))
+                DatabaseHabit(title).delete_task(db, date.fromordinal(day))
+                assert store.streaks(title) == get_habit(db, title)[3:5]
+        assert not store.remove_completed_task("daily", date(2022, 1, 1))
+        assert DatabaseRuns(db, "missing").streaks() == (0, 0)
+        assert StreakRuns([1, 2, 5]).before(3) == Run(1, 2, 2)
+        db.close()
+
+    def test_periodicities(self):
+        from analytics import get_completions_per_period, get_missed_periods
+        from db import get_completion_stats, get_periodicities
+        from operations import CommandError, add
+        from periods import PERIODICITIES, get_period, is_periodicity
+        from store import HabitStore
+
+        for periodicity in ("daily", "weekly", "calendar weekly", "monthly", "weekdays", "every 3 days", "2 times per week"):
+            period = get_period(periodicity)
+            for day in range(date(2023, 1, 1).toordinal(), date(2025, 1, 1).toordinal()):
+                bucket = period.bucket(day)
+                assert period.first_day(bucket) <= day <= period.last_day(bucket)
+                assert period.bucket(day + 1) - bucket in (0, 1)
+        assert get_period("weekdays").bucket(date(2023, 8, 6).toordinal()) == get_period("weekdays").bucket(
+            date(2023, 8, 4).toordinal()
+        )
+        assert not is_periodicity("every 0 days") and not is_periodicity("8 times per week")
+        with pytest.raises(CommandError, match="every N days"):
+            add(self.db, "hourly", periodicity="hourly")
+        assert len(PERIODICITIES) == 7
+        assert get_period("weekly").window()[1:] == get_period("calendar weekly")[1:]
+
+        db = get_db(":memory:")
+        completions = {
+            "monthly": [date(2023, 1, 31), date(2023, 2, 1), date(2023, 2, 28), date(2023, 3, 15)],
+            "weekdays": [date(2023, 8, 3), date(2023, 8, 5), date(2023, 8, 7), date(2023, 8, 8)],
+            "every 3 days": [date(2023, 8, 1), date(2023, 8, 4), date(2023, 8, 7)],
+            "2 times per week": [date(2023, 8, 9), date(2023, 8, 13), date(2023, 8, 16)],
+            "calendar weekly": [date(2023, 8, 1), date(2023, 8, 7), date(2023, 8, 14)],
+        }
+        for title, dates in completions.items():
+            habit = DatabaseHabit(title, "", title, dates[0])
+            habit.store(db)
+            results = [habit.complete_task(db, custom_date) for custom_date in dates]
+            assert not any(result.broke_streak for result in results)
+        assert [get_habit(db, title)[3:5] for title in completions] == [(3, 3), (4, 4), (3, 3), (1, 1), (3, 3)]
+        # the second task of a week completes it
+        result = DatabaseHabit("2 times per week").complete_task(db, date(2023, 8, 17))
+        assert (result.new_streak, result.longest_streak) == (2, 2)
+        result = DatabaseHabit("weekdays").complete_task(db, date(2023, 8, 11))
+        assert result.broke_streak and (result.new_streak, result.longest_streak) == (1, 4)
+
+        assert get_missed_periods(db, "monthly", date(2023, 1, 1), date(2023, 5, 10)) == [
+            date(2023, 4, 1),
+            date(2023, 5, 1),
+        ]
+        assert get_missed_periods(db, "2 times per week", date(2023, 7, 31), date(2023, 8, 27)) == [
+            date(2023, 8, 21)
+        ]
+        assert get_completions_per_period(db, "monthly", date(2023, 1, 1), date(2023, 3, 31)) == {
+            date(2023, 1, 1): 1,
+            date(2023, 2, 1): 1,
+            date(2023, 3, 1): 1,
+        }
+        stats = {row.title: row for row in get_completion_stats(db, date(2023, 8, 1), date(2023, 8, 20))}
+        assert stats["every 3 days"][2:4] == (7, 3)
+        assert stats["2 times per week"][2:4] == (2, 2)
+        assert stats["weekdays"][2:4] == (12, 5)
+        assert stats["monthly"][2:4] == (1, 0)
+        assert stats["calendar weekly"][2:4] == (3, 3)
+        assert get_periodicities(db) == [
+            "daily",
+            "every 3 days",
+            "weekly",
+            "calendar weekly",
+            "2 times per week",
+            "monthly",
+            "weekdays",
+        ]
+        store = HabitStore.load(db)
+        assert store.completion_stats(date(2023, 8, 1), date(2023, 8, 20)) == get_completion_stats(
+            db, date(2023, 8, 1), date(2023, 8, 20)
+        )
+        for title in completions:
+            assert store.streaks(title) == get_habit(db, title)[3:5]
+        db.close()
+
     def teardown_method(self):
         import os
 
@@ -0,0 +1,333 @@
+"""
+Import and export habits and their completed tasks as JSONL, CSV or Parquet files.
+
+Run it from the repository root with
+
+    python -m transfer export DIRECTORY [--format jsonl] [--database main.db] [--user 0]
+    python -m transfer import DIRECTORY [--format jsonl] [--database main.db] [--user 0]
+
+A directory holds `habits.<format>` with the columns title, description, periodicity and creation_time, and
+`completions.<format>` with the columns habit_title and date. Dates are written as YYYY-MM-DD. A directory holds
+the habits of one user.
+"""
+import argparse
+import csv
+import json
+import os
+from contextlib import ExitStack
+from datetime import date
+from itertools import islice
+from operator import itemgetter
+
+from constants import DEFAULT_USER
+from db import (
+    get_db,
+    add_habits,
+    add_completed_tasks,
+    bulk_completed_tasks,
+    count_completed_tasks,
+    get_creation_days,
+    iter_habit_rows,
+    iter_completed_task_rows,
+    transaction,
+)
+from render import show, render_transfer_results
+from periods import is_periodicity
+from results import TransferResult
+from streaks import recompute_streaks
+
+# The number of rows that are read, checked and inserted at once
+CHUNK_SIZE = 10_000
+
+FORMATS = ("jsonl", "csv", "parquet")
+
+# The columns of the files of every table
+HABIT_COLUMNS = ("title", "description", "periodicity", "creation_time")
+COMPLETED_TASK_COLUMNS = ("habit_title", "date")
+
+
+def iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    """
+    Split rows into lists of at most `chunk_size` rows
+    :param rows: an iterable of rows
+    :param chunk_size: the maximal number of rows in a chunk
+    :return: a generator of lists of rows
+    """
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def import_pyarrow():
+    """
+    Import pyarrow, which is only needed for Parquet files
+    :return: the pyarrow and pyarrow.parquet modules
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(
+            "Parquet files need pyarrow, install it with `pip install pyarrow`"
+        ) from None
+    return pyarrow, pyarrow.parquet
+
+
+def write_rows(path, file_format, columns, rows):
+    """
+    Write rows to a file, holding at most one chunk of rows in memory
+    :param path: the path of the file
+    :param file_format: `jsonl`, `csv` or `parquet`
+    :param columns: the names of the columns
+    :param rows: an iterable of rows
+    :return: the number of written rows
+    """
+    count = 0
+    if file_format == "parquet":
+        pyarrow, parquet = import_pyarrow()
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        with parquet.ParquetWriter(path, schema) as writer:
+            for chunk in iter_chunks(rows):
+                arrays = [pyarrow.array(values, pyarrow.string()) for values in zip(*chunk)]
+                writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+                count += len(chunk)
+        return count
+
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for chunk in iter_chunks(rows):
+                writer.writerows(chunk)
+                count += len(chunk)
+        else:
+            encode = json.JSONEncoder(ensure_ascii=False).encode
+            # the keys are encoded once, only the values are encoded for every row
+            line = "{{" + ",".join(f"{encode(column)}:{{}}" for column in columns) + "}}\n"
+            for chunk in iter_chunks(rows):
+                file.writelines(line.format(*map(encode, row)) for row in chunk)
+                count += len(chunk)
+    return count
+
+
+def read_rows(path, file_format, columns):
+    """
+    Read rows from a file, holding at most one chunk of rows in memory
+    :param path: the path of the file
+    :param file_format: `jsonl`, `csv` or `parquet`
+    :param columns: the names of the columns to read
+    :return: a generator of tuples with the values of the columns
+    """
+    if file_format == "parquet":
+        _, parquet = import_pyarrow()
+        for batch in parquet.ParquetFile(path).iter_batches(
+            batch_size=CHUNK_SIZE, columns=list(columns)
+        ):
+            yield from zip(*(values.to_pylist() for values in batch.columns))
+        return
+
+    with open(path, encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            reader = csv.reader(file)
+            header = next(reader, [])
+            missing = [column for column in columns if column not in header]
+            if missing:
+                raise ValueError(f"The file `{path}` has no columns {missing}")
+            yield from map(itemgetter(*(header.index(c) for c in columns)), reader)
+        else:
+            get = itemgetter(*columns)
+            while lines := list(islice(file, CHUNK_SIZE)):
+                # decoding a chunk of lines at once is much faster than decoding every line
+                lines = [line for line in lines if not line.isspace()]
+                yield from map(get, json.loads("[" + ",".join(lines) + "]"))
+
+
+def parse_day(value, days):
+    """
+    Convert a date of an imported row to a day ordinal
+    :param value: a YYYY-MM-DD string or a date
+    :param days: a dictionary of the already converted values, it is shared between rows
+    :return: the day ordinal or None if the value is not a date
+    """
+    try:
+        return days[value]
+    except KeyError:
+        pass
+    try:
+        day = (
+            value.toordinal()
+            if isinstance(value, date)
+            else date.fromisoformat(value).toordinal()
+        )
+    except (TypeError, ValueError):
+        day = None
+    days[value] = day
+    return day
+
+
+def import_habits(db, rows, today=None, user_id=DEFAULT_USER):
+    """
+    Add habits in a single transaction. A habit is skipped, like in the CLI, if a habit with its title already
+    exists, if its periodicity is unknown or if it was created after today
+    :param db: a database connection
+    :param rows: titles, descriptions, periodicities and creation times of habits
+    :param today: the current date, today if it is not given
+    :param user_id: the user of the habits
+    :return: TransferResult
+    """
+    today = (today or date.today()).toordinal()
+    titles = set(get_creation_days(db, user_id))
+    days = {}
+    imported = skipped = 0
+    with transaction(db):
+        for chunk in iter_chunks(rows):
+            habits = []
+            for title, description, periodicity, creation_time in chunk:
+                day = parse_day(creation_time, days)
+                if (
+                    not title
+                    or title in titles
+                    or not is_periodicity(periodicity)
+                    or day is None
+                    or day > today
+                ):
+                    continue
+                titles.add(title)
+                habits.append((title, description, periodicity, day))
+            add_habits(db, habits, user_id)
+            imported += len(habits)
+            skipped += len(chunk) - len(habits)
+    return TransferResult("habit", imported, skipped)
+
+
+def import_completed_tasks(db, rows, today=None, user_id=DEFAULT_USER):
+    """
+    Add completed tasks in a single transaction and recalculate the streaks of the imported habits. A completed task
+    is skipped, like in the CLI, if its habit does not exist, if it is earlier than the habit's creation time or later
+    than today, and if the task was already completed on the same day. Once the import grows larger than half of the
+    existing completed tasks, the rest is added with `bulk_completed_tasks`, which rebuilds the rollup rows of the
+    imported habits at the end
+    :param db: a database connection
+    :param rows: habits' titles and dates of completed tasks
+    :param today: the current date, today if it is not given
+    :param user_id: the user of the habits
+    :return: TransferResult
+    """
+    today = (today or date.today()).toordinal()
+    days = {}
+    titles = set()
+    imported = skipped = 0
+    bulk = False
+    with transaction(db), ExitStack() as stack:
+        creation_days = get_creation_days(db, user_id)
+        existing = count_completed_tasks(db)
+        for chunk in iter_chunks(rows):
+            if not bulk and imported + skipped >= existing // 2:
+                stack.enter_context(bulk_completed_tasks(db, user_id, titles))
+                bulk = True
+            tasks = []
+            for title, value in chunk:
+                creation_day = creation_days.get(title)
+                day = parse_day(value, days)
+                if creation_day is not None and day is not None and creation_day <= day <= today:
+                    tasks.append((day, title))
+            titles.update(map(itemgetter(1), tasks))
+            # the habits of the tasks were looked up in `creation_days`
+            added = add_completed_tasks(db, tasks, skip_duplicates=True, user_id=user_id, check_habits=False)
+            imported += added
+            skipped += len(chunk) - added
+        # the streaks are calculated from the rollup table, which a bulk import rebuilds when it ends
+        stack.close()
+        recompute_streaks(db, user_id, titles)
+    return TransferResult("completed_task", imported, skipped)
+
+
+def paths(directory, file_format):
+    """
+    Return the paths of the files of a directory
+    :param directory: the path of the directory
+    :param file_format: `jsonl`, `csv` or `parquet`
+    :return: the paths of the habits file and of the completed tasks file
+    """
+    return (
+        os.path.join(directory, f"habits.{file_format}"),
+        os.path.join(directory, f"completions.{file_format}"),
+    )
+
+
+def export_directory(db, directory, file_format="jsonl", user_id=DEFAULT_USER):
+    """
+    Export all habits and completed tasks of a user to the files of a directory
+    :param db: a database connection
+    :param directory: the path of the directory, it is created if it does not exist
+    :param file_format: `jsonl`, `csv` or `parquet`
+    :param user_id: the user of the habits
+    :return: TransferResults of the habits and the completed tasks
+    """
+    os.makedirs(directory, exist_ok=True)
+    habits_path, completions_path = paths(directory, file_format)
+    return [
+        TransferResult(
+            "habit",
+            write_rows(
+                habits_path, file_format, HABIT_COLUMNS, iter_habit_rows(db, user_id=user_id)
+            ),
+        ),
+        TransferResult(
+            "completed_task",
+            write_rows(
+                completions_path,
+                file_format,
+                COMPLETED_TASK_COLUMNS,
+                iter_completed_task_rows(db, user_id=user_id),
+            ),
+        ),
+    ]
+
+
+def import_directory(db, directory, file_format="jsonl", today=None, user_id=DEFAULT_USER):
+    """
+    Import the habits and completed tasks of a user from the files of a directory in a single transaction
+    :param db: a database connection
+    :param directory: the path of the directory
+    :param file_format: `jsonl`, `csv` or `parquet`
+    :param today: the current date, today if it is not given
+    :param user_id: the user of the habits
+    :return: TransferResults of the habits and the completed tasks
+    """
+    habits_path, completions_path = paths(directory, file_format)
+    with transaction(db):
+        return [
+            import_habits(
+                db, read_rows(habits_path, file_format, HABIT_COLUMNS), today, user_id
+            ),
+            import_completed_tasks(
+                db,
+                read_rows(completions_path, file_format, COMPLETED_TASK_COLUMNS),
+                today,
+                user_id,
+            ),
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--database", default="main.db")
+    parser.add_argument("--user", type=int, default=DEFAULT_USER)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        db = get_db(args.database, "fast")
+        results = export_directory(db, args.directory, args.format, args.user)
+    else:
+        db = get_db(args.database, "bulk-load")
+        results = import_directory(db, args.directory, args.format, user_id=args.user)
+    db.close()
+    show(render_transfer_results(args.command, results))
+
+
+if __name__ == "__main__":
+    main()